@@ -0,0 +1,296 @@
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import time
+
+# Headless: the dummy drivers must be selected before pygame initializes
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from src.settings import SCREEN_WIDTH, SCREEN_HEIGHT, FIXED_DT, VEC_ENV_ARENA_BOSS_DISTANCE
+from src.stage_config import STAGE_CONFIGURATIONS
+from src.stage_data import ENTITY_CLASSES
+from src.world import World, PLAYER_START_X
+from src.bot import POLICIES
+
+# Balance sweeps: plays one stage's boss fight headless many times over a
+# process pool. Every combination of the --param values is played --runs
+# times (one seed per run) by a scripted player policy (src/bot.py). One CSV
+# row per run is written to --output as results stream back, and --summary
+# gets one aggregated row per combination (win rate, boss time-to-kill,
+# damage taken, ticks per second).
+# A run is won when the stage's boss is defeated, lost on game over.
+#
+# By default each run is an arena (like src/vec_env.py's): a screen-wide
+# stage with only the stage's boss, a short walk from the player, so a run
+# lasts seconds of game time. --scenario stage plays the whole stage
+# instead, regular enemies and level-ups included; that is far slower, as
+# most of a run is the walk to the boss.
+#
+#   python batch_runner.py --stage 1 --param Spike.health=120,150,180 \
+#       --param Player.strength=8,10,12 --runs 50 --output runs.csv --summary summary.csv
+#   python batch_runner.py --stage 1 --scenario stage --param Player.level_up_strength=1,2,3 \
+#       --param Player.speed=60 --runs 20 --summary summary.csv
+#
+# Parameters are Class.attribute; "Player" is the player, any other name an
+# enemy or boss class from the stage file (see World's stat_overrides).
+
+DEFAULT_RUNS = 20
+SCENARIOS = ("arena", "stage")
+# Logic ticks before a run counts as a timeout: 3 minutes of game time in an arena, 20 on a full stage
+DEFAULT_MAX_TICKS = {"arena": 60 * 60 * 3, "stage": 60 * 60 * 20}
+DEFAULT_SEED = 1
+PROGRESS_INTERVAL = 2.0 # Seconds between progress lines
+
+RUN_FIELDS = ("outcome", "ticks", "game_seconds", "boss_engaged_seconds", "time_to_kill_seconds", "damage_taken",
+              "health_left", "level", "enemies_defeated", "wall_seconds", "ticks_per_second")
+SUMMARY_FIELDS = ("runs", "wins", "losses", "timeouts", "win_rate", "mean_time_to_kill_seconds",
+                  "median_time_to_kill_seconds", "mean_damage_taken", "mean_game_seconds", "ticks_per_second")
+
+
+# --- Runs ---
+
+def parse_value(text):
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+
+def parse_param(text):
+    # "Spike.health=120,150" -> ("Spike.health", [120, 150])
+    name, separator, values = text.partition("=")
+    class_name, dot, attribute = name.partition(".")
+    if not separator or not dot or not attribute or not values:
+        raise ValueError(f"expected Class.attribute=value[,value...], got {text!r}")
+    if class_name != "Player" and class_name not in ENTITY_CLASSES:
+        raise ValueError(f"unknown class {class_name!r} in {text!r}")
+    return name, [parse_value(value) for value in values.split(",")]
+
+
+def get_overrides(params):
+    # {"Spike.health": 150} -> {"Spike": {"health": 150}}, as World(stat_overrides=...) takes it
+    overrides = {}
+    for name, value in params.items():
+        class_name, attribute = name.split(".", 1)
+        overrides.setdefault(class_name, {})[attribute] = value
+    return overrides
+
+
+def make_arena(stage_number):
+    # The stage's boss on its own in a screen-wide stage, None if it has no boss
+    stage = STAGE_CONFIGURATIONS.get(stage_number)
+    if not stage or not stage["boss_data"]:
+        return None
+    return [{"level_number": stage_number, "name": f"{stage['name']} arena", "length": SCREEN_WIDTH,
+             "background_color": stage["background_color"], "enemy_placements": [],
+             "boss_data": (stage["boss_data"][0], PLAYER_START_X + VEC_ENV_ARENA_BOSS_DISTANCE, SCREEN_HEIGHT),
+             "boss_dialogue": None}]
+
+
+def get_stages(scenario, stage_number):
+    return make_arena(stage_number) if scenario == "arena" else STAGE_CONFIGURATIONS
+
+
+def run_one(job):
+    # Plays one run to a win, loss or timeout and returns its CSV row
+    combination, params, seed, stage_number, scenario, policy_name, max_ticks = job
+    start = time.perf_counter()
+    rng = random.Random(seed)
+    policy = POLICIES[policy_name]
+    world = World(get_stages(scenario, stage_number), seed=seed, stat_overrides=get_overrides(params))
+    world.load_stage(stage_number)
+    player = world.player
+    boss = world.stage_manager.boss
+
+    outcome = "timeout"
+    damage_taken = 0
+    last_health = player.health
+    enemies_defeated = 0
+    engaged_tick = None
+    defeated_tick = None
+    ticks = 0
+    while ticks < max_ticks:
+        events = world.step(policy(world, rng), FIXED_DT)
+        ticks += 1
+        if player.health < last_health:
+            damage_taken += last_health - player.health
+        last_health = player.health # Level-ups heal; only losses count
+        if boss is not None:
+            if engaged_tick is None and boss in world.activation.awake:
+                engaged_tick = ticks
+            if defeated_tick is None and world.stage_manager.is_boss_defeated:
+                defeated_tick = ticks
+        kinds = [event[0] for event in events]
+        enemies_defeated += kinds.count("enemy_defeated")
+        if "game_over" in kinds:
+            outcome = "loss"
+            break
+        if defeated_tick is not None or "stage_loaded" in kinds or "game_complete" in kinds or "stage_load_failed" in kinds:
+            outcome = "win" # Beating the boss is what's being balanced, so the walk to the stage end isn't played
+            break
+
+    elapsed = time.perf_counter() - start
+    row = {"combination": combination, "seed": seed}
+    row.update(params)
+    row.update({
+        "outcome": outcome,
+        "ticks": ticks,
+        "game_seconds": round(ticks * FIXED_DT, 3),
+        "boss_engaged_seconds": round(engaged_tick * FIXED_DT, 3) if engaged_tick is not None else "",
+        "time_to_kill_seconds": round((defeated_tick - engaged_tick) * FIXED_DT, 3) if defeated_tick is not None and engaged_tick is not None else "",
+        "damage_taken": damage_taken,
+        "health_left": player.health,
+        "level": player.level,
+        "enemies_defeated": enemies_defeated,
+        "wall_seconds": round(elapsed, 4),
+        "ticks_per_second": round(ticks / elapsed, 1) if elapsed > 0 else 0.0,
+    })
+    return row
+
+
+def iter_results(jobs, workers):
+    # Rows in completion order
+    if workers == 1:
+        for job in jobs:
+            yield run_one(job)
+        return
+    with multiprocessing.Pool(workers) as pool:
+        chunksize = max(1, len(jobs) // (workers * 8))
+        yield from pool.imap_unordered(run_one, jobs, chunksize)
+
+
+def summarize(rows, combination_params):
+    # One row per combination, in grid order
+    by_combination = {}
+    for row in rows:
+        by_combination.setdefault(row["combination"], []).append(row)
+    summary = []
+    for combination, params in enumerate(combination_params):
+        runs = by_combination.get(combination, [])
+        if not runs:
+            continue
+        outcomes = [row["outcome"] for row in runs]
+        kill_times = [row["time_to_kill_seconds"] for row in runs if row["time_to_kill_seconds"] != ""]
+        ticks = sum(row["ticks"] for row in runs)
+        wall = sum(row["wall_seconds"] for row in runs)
+        entry = {"combination": combination}
+        entry.update(params)
+        entry.update({
+            "runs": len(runs),
+            "wins": outcomes.count("win"),
+            "losses": outcomes.count("loss"),
+            "timeouts": outcomes.count("timeout"),
+            "win_rate": round(outcomes.count("win") / len(runs), 4),
+            "mean_time_to_kill_seconds": round(statistics.mean(kill_times), 3) if kill_times else "",
+            "median_time_to_kill_seconds": round(statistics.median(kill_times), 3) if kill_times else "",
+            "mean_damage_taken": round(statistics.mean(row["damage_taken"] for row in runs), 2),
+            "mean_game_seconds": round(statistics.mean(row["game_seconds"] for row in runs), 3),
+            "ticks_per_second": round(ticks / wall, 1) if wall > 0 else 0.0,
+        })
+        summary.append(entry)
+    return summary
+
+
+def write_csv(path, fieldnames, rows):
+    with open(path, "w", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def check_parameters(stage_number, scenario, combination_params):
+    # Builds and loads the stage once per combination so bad attribute names fail
+    # here rather than in a worker. Regular enemies are only checked as they spawn.
+    for params in combination_params:
+        world = World(get_stages(scenario, stage_number), stat_overrides=get_overrides(params))
+        world.load_stage(stage_number)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless Metro City Mayhem balance sweeps")
+    parser.add_argument("--stage", type=int, default=1, help="level number to play")
+    parser.add_argument("--scenario", choices=SCENARIOS, default="arena",
+                        help="arena: just the stage's boss, a short walk away (default); stage: the whole stage")
+    parser.add_argument("--param", action="append", default=[], metavar="CLASS.ATTR=V1,V2",
+                        help="parameter values to sweep, e.g. Spike.health=120,150 (repeatable; the grid is every combination)")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="brawler", help="scripted player")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="runs per combination, each with its own seed")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="seed of the first run of each combination")
+    parser.add_argument("--max-ticks", type=int, help="logic ticks before a run times out "
+                        f"(default {DEFAULT_MAX_TICKS['arena']} in an arena, {DEFAULT_MAX_TICKS['stage']} on a full stage)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes (1 runs in this process)")
+    parser.add_argument("--output", metavar="PATH", help="CSV with one row per run, written as runs finish")
+    parser.add_argument("--summary", metavar="PATH", help="CSV with one aggregated row per combination")
+    options = parser.parse_args()
+
+    if options.stage not in STAGE_CONFIGURATIONS:
+        parser.error(f"stage {options.stage} not found")
+    if options.scenario == "arena" and make_arena(options.stage) is None:
+        parser.error(f"stage {options.stage} has no boss to fight in an arena; use --scenario stage")
+    max_ticks = options.max_ticks if options.max_ticks is not None else DEFAULT_MAX_TICKS[options.scenario]
+    try:
+        grid = dict(parse_param(text) for text in options.param)
+    except ValueError as e:
+        parser.error(str(e))
+    param_names = list(grid)
+    combination_params = [dict(zip(param_names, values)) for values in itertools.product(*grid.values())]
+    try:
+        check_parameters(options.stage, options.scenario, combination_params)
+    except ValueError as e:
+        parser.error(str(e))
+
+    jobs = [(combination, params, options.seed + run, options.stage, options.scenario, options.policy, max_ticks)
+            for combination, params in enumerate(combination_params) for run in range(options.runs)]
+    workers = max(1, min(options.workers, len(jobs)))
+    print(f"Stage {options.stage} {options.scenario}, policy {options.policy}: {len(combination_params)} combination(s) x "
+          f"{options.runs} run(s) = {len(jobs)} runs on {workers} worker(s)")
+
+    output_file = open(options.output, "w", newline="") if options.output else None
+    writer = None
+    if output_file is not None:
+        writer = csv.DictWriter(output_file, fieldnames=["combination", "seed"] + param_names + list(RUN_FIELDS))
+        writer.writeheader()
+    rows = []
+    start = time.perf_counter()
+    last_progress = start
+    try:
+        for row in iter_results(jobs, workers):
+            rows.append(row)
+            if writer is not None:
+                writer.writerow(row)
+                output_file.flush()
+            now = time.perf_counter()
+            if now - last_progress >= PROGRESS_INTERVAL:
+                print(f"  {len(rows)}/{len(jobs)} runs, {now - start:.0f}s")
+                last_progress = now
+    except ValueError as e: # A bad override on a regular enemy, raised when it first spawned
+        print(f"Error: {e}")
+        return 2
+    finally:
+        if output_file is not None:
+            output_file.close()
+    elapsed = time.perf_counter() - start
+
+    summary = summarize(rows, combination_params)
+    if options.summary:
+        write_csv(options.summary, ["combination"] + param_names + list(SUMMARY_FIELDS), summary)
+    total_ticks = sum(row["ticks"] for row in rows)
+    print(f"{len(rows)} runs, {total_ticks} ticks in {elapsed:.1f}s ({total_ticks / elapsed:.0f} ticks/s, "
+          f"{len(rows) / elapsed * 60:.0f} runs/min across workers)")
+    for entry in summary:
+        label = ", ".join(f"{name}={entry[name]}" for name in param_names) or "defaults"
+        print(f"  {label}: win rate {entry['win_rate']:.0%}, time to kill {entry['mean_time_to_kill_seconds'] or '-'}s, "
+              f"damage taken {entry['mean_damage_taken']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
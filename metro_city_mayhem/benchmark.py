@@ -0,0 +1,428 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Headless: the dummy drivers must be selected before pygame initializes
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+pygame.init()
+
+from src.settings import SCREEN_WIDTH, SCREEN_HEIGHT, FIXED_DT
+from src.stage_config import STAGE_CONFIGURATIONS
+from src.world import World, PlayerInput
+from src.enemy import Thug, Bruiser
+from src.boss import Spike, Crusher, Viper
+from src.renderer import WorldRenderer
+from src.dialogue import DialogueBox
+from src.image_cache import convert_cached_images
+from src import dialogue
+from src.bullet_system import NUMPY_AVAILABLE
+from src.asset_loader import StageAssetLoader
+from src.stage_data import load_stage_file
+from src.vec_env import VecEnv, ACTIONS
+
+# Drives the real simulation and renderer through fixed, seeded scenarios and
+# reports per-phase frame times (update/render/load) and allocations as JSON.
+#
+#   python benchmark.py --output results.json
+#   python benchmark.py --baseline results.json --threshold 0.15   # exit 1 on regressions
+#
+# Allocations are measured in a second, tracemalloc-enabled pass so they don't
+# skew the timings.
+
+BENCHMARK_SEED = 1234
+DEFAULT_FRAMES = 600
+DEFAULT_ENEMIES = 500
+DEFAULT_THRESHOLD = 0.15    # Fractional slowdown allowed before a metric counts as a regression
+MIN_REGRESSION_MS = 0.1     # Ignore timing differences smaller than this (timer noise)
+MIN_REGRESSION_KB = 64      # Same for allocation peaks
+COMPARED_PHASE_METRICS = ("mean_ms", "p99_ms")
+MIN_SAMPLES_FOR_P99 = 100   # With fewer samples p99 is just the max; only the mean is compared
+
+
+class PhaseTimer:
+    # Collects one duration per call of measure() for each named phase
+    def __init__(self):
+        self.samples = {}
+
+    def measure(self, phase, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        self.samples.setdefault(phase, []).append(time.perf_counter() - start)
+        return result
+
+    def get_summary(self):
+        return {phase: summarize(samples) for phase, samples in self.samples.items()}
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "p50_ms": percentile(ordered, 0.50) * 1000,
+        "p99_ms": percentile(ordered, 0.99) * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def make_stage(name, length, enemy_placements, boss_data=None):
+    return {"level_number": 1, "name": name, "length": length, "background_color": pygame.Color('dimgray'),
+            "enemy_placements": enemy_placements, "boss_data": boss_data, "boss_dialogue": None}
+
+
+def make_world(stage_configurations, **world_kwargs):
+    random.seed(BENCHMARK_SEED)
+    world = World(stage_configurations, SCREEN_WIDTH, SCREEN_HEIGHT, seed=BENCHMARK_SEED, **world_kwargs)
+    world.load_stage(world.stage_table.level_numbers[0])
+    return world
+
+
+def keep_alive(world):
+    # Scenarios measure load, not game over
+    world.player.health = world.player.max_health
+
+
+def weave_input(frame):
+    # Walks right, turns back now and then, punches and kicks on a fixed rhythm
+    move_x = -1 if (frame // 120) % 4 == 3 else 1
+    return PlayerInput(move_x, 0, punch=frame % 9 == 0, kick=frame % 23 == 0)
+
+
+def open_display():
+    # Sprite images cached by earlier, windowless scenarios get the display format too
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    convert_cached_images()
+    return screen
+
+
+# --- Scenarios: each runs `frames` frames, timing its phases with `timer`, and
+# may return a dict of subsystem stats for the report ---
+
+def scenario_chase(timer, frames, options, use_crowd=True):
+    # N regular enemies packed around the player's path, all chasing
+    rng = random.Random(BENCHMARK_SEED)
+    placements = [(rng.choice((Thug, Bruiser)), rng.randint(200, 1200), SCREEN_HEIGHT) for i in range(options.enemies)] # All within spawn range
+    world = make_world([make_stage("Chase", 2000, placements)], use_crowd=use_crowd)
+    world.player.speed = 60
+    for frame in range(frames):
+        keep_alive(world)
+        timer.measure("update", world.step, weave_input(frame), FIXED_DT)
+    return {"activation": world.activation.get_stats(), "crowd": world.crowd.get_stats() if world.crowd else None}
+
+
+def scenario_chase_per_enemy(timer, frames, options):
+    return scenario_chase(timer, frames, options, use_crowd=False)
+
+
+def scenario_viper_storm(timer, frames, options, use_bullet_system=True):
+    # Viper firing wide fans as fast as it can, player standing in range
+    world = make_world([make_stage("Storm", 1600, [], (Viper, 900, SCREEN_HEIGHT))], use_bullet_system=use_bullet_system)
+    viper = world.stage_manager.boss
+    if world.bullets is not None: # Fans of shot_count bullets, ten volleys a second
+        viper.special_attack_cooldown_max = 0.1
+        viper.shot_count = options.shot_count
+        viper.shot_spread_degrees = 120
+    else: # Pooled sprites fire single shots, so fire every tick instead
+        viper.special_attack_cooldown_max = FIXED_DT
+    for frame in range(frames):
+        keep_alive(world)
+        world.player.pos.x = 600
+        timer.measure("update", world.step, PlayerInput(), FIXED_DT)
+    if world.bullets is not None:
+        return {"bullets": world.bullets.get_stats()}
+    return {"projectile_pool": world.projectile_pool.get_stats()}
+
+
+def scenario_viper_storm_sprites(timer, frames, options):
+    return scenario_viper_storm(timer, frames, options, use_bullet_system=False)
+
+
+def scenario_bosses(timer, frames, options):
+    # Spike, Crusher and Viper in turn, fighting the player up close
+    for BossClass in (Spike, Crusher, Viper):
+        world = make_world([make_stage(BossClass.__name__, 1600, [], (BossClass, 700, SCREEN_HEIGHT))])
+        world.player.pos.x = 560
+        for frame in range(frames // 3):
+            keep_alive(world)
+            timer.measure("update", world.step, PlayerInput(punch=frame % 9 == 0), FIXED_DT)
+
+
+def scenario_stage_load_retry(timer, frames, options):
+    # Loading every stage in turn and retrying it, with a few ticks in between
+    world = make_world(STAGE_CONFIGURATIONS)
+    level_numbers = [config["level_number"] for config in STAGE_CONFIGURATIONS]
+    for frame in range(frames // 10):
+        level_number = level_numbers[frame % len(level_numbers)]
+        timer.measure("load", world.load_stage, level_number)
+        for tick in range(4):
+            timer.measure("update", world.step, weave_input(tick), FIXED_DT)
+        timer.measure("retry", world.retry_stage)
+    return {"entity_pool": world.entity_pool.get_stats() if world.entity_pool else None}
+
+
+def scenario_stage_transition(timer, frames, options, prefetch=False):
+    # What a player sees: each stage load or retry plus the first frame drawn after it
+    screen = open_display()
+    font = pygame.font.Font(None, 28)
+    level_numbers = [config["level_number"] for config in STAGE_CONFIGURATIONS]
+    asset_loader = StageAssetLoader(STAGE_CONFIGURATIONS, SCREEN_HEIGHT) if prefetch else None
+    world = World(STAGE_CONFIGURATIONS, SCREEN_WIDTH, SCREEN_HEIGHT, seed=BENCHMARK_SEED, asset_loader=asset_loader)
+    renderer = WorldRenderer(SCREEN_WIDTH, SCREEN_HEIGHT, font, dirty_rects=False)
+    dialogue_box = DialogueBox(SCREEN_WIDTH, SCREEN_HEIGHT, font=font)
+
+    def load_and_draw(load, *args):
+        load(*args)
+        renderer.draw(screen, world, dialogue_box, 1.0)
+
+    for frame in range(frames // 10):
+        level_number = level_numbers[frame % len(level_numbers)]
+        if asset_loader is not None:
+            asset_loader.prefetch(level_number) # main.py prefetches stage 1 from the menu
+            asset_loader.wait(level_number) # As if the previous stage had been played long enough
+        timer.measure("load", load_and_draw, world.load_stage, level_number)
+        for tick in range(4):
+            timer.measure("update", world.step, weave_input(tick), FIXED_DT)
+        timer.measure("retry", load_and_draw, world.retry_stage)
+    if asset_loader is None:
+        return None
+    asset_loader.shutdown()
+    return {"stages": {level_number: asset_loader.get_metrics(level_number) for level_number in level_numbers}}
+
+
+def scenario_stage_transition_prefetched(timer, frames, options):
+    return scenario_stage_transition(timer, frames, options, prefetch=True)
+
+
+def scenario_snapshot_restore(timer, frames, options):
+    # Quicksave/quickload and Retry with N regular enemies alive, fighting between restores
+    rng = random.Random(BENCHMARK_SEED)
+    placements = [(rng.choice((Thug, Bruiser)), rng.randint(200, 1200), SCREEN_HEIGHT) for i in range(options.enemies)]
+    world = make_world([make_stage("Snapshot", 2000, placements, (Viper, 1500, SCREEN_HEIGHT))])
+    for frame in range(frames // 10):
+        keep_alive(world)
+        timer.measure("capture", world.quicksave)
+        for tick in range(8):
+            timer.measure("update", world.step, weave_input(tick), FIXED_DT)
+        timer.measure("quickload", world.quickload)
+        timer.measure("retry", world.retry_stage)
+    snapshot = world.quicksave_snapshot
+    return {"entities": snapshot.get_entity_count(), "last_capture_ms": snapshot.capture_seconds * 1000}
+
+
+def scenario_stage_table_load(timer, frames, options):
+    # A stage file with hundreds of long stages: compiling it from JSON, then loading the compiled cache
+    rng = random.Random(BENCHMARK_SEED)
+    stage_count = max(1, frames // 2)
+    placements_per_stage = 1000
+    stages = []
+    for level_number in range(1, stage_count + 1):
+        placements = [[rng.choice(("Thug", "Bruiser")), rng.randrange(200, 20000)] for _ in range(placements_per_stage)]
+        stages.append({"level_number": level_number, "name": f"Stage {level_number}", "length": 20000,
+                       "background_color": "dimgray", "enemy_placements": placements, "boss": ["Viper", 19900]})
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "stages.json")
+        cache_path = os.path.join(directory, "stages.cache")
+        with open(path, "w") as stage_file:
+            json.dump({"stages": stages}, stage_file)
+        for repeat in range(3):
+            if os.path.exists(cache_path):
+                os.remove(cache_path)
+            timer.measure("compile", load_stage_file, path, cache_path)
+            for _ in range(10):
+                timer.measure("cached", load_stage_file, path, cache_path)
+    return {"stages": stage_count, "placements": stage_count * placements_per_stage}
+
+
+def scenario_render_playing(timer, frames, options):
+    # Full-frame redraws of the PLAYING view (dirty rects off) while walking stage 1
+    screen = open_display()
+    font = pygame.font.Font(None, 28)
+    world = make_world(STAGE_CONFIGURATIONS)
+    renderer = WorldRenderer(SCREEN_WIDTH, SCREEN_HEIGHT, font, dirty_rects=False)
+    dialogue_box = DialogueBox(SCREEN_WIDTH, SCREEN_HEIGHT, font=font)
+    world.player.speed = 120
+    for frame in range(frames):
+        keep_alive(world)
+        timer.measure("update", world.step, weave_input(frame), FIXED_DT)
+        timer.measure("render", renderer.draw, screen, world, dialogue_box, 0.5)
+    return {"renderer": renderer.get_stats(), "streaming": world.stage_manager.get_streaming_stats()}
+
+
+def scenario_dialogue_retry(timer, frames, options):
+    # Retrying into the same boss dialogue: typewriter pages revealed and drawn, then the dialogue starts over
+    screen = open_display()
+    font = pygame.font.Font(None, 28)
+    boss_dialogue = STAGE_CONFIGURATIONS.get(1)["boss_dialogue"]
+    dialogue_box = DialogueBox(SCREEN_WIDTH, SCREEN_HEIGHT, font=font, typewriter_speed=45)
+    for frame in range(frames):
+        if not dialogue_box.is_showing:
+            timer.measure("start", dialogue_box.start_dialogue, boss_dialogue["name"], boss_dialogue["lines"])
+        dialogue_box.update(FIXED_DT * 10) # Ten frames of reveal per benchmark frame
+        timer.measure("render", dialogue_box.draw, screen)
+        if dialogue_box.is_page_revealed():
+            dialogue_box.next_page()
+    return {"dialogue_cache": dict(dialogue.cache_stats)}
+
+
+def scenario_vec_env(timer, frames, options):
+    # Batched training steps: 16 boss arenas (Spike, Crusher, Viper) driven by random actions
+    if not NUMPY_AVAILABLE:
+        return None
+    env = VecEnv(num_envs=16, level_number=[1, 2, 3] * 5 + [1])
+    env.reset(seed=BENCHMARK_SEED)
+    rng = random.Random(BENCHMARK_SEED)
+    episodes = 0
+    for frame in range(frames):
+        actions = [rng.randrange(len(ACTIONS)) for i in range(env.num_envs)]
+        observations, rewards, dones, infos = timer.measure("step", env.step, actions)
+        episodes += int(dones.sum())
+    step_seconds = sum(timer.samples["step"])
+    env.close()
+    return {"env_steps_per_second": frames * env.num_envs / step_seconds, "episodes": episodes}
+
+
+SCENARIOS = {
+    "chase": scenario_chase,
+    "chase_per_enemy": scenario_chase_per_enemy,
+    "viper_storm": scenario_viper_storm,
+    "viper_storm_sprites": scenario_viper_storm_sprites,
+    "bosses": scenario_bosses,
+    "stage_load_retry": scenario_stage_load_retry,
+    "stage_transition": scenario_stage_transition,
+    "stage_transition_prefetched": scenario_stage_transition_prefetched,
+    "stage_table_load": scenario_stage_table_load,
+    "snapshot_restore": scenario_snapshot_restore,
+    "render_playing": scenario_render_playing,
+    "dialogue_retry": scenario_dialogue_retry,
+    "vec_env": scenario_vec_env,
+}
+
+
+def measure_allocations(scenario, frames, options):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    scenario(PhaseTimer(), frames, options)
+    after = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    growth = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    return {"peak_kb": peak / 1024, "net_kb": growth / 1024, "net_blocks": blocks}
+
+
+def run_benchmarks(names, options):
+    results = {}
+    for name in names:
+        scenario = SCENARIOS[name]
+        timer = PhaseTimer()
+        start = time.perf_counter()
+        stats = scenario(timer, options.frames, options)
+        elapsed = time.perf_counter() - start
+        result = {"seconds": elapsed, "phases": timer.get_summary()}
+        if stats:
+            result["stats"] = stats
+        if not options.no_alloc:
+            result["allocations"] = measure_allocations(scenario, options.frames, options)
+        results[name] = result
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "numpy": NUMPY_AVAILABLE,
+            "platform": platform.platform(),
+            "frames": options.frames,
+            "enemies": options.enemies,
+            "shot_count": options.shot_count,
+        },
+        "scenarios": results,
+    }
+
+
+def compare_to_baseline(results, baseline, threshold):
+    # Returns a list of human-readable regressions
+    regressions = []
+    for name, result in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            continue
+        for phase, stats in result["phases"].items():
+            base_stats = base["phases"].get(phase)
+            if base_stats is None:
+                continue
+            for metric in COMPARED_PHASE_METRICS:
+                if metric == "p99_ms" and stats["count"] < MIN_SAMPLES_FOR_P99:
+                    continue
+                current, previous = stats[metric], base_stats[metric]
+                if current > previous * (1 + threshold) and current - previous > MIN_REGRESSION_MS:
+                    regressions.append(f"{name}/{phase} {metric}: {previous:.3f} -> {current:.3f} ms (+{(current / previous - 1) * 100:.0f}%)")
+        allocations, base_allocations = result.get("allocations"), base.get("allocations")
+        if allocations and base_allocations:
+            current, previous = allocations["peak_kb"], base_allocations["peak_kb"]
+            if current > previous * (1 + threshold) and current - previous > MIN_REGRESSION_KB:
+                regressions.append(f"{name} peak_kb: {previous:.0f} -> {current:.0f} KB (+{(current / previous - 1) * 100:.0f}%)")
+    return regressions
+
+
+def print_report(results):
+    for name, result in results["scenarios"].items():
+        print(f"{name} ({result['seconds']:.2f}s)")
+        for phase, stats in result["phases"].items():
+            print(f"  {phase:<8} mean {stats['mean_ms']:7.3f}  p50 {stats['p50_ms']:7.3f}  "
+                  f"p99 {stats['p99_ms']:7.3f}  max {stats['max_ms']:7.3f} ms  (n={stats['count']})")
+        allocations = result.get("allocations")
+        if allocations:
+            print(f"  alloc    peak {allocations['peak_kb']:.0f} KB, net {allocations['net_kb']:.0f} KB / {allocations['net_blocks']} blocks")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless Metro City Mayhem benchmarks")
+    parser.add_argument("scenarios", nargs="*", help=f"scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument("--frames", type=int, default=DEFAULT_FRAMES, help="logic ticks per scenario")
+    parser.add_argument("--enemies", type=int, default=DEFAULT_ENEMIES, help="enemy count for the chase and snapshot scenarios")
+    parser.add_argument("--shot-count", type=int, default=40, help="bullets per Viper volley in viper_storm")
+    parser.add_argument("--output", metavar="PATH", help="write results as JSON")
+    parser.add_argument("--baseline", metavar="PATH", help="compare against a previous --output file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown, e.g. 0.15 for 15%%")
+    parser.add_argument("--no-alloc", action="store_true", help="skip the tracemalloc pass")
+    options = parser.parse_args()
+
+    names = options.scenarios or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    results = run_benchmarks(names, options)
+    print_report(results)
+    if options.output:
+        with open(options.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if options.baseline:
+        with open(options.baseline) as baseline_file:
+            regressions = compare_to_baseline(results, json.load(baseline_file), options.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {options.threshold * 100:.0f}%:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,60 +1,44 @@
+import time
+STARTUP_TIME = time.perf_counter() # Before the heavy imports (pygame, NumPy), for the startup report
+
+import argparse
+import logging
+import os
+import sys
 import pygame
 import pygame.font # For text rendering
-import random # For screen shake
-
-# Initialize Pygame
-pygame.init()
-pygame.font.init() # Explicitly initialize font module
-pygame.mixer.init() # Initialize the mixer
-
-from src.player import Player
-from src.enemy import Thug, Bruiser
-from src.boss import Boss, Spike, Crusher, Viper
-from src.stage import StageManager
-from src.camera import Camera
-from src.dialogue import DialogueBox # Import DialogueBox
 
-# Screen dimensions
-SCREEN_WIDTH = 800
-SCREEN_HEIGHT = 600
-
-# Create the game display window
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Metro City Mayhem")
-
-# Create Player instance
-player = Player(SCREEN_WIDTH, SCREEN_HEIGHT)
-
-# Sprite Groups
-all_sprites = pygame.sprite.Group()
-enemies = pygame.sprite.Group() # For all enemy types, including bosses
-projectiles = pygame.sprite.Group() # For Viper's projectiles
-all_sprites.add(player) # Add player to all_sprites group
-
-# UI Font and Health Bar settings
-UI_FONT = pygame.font.Font(None, 28)
-HEALTH_BAR_HEIGHT = 7
-HEALTH_BAR_OFFSET_Y = 10
-INTRO_FONT = pygame.font.Font(None, 48) # Larger font for scenes
-MENU_FONT_TITLE = pygame.font.Font(None, 74)
-MENU_FONT_OPTIONS = pygame.font.Font(None, 54)
+from src.settings import (SCREEN_WIDTH, SCREEN_HEIGHT, FIXED_DT, PROFILER_ENABLED, PROFILER_TRACE_PATH, STAGE_MUSIC_PATH,
+                          STARTUP_FIRST_FRAME_BUDGET_MS, SOAK_SAMPLE_INTERVAL)
+from src.stage_config import STAGE_CONFIGURATIONS
+from src.world import World, PlayerInput
+from src.timestep import FixedTimestep
+from src.dialogue import DialogueBox # Import DialogueBox
+from src.image_cache import convert_cached_images
+from src.renderer import WorldRenderer
+from src.text_cache import TextCache
+from src.profiler import FrameProfiler, ProfilerOverlay
+from src.asset_loader import StageAssetLoader
+from src.sound_manager import configure_mixer, SoundManager
+from src.replay import Replay, ReplayRecorder, ReplayError, create_replay_world, play_replay
+from src.bot import POLICIES, BotController, SoakSampler
+
+IMPORTS_DONE_TIME = time.perf_counter()
+
+# UI Font settings (pygame.font.Font(None, size), created the first time they're used)
+FONT_SIZES = {
+    "ui": 28,
+    "intro": 48, # Larger font for scenes
+    "menu_title": 74,
+    "menu_options": 54,
+    "hint": 28, # "Press Enter" hint on scenes
+}
 SCENE_TEXT_COLOR = pygame.Color('white')
 MENU_TEXT_COLOR = pygame.Color('white')
 MENU_HIGHLIGHT_COLOR = pygame.Color('yellow')
 SCENE_TEXT_PADDING = 50
-
-# Helper Function for Health Bar
-def draw_health_bar(surface, current_health, max_health, bar_rect):
-    if current_health < 0: current_health = 0
-    if max_health == 0: fill_ratio = 0
-    else: fill_ratio = current_health / max_health
-    bar_width = bar_rect.width * fill_ratio
-    outline_color = pygame.Color('grey')
-    fill_color = pygame.Color('green')
-    if fill_ratio < 0.6: fill_color = pygame.Color('yellow')
-    if fill_ratio < 0.3: fill_color = pygame.Color('red')
-    pygame.draw.rect(surface, outline_color, bar_rect, 1)
-    if bar_width > 0: pygame.draw.rect(surface, fill_color, (bar_rect.x, bar_rect.y, bar_width, bar_rect.height))
+DIALOGUE_TYPEWRITER_SPEED = 45 # Characters per second revealed in boss dialogue (0 = whole page at once)
+DIRTY_RECT_RENDERING = True # Only push changed screen regions while PLAYING/BOSS_DIALOGUE
 
 # Scene Data
 INTRO_SCENES_DATA = [
@@ -71,452 +55,514 @@ ENDING_SCENES_DATA = [
     {"id": 4, "image_color": pygame.Color("black"), "text_lines": ["THE END"]}
 ]
 
-# Helper function to draw scenes
-def draw_scene(surface, scene_data, font, text_color, padding):
-    surface.fill(scene_data["image_color"])
-    y_offset = padding
-    for i, line in enumerate(scene_data["text_lines"]):
-        text_surface = font.render(line, True, text_color)
-        text_rect = text_surface.get_rect(centerx=surface.get_width() / 2, y=y_offset + i * (font.get_linesize() * 0.8) )
-        surface.blit(text_surface, text_rect)
-
-    hint_font = pygame.font.Font(None, 28)
-    hint_surface = hint_font.render("Press Enter to continue...", True, text_color)
-    hint_rect = hint_surface.get_rect(centerx=surface.get_width() / 2, bottom=surface.get_height() - padding / 2)
-    surface.blit(hint_surface, hint_rect)
-
-# Stage Configurations (ensure this uses the correct Boss classes from src.boss)
-STAGE_CONFIGURATIONS = [
-    {
-        "level_number": 1, "name": "Downtown Streets", "length": 3000,
-        "background_image_path": "assets/sprites/placeholder_bg_stage1.png", "background_color": pygame.Color('dimgray'),
-        "enemy_placements": [
-            (Thug, 800, SCREEN_HEIGHT), (Thug, 1000, SCREEN_HEIGHT), (Thug, 1200, SCREEN_HEIGHT),
-            (Thug, 1500, SCREEN_HEIGHT), (Thug, 1700, SCREEN_HEIGHT), (Thug, 2000, SCREEN_HEIGHT),
-            (Thug, 2200, SCREEN_HEIGHT), (Thug, 2400, SCREEN_HEIGHT), (Thug, 2600, SCREEN_HEIGHT),
-            (Thug, 2800, SCREEN_HEIGHT),
-        ],
-        "boss_data": (Spike, 2900, SCREEN_HEIGHT),
-        "boss_dialogue": {"name": "Spike", "lines": ["Well, well, what have we here?", "You won't get past me to find your friend, runt!"]}
-    },
-    {
-        "level_number": 2, "name": "Waterfront Warehouse", "length": 2500,
-        "background_image_path": "assets/sprites/placeholder_bg_stage2.png", "background_color": pygame.Color('darkslategray'),
-        "enemy_placements": [
-            (Thug, 700, SCREEN_HEIGHT), (Bruiser, 900, SCREEN_HEIGHT), (Thug, 1100, SCREEN_HEIGHT),
-            (Bruiser, 1300, SCREEN_HEIGHT), (Thug, 1500, SCREEN_HEIGHT), (Bruiser, 1700, SCREEN_HEIGHT),
-            (Thug, 1900, SCREEN_HEIGHT), (Thug, 2100, SCREEN_HEIGHT),
-        ],
-        "boss_data": (Crusher, 2400, SCREEN_HEIGHT),
-        "boss_dialogue": {"name": "Crusher", "lines": ["Hmph. The Boss said to crush anyone who came snooping around here.", "Guess that means you!"]}
-    },
-    {
-        "level_number": 3, "name": "Viper Gang HQ", "length": 4000,
-        "background_image_path": "assets/sprites/placeholder_bg_stage3.png", "background_color": pygame.Color('indigo'),
-        "enemy_placements": [
-            (Thug, 800, SCREEN_HEIGHT), (Bruiser, 1000, SCREEN_HEIGHT), (Thug, 1200, SCREEN_HEIGHT),
-            (Thug, 1500, SCREEN_HEIGHT), (Bruiser, 1800, SCREEN_HEIGHT), (Thug, 2100, SCREEN_HEIGHT),
-            (Bruiser, 2400, SCREEN_HEIGHT), (Thug, 2700, SCREEN_HEIGHT), (Thug, 3000, SCREEN_HEIGHT),
-            (Bruiser, 3300, SCREEN_HEIGHT), (Thug, 3600, SCREEN_HEIGHT),
-        ],
-        "boss_data": (Viper, 3900, SCREEN_HEIGHT),
-        "boss_dialogue": {"name": "Viper", "lines": ["So, you finally made it. Impressive... for a nobody.", "Sam is here, yes. But you'll never leave this place alive, let alone with them!"]}
-    }
-]
-
-# Instantiate Managers and Game State
-stage_manager = StageManager(stage_configurations=STAGE_CONFIGURATIONS, screen_height=SCREEN_HEIGHT)
-camera = Camera(screen_width=SCREEN_WIDTH, screen_height=SCREEN_HEIGHT)
-dialogue_box = DialogueBox(SCREEN_WIDTH, SCREEN_HEIGHT, font=UI_FONT)
-game_state = "MENU" # Initial game state changed to MENU
-current_scene_index = 0
-selected_menu_option = 0 # 0 for Start Game, 1 for Quit
-selected_game_over_option = 0 # 0 for Retry, 1 for Quit to Menu
-background_surface = None # Will be set after intro
-
-# Sound Effects
-sound_effects = {}
-sound_files = {
-    "punch": "assets/audio/punch.wav",
-    "kick": "assets/audio/kick.wav",
-    "take_damage": "assets/audio/take_damage.wav",
-    "enemy_defeated": "assets/audio/enemy_defeated.wav",
-    "item_pickup": "assets/audio/item_pickup.wav"
+# Sound Effects: (file, channel category, priority, max simultaneous voices).
+# sound_effects holds SoundHandles whose play() is coalesced and voice-limited
+# by the SoundManager, flushed once per frame.
+SOUND_FILES = {
+    "punch": ("assets/audio/punch.wav", "player", 2, 2),
+    "kick": ("assets/audio/kick.wav", "player", 2, 2),
+    "take_damage": ("assets/audio/take_damage.wav", "player", 3, 1),
+    "enemy_defeated": ("assets/audio/enemy_defeated.wav", "combat", 1, 3),
+    "item_pickup": ("assets/audio/item_pickup.wav", "ui", 1, 1)
 }
-
-for effect_name, file_path in sound_files.items():
-    try:
-        sound_effects[effect_name] = pygame.mixer.Sound(file_path)
-    except pygame.error as e:
-        print(f"Warning: Could not load sound '{effect_name}' from {file_path}. Error: {e}")
-        sound_effects[effect_name] = None # Store None if loading fails
-
-# Pass sound_effects to Player instance
-player.sound_effects = sound_effects
-
-
-# Background Music Functions
-def play_menu_music():
-    try:
-        pygame.mixer.music.load("assets/audio/menu_music.ogg")
-        pygame.mixer.music.play(-1) # Play in a loop
-    except pygame.error as e:
-        print(f"Warning: Could not load menu music. Error: {e}")
-
-def play_stage_music(stage_number):
-    stop_music() # Stop any currently playing music
-    music_file = f"assets/audio/stage{stage_number}_music.ogg"
+MENU_MUSIC_PATH = "assets/audio/menu_music.ogg"
+
+
+def parse_args(argv=None):
+    # Command line: record a session, or verify a recording headless
+    parser = argparse.ArgumentParser(description="Metro City Mayhem")
+    parser.add_argument("--record", metavar="PATH", help="record each game started from the menu: the first to PATH, "
+                        "later ones to PATH with -2, -3, ... before the extension (each written when the next game starts, or on exit)")
+    parser.add_argument("--replay", metavar="PATH", help="play back and verify a recording without a window, then exit")
+    parser.add_argument("--measure-startup", action="store_true",
+                        help="exit as soon as the menu is up and audio is ready; exit code 1 if the startup budget is exceeded")
+    parser.add_argument("--autoplay", nargs="?", const="brawler", choices=sorted(POLICIES), metavar="POLICY",
+                        help=f"let a bot play (policies: {', '.join(sorted(POLICIES))}; default brawler), looping "
+                             "through every stage, retrying on game over and starting over after the ending")
+    parser.add_argument("--soak-minutes", type=float, default=0, help="with --autoplay, exit after this many minutes (0 = never)")
+    parser.add_argument("--soak-log", metavar="PATH", help="with --autoplay, write memory/frame time/entity samples to PATH as JSON lines")
+    parser.add_argument("--soak-interval", type=float, default=SOAK_SAMPLE_INTERVAL, help="seconds between soak samples")
+    parser.add_argument("--uncapped", action="store_true",
+                        help="don't wait for the 60 FPS frame cap; every frame advances one logic tick (fast-forward)")
+    return parser.parse_args(argv)
+
+
+def run_replay(path):
+    # Headless, as fast as the CPU allows
+    replay = Replay.load(path)
     try:
-        pygame.mixer.music.load(music_file)
-        pygame.mixer.music.play(-1) # Play in a loop
-    except pygame.error as e:
-        print(f"Warning: Could not load music for stage {stage_number} from {music_file}. Error: {e}")
-
-def stop_music():
-    pygame.mixer.music.stop()
-    pygame.mixer.music.unload() # Unload to free resources, good practice
-
-
-# Adjust Player's Initial Position (Done after intro before playing)
-# player.pos.x = 100
-# player.pos.y = SCREEN_HEIGHT
-# player.rect.midbottom = (round(player.pos.x), round(player.pos.y))
-# player.vel.x = 0
-# player.vel.y = 0
-
-# Main Menu Drawing Function
-def draw_main_menu(surface, selected_option):
-    surface.fill(pygame.Color('black')) # Background for menu
-
-    # Title
-    title_text = MENU_FONT_TITLE.render("Metro City Mayhem", True, MENU_TEXT_COLOR)
-    title_rect = title_text.get_rect(center=(SCREEN_WIDTH / 2, SCREEN_HEIGHT / 4))
-    surface.blit(title_text, title_rect)
-
-    # Menu Options
-    options = ["Start Game", "Quit"]
-    for i, option_text in enumerate(options):
-        color = MENU_HIGHLIGHT_COLOR if i == selected_option else MENU_TEXT_COLOR
-        text_surf = MENU_FONT_OPTIONS.render(option_text, True, color)
-        text_rect = text_surf.get_rect(center=(SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + i * 60))
-        surface.blit(text_surf, text_rect)
-
-# Game Over Screen Drawing Function
-def draw_game_over_screen(surface, selected_option):
-    surface.fill(pygame.Color('black')) # Background for game over
-
-    # Title
-    title_text = MENU_FONT_TITLE.render("Game Over", True, MENU_TEXT_COLOR)
-    title_rect = title_text.get_rect(center=(SCREEN_WIDTH / 2, SCREEN_HEIGHT / 4))
-    surface.blit(title_text, title_rect)
-
-    # Menu Options
-    options = ["Retry", "Quit to Menu"]
-    for i, option_text in enumerate(options):
-        color = MENU_HIGHLIGHT_COLOR if i == selected_option else MENU_TEXT_COLOR
-        text_surf = MENU_FONT_OPTIONS.render(option_text, True, color)
-        text_rect = text_surf.get_rect(center=(SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + i * 60))
-        surface.blit(text_surf, text_rect)
-
-
-# Initial music call for MENU state
-play_menu_music()
-
-# Main game loop
-clock = pygame.time.Clock()
-while running:
-    dt = clock.tick(60) / 1000.0
-
-    # Event handling
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        if event.type == pygame.KEYDOWN:
-            if game_state == "MENU":
-                if event.key == pygame.K_UP:
-                    selected_menu_option = (selected_menu_option - 1) % 2 # 2 options
-                elif event.key == pygame.K_DOWN:
-                    selected_menu_option = (selected_menu_option + 1) % 2
-                elif event.key == pygame.K_RETURN:
-                    if selected_menu_option == 0: # Start Game
-                        game_state = "INTRO"
-                        current_scene_index = 0 # Start intro from the beginning
-                        # Menu music is already playing, it will transition to stage music after intro
-                    elif selected_menu_option == 1: # Quit
-                        running = False
-            elif game_state == "GAME_OVER":
-                if event.key == pygame.K_UP:
-                    selected_game_over_option = (selected_game_over_option - 1) % 2
-                elif event.key == pygame.K_DOWN:
-                    selected_game_over_option = (selected_game_over_option + 1) % 2
-                elif event.key == pygame.K_RETURN:
-                    if selected_game_over_option == 0: # Retry
-                        player.health = player.max_health
-                        player.stamina = player.max_stamina # Also reset stamina
-                        # Reset player position and reload current stage
-                        current_stage_num_to_retry = stage_manager.current_stage_number if stage_manager.current_stage_number is not None else 1
-                        if not stage_manager.load_stage(current_stage_num_to_retry, player, all_sprites, enemies, projectiles_group_ref=projectiles):
-                            print(f"Failed to reload stage {current_stage_num_to_retry}. Returning to menu.")
-                            game_state = "MENU"
-                            play_menu_music()
-                        else:
-                            background_surface = stage_manager.background_surface
-                            player.pos.x = 100 # Reset to start of stage
-                            player.pos.y = SCREEN_HEIGHT
-                            player.rect.midbottom = (round(player.pos.x), round(player.pos.y))
-                            player.vel.x = player.vel.y = 0
-                            game_state = "PLAYING"
-                            play_stage_music(current_stage_num_to_retry)
-                    elif selected_game_over_option == 1: # Quit to Menu
-                        game_state = "MENU"
-                        selected_menu_option = 0 # Reset menu selection
-                        play_menu_music()
-            elif game_state == "INTRO":
-                if event.key == pygame.K_RETURN:
-                    current_scene_index += 1
-                    if current_scene_index >= len(INTRO_SCENES_DATA):
-                        game_state = "PLAYING"
-                        current_scene_index = 0 # Reset for potential future use
-                        # Load stage 1 and play its music
-                        if not stage_manager.load_stage(1, player, all_sprites, enemies, projectiles_group_ref=projectiles):
-                            print("Failed to load initial stage. Exiting.")
-                            running = False
-                        else:
-                            background_surface = stage_manager.background_surface
-                            player.pos.x = 100
-                            player.pos.y = SCREEN_HEIGHT
-                            player.rect.midbottom = (round(player.pos.x), round(player.pos.y))
-                            player.vel.x = player.vel.y = 0
-                            play_stage_music(1) # Play stage 1 music
-                    # print(f"Intro scene {current_scene_index}")
-            elif game_state == "BOSS_DIALOGUE" and dialogue_box.is_showing:
-                if event.key == pygame.K_RETURN:
-                    if not dialogue_box.next_page():
-                        game_state = "PLAYING"
-                        # if stage_manager.boss: stage_manager.boss.current_state = "idle"
-            elif game_state == "ENDING":
-                if event.key == pygame.K_RETURN:
-                    current_scene_index += 1
-                    if current_scene_index >= len(ENDING_SCENES_DATA):
-                        stop_music() # Stop music before quitting
-                        running = False # End of game after ending sequence
-                    # print(f"Ending scene {current_scene_index}")
-
-            if game_state == "PLAYING": # Moved this block inside KEYDOWN check for PLAYING state
-                if event.key == pygame.K_j: player.punch()
-                if event.key == pygame.K_k: player.kick()
-
-    # Get pressed keys for movement (polled continuously)
-    keys = pygame.key.get_pressed() # Get keys regardless of state, but apply movement only if PLAYING
-
-    # --- Update section based on game_state ---
-    if game_state == "MENU" or game_state == "GAME_OVER":
-        # No specific updates needed for menu or game over beyond event handling
-        pass
-    elif game_state == "PLAYING":
-        player.vel.x = 0
-        player.vel.y = 0
-
-        if keys[pygame.K_LEFT] or keys[pygame.K_a]: player.vel.x = -player.speed
-        if keys[pygame.K_RIGHT] or keys[pygame.K_d]: player.vel.x = player.speed
-        if keys[pygame.K_UP] or keys[pygame.K_w]: player.vel.y = -player.speed
-        if keys[pygame.K_DOWN] or keys[pygame.K_s]: player.vel.y = player.speed
-
-        if stage_manager.current_stage_data:
-            current_stage_length = stage_manager.current_stage_data["length"]
-            all_sprites.update(dt, current_stage_length, SCREEN_HEIGHT)
-            projectiles.update(dt, current_stage_length, SCREEN_HEIGHT)
-        else: # Fallback if no stage is loaded (should not happen after initial load)
-            all_sprites.update(dt, SCREEN_WIDTH, SCREEN_HEIGHT) # Use SCREEN_WIDTH as fallback stage length
-            projectiles.update(dt, SCREEN_WIDTH, SCREEN_HEIGHT)
-
-        stage_manager.update()
-        if stage_manager.current_stage_data: # Ensure stage_length is valid
-            camera.update(target_sprite_rect=player.rect, stage_length=stage_manager.current_stage_data["length"], dt=dt)
-        else: # Fallback if no stage data (e.g. before first load)
-            camera.update(target_sprite_rect=player.rect, stage_length=SCREEN_WIDTH, dt=dt)
-
-
-        # Combat Logic
-        player_hitbox = player.get_hitbox()
-        player_hitbox = player.get_hitbox()
-        if player_hitbox:
-            for enemy_hit in enemies: # This includes regular enemies and bosses
-                if hasattr(enemy_hit, 'hit_cooldown_timer') and enemy_hit.hit_cooldown_timer <= 0: # Check if enemy can be hit again
-                    if enemy_hit.rect.colliderect(player_hitbox):
-                        damage_dealt = player.strength # Player's base strength
-                        enemy_hit.take_damage(damage_dealt) # New way
-                        if isinstance(enemy_hit, Boss):
-                            camera.start_shake(intensity=8, duration=0.3) # Stronger shake for boss hits
-                        else: # Regular enemy hit
-                            camera.start_shake(intensity=3, duration=0.1) # Minor shake for regular enemy
-
-        # Player taking damage from normal enemies
-        for enemy_sprite in enemies:
-            if not isinstance(enemy_sprite, Boss) and hasattr(enemy_sprite, 'is_attacking') and enemy_sprite.is_attacking:
-                if enemy_sprite.rect.colliderect(player.rect):
-                    if player.invulnerability_timer <= 0:
-                        damage_taken = enemy_sprite.strength
-                        player.take_damage(damage_taken)
-                        camera.start_shake(intensity=5, duration=0.2) # Shake when player takes damage
-
-        # Player taking damage from Boss
-        if stage_manager.boss and stage_manager.boss.alive():
-            boss_instance = stage_manager.boss
-            boss_hitbox = boss_instance.get_hitbox() if hasattr(boss_instance, 'get_hitbox') else None
-
-            if boss_hitbox and player.rect.colliderect(boss_hitbox):
-                if player.invulnerability_timer <= 0:
-                    boss_attack_damage = boss_instance.strength
-                    if isinstance(boss_instance, Crusher) and boss_instance.current_state == "special_attack_active":
-                        boss_attack_damage = boss_instance.stomp_damage
-
-                    player.take_damage(boss_attack_damage)
-                    camera.start_shake(intensity=7, duration=0.25) # Stronger shake for boss attacks on player
-
-        # Player taking damage from projectiles
-        for proj in projectiles:
-            if proj.rect.colliderect(player.rect):
-                if player.invulnerability_timer <= 0:
-                    player.take_damage(proj.damage)
-                    camera.start_shake(intensity=4, duration=0.15) # Shake for projectile hits
-                    proj.kill()
-
-        # Enemy defeat logic
-        for enemy_defeated_sprite in list(enemies): # Iterate over a copy for safe removal
-            if enemy_defeated_sprite.health <= 0:
-                player.add_xp(enemy_defeated_sprite.xp_reward)
-                player.money += getattr(enemy_defeated_sprite, 'money_drop', 5)
-                print(f"{enemy_defeated_sprite.__class__.__name__} defeated! Player Money: ${player.money}")
-                if sound_effects["enemy_defeated"]: sound_effects["enemy_defeated"].play()
-                enemy_defeated_sprite.kill()
-
-        if player.health <= 0 and game_state == "PLAYING": # Ensure this only triggers from PLAYING
-            print("GAME OVER")
-            stop_music() # Stop stage music
-            game_state = "GAME_OVER"
-            selected_game_over_option = 0 # Reset game over menu selection
-            # Optional: play a game over sound effect here
-            # if sound_effects["game_over_jingle"]: sound_effects["game_over_jingle"].play()
-
-        if stage_manager.dialogue_to_trigger and not dialogue_box.is_showing:
-            dialogue_data = stage_manager.dialogue_to_trigger
-            dialogue_box.start_dialogue(dialogue_data["name"], dialogue_data["lines"])
-            stage_manager.dialogue_to_trigger = None
-            game_state = "BOSS_DIALOGUE"
-            # if stage_manager.boss: stage_manager.boss.current_state = "paused_for_dialogue" # Optional pause
-
-    elif game_state == "BOSS_DIALOGUE":
-        # Minimal updates, mainly for input handling via event loop
-        pass
-
-    # Stage Transition Logic (Only if playing)
-    if game_state == "PLAYING" and stage_manager.current_stage_data and stage_manager.check_stage_clear_condition(player.pos.x):
-        current_level_num = stage_manager.current_stage_number
-        next_level_num = current_level_num + 1
-        next_stage_exists = any(config["level_number"] == next_level_num for config in STAGE_CONFIGURATIONS)
-        if next_stage_exists:
-            if stage_manager.load_stage(next_level_num, player, all_sprites, enemies, projectiles_group_ref=projectiles):
-                background_surface = stage_manager.background_surface
-                player.pos.x = 100; player.pos.y = SCREEN_HEIGHT
-                player.rect.midbottom = (round(player.pos.x), round(player.pos.y))
-                player.vel.x = 0; player.vel.y = 0
-                play_stage_music(next_level_num) # Play music for the new stage
-                if stage_manager.current_stage_data: camera.update(player.rect, stage_manager.current_stage_data["length"], dt)
+        replay_result = play_replay(replay, create_replay_world(replay, STAGE_CONFIGURATIONS))
+    except ReplayError as e:
+        print(e)
+        return 1
+    print(f"Replay verified: {replay_result['ticks']} ticks, {replay_result['hashes_checked']} state hashes, "
+          f"{replay_result['seconds']:.2f}s ({replay_result['speedup']:.1f}x real time)")
+    return 0
+
+
+class Game:
+    # The windowed game: menus, scenes and the World, driven by run(). Only the
+    # window is created up front. Fonts are created on first use, the World
+    # (and its renderer) when a game starts, and the mixer, sound effects and
+    # menu music right after the first frame, so the menu shows without
+    # waiting for the audio device.
+    def __init__(self, args):
+        init_start = time.perf_counter()
+        self.args = args
+        configure_mixer() # Low-latency mixer buffer; has to happen before the mixer starts
+        pygame.display.init()
+        pygame.font.init() # Explicitly initialize font module
+
+        # Create the game display window
+        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        convert_cached_images() # Anything registered during imports
+        pygame.display.set_caption("Metro City Mayhem")
+
+        self.fonts = {} # name in FONT_SIZES -> Font
+        self.text_cache = TextCache() # Shared by menus, scenes and the HUD; static strings are rendered once
+
+        # Audio, set up by init_audio() after the first frame
+        self.sound_manager = None
+        self.sound_effects = {} # Shared with the World; filled in once audio is ready
+
+        # Frame profiler: always recording into its ring buffer; F3 shows the overlay, F4 dumps a Chrome trace
+        self.profiler = FrameProfiler(enabled=PROFILER_ENABLED)
+        self.profiler_overlay = None
+
+        # Stages are prepared on a worker thread (stage 1 once the menu is up, then always the next one)
+        self.stage_loader = StageAssetLoader(STAGE_CONFIGURATIONS, SCREEN_HEIGHT)
+
+        # The simulation (player, sprite groups, stage, camera, combat) and its view, see get_world()
+        self.world = None
+        self.dialogue_box = None
+        self.world_renderer = None
+
+        self.replay_recorder = ReplayRecorder(args.record) if args.record else None # One file per game
+
+        # Autoplay: the bot's keys replace the keyboard, and the soak sampler watches the run
+        self.bot = BotController(POLICIES[args.autoplay]) if args.autoplay else None
+        self.soak_sampler = SoakSampler(args.soak_interval, args.soak_log) if args.autoplay else None
+        self.running = True
+        self.game_state = "MENU" # Initial game state changed to MENU
+        self.current_scene_index = 0
+        self.selected_menu_option = 0 # 0 for Start Game, 1 for Quit
+        self.selected_game_over_option = 0 # 0 for Retry, 1 for Quit to Menu
+        self.clock = pygame.time.Clock()
+        self.timestep = FixedTimestep() # Runs World.step in fixed FIXED_DT ticks, independent of display frame rate
+        self.pending_attack_keys = [] # Attack presses waiting for the next logic tick
+
+        # Startup timings, in seconds since STARTUP_TIME
+        self.startup = {"imports": IMPORTS_DONE_TIME - STARTUP_TIME, "init": time.perf_counter() - init_start}
+
+    def get_font(self, name):
+        font = self.fonts.get(name)
+        if font is None:
+            font = self.fonts[name] = pygame.font.Font(None, FONT_SIZES[name])
+        return font
+
+    def get_world(self):
+        if self.world is None:
+            self.world = World(STAGE_CONFIGURATIONS, SCREEN_WIDTH, SCREEN_HEIGHT, sound_effects=self.sound_effects,
+                               profiler=self.profiler, asset_loader=self.stage_loader)
+            ui_font = self.get_font("ui")
+            self.dialogue_box = DialogueBox(SCREEN_WIDTH, SCREEN_HEIGHT, font=ui_font, typewriter_speed=DIALOGUE_TYPEWRITER_SPEED)
+            self.world_renderer = WorldRenderer(SCREEN_WIDTH, SCREEN_HEIGHT, ui_font, dirty_rects=DIRTY_RECT_RENDERING,
+                                                text_cache=self.text_cache)
+        return self.world
+
+    def init_audio(self):
+        # Opening the audio device and decoding the WAVs is the slowest part of startup
+        if self.sound_manager is not None:
+            return
+        try:
+            pygame.mixer.init()
+        except pygame.error as e:
+            print(f"Warning: Could not initialize audio. Error: {e}")
+        self.sound_manager = SoundManager() # Does nothing without a mixer
+        for effect_name, (file_path, category, priority, max_voices) in SOUND_FILES.items():
+            self.sound_effects[effect_name] = self.sound_manager.load(effect_name, file_path, category, priority, max_voices) # None if loading fails
+        if self.game_state == "MENU":
+            self.play_menu_music()
+        self.startup["audio_ready"] = time.perf_counter() - STARTUP_TIME
+
+    # Background Music Functions
+    def play_menu_music(self):
+        if not pygame.mixer.get_init():
+            return
+        try:
+            pygame.mixer.music.load(MENU_MUSIC_PATH)
+            pygame.mixer.music.play(-1) # Play in a loop
+        except pygame.error as e:
+            print(f"Warning: Could not load menu music. Error: {e}")
+
+    def play_stage_music(self, stage_number):
+        if not pygame.mixer.get_init():
+            return
+        start = time.perf_counter()
+        self.stop_music() # Stop any currently playing music
+        music_file = STAGE_MUSIC_PATH.format(stage_number)
+        prefetched_music = self.stage_loader.get_music_file(stage_number) # Already in memory, no disk access here
+        try:
+            if prefetched_music is not None:
+                pygame.mixer.music.load(prefetched_music, os.path.splitext(music_file)[1][1:]) # Name hint for the decoder
             else:
-                print(f"Failed to load Stage {next_level_num}. Ending game.")
-                stop_music() # Stop music if loading fails
-                running = False
-        else: # No next stage exists
-            print("Congratulations! Final boss defeated, triggering ENDING.")
-            game_state = "ENDING"
-            current_scene_index = 0 # Reset for ending scenes
-            play_menu_music() # Or a specific victory/ending music if available
-
-    # --- Rendering ---
-    screen.fill(pygame.Color('black')) # Default background
-
-    if game_state == "MENU":
-        draw_main_menu(screen, selected_menu_option)
-    elif game_state == "GAME_OVER":
-        draw_game_over_screen(screen, selected_game_over_option)
-    elif game_state == "INTRO":
-        if current_scene_index < len(INTRO_SCENES_DATA):
-            draw_scene(screen, INTRO_SCENES_DATA[current_scene_index], INTRO_FONT, SCENE_TEXT_COLOR, SCENE_TEXT_PADDING)
-    elif game_state == "PLAYING" or game_state == "BOSS_DIALOGUE": # Draw game world if playing or dialogue overlay
-        if background_surface:
-            screen.blit(background_surface, camera.get_background_blit_rect(background_surface.get_rect()))
-
-        # Draw all sprites (player, enemies, projectiles)
-        # The .image attribute of each sprite will be the correct one (normal or flashed)
-        # due to their own update() methods.
-        for sprite_in_all in all_sprites:
-            screen.blit(sprite_in_all.image, camera.apply_to_sprite(sprite_in_all))
-
-        # Draw health bars for non-boss enemies
-        for enemy in enemies:
-            if stage_manager.boss and enemy == stage_manager.boss: continue # Boss health bar is drawn separately
-            enemy_health_bar_base_rect = pygame.Rect(enemy.rect.x, enemy.rect.top - HEALTH_BAR_OFFSET_Y - HEALTH_BAR_HEIGHT, enemy.rect.width, HEALTH_BAR_HEIGHT)
-            draw_health_bar(screen, enemy.health, enemy.max_health, camera.apply_to_rect(enemy_health_bar_base_rect))
-
-        # HUD Drawing (Player stats, Stage info)
-        player_hud_health_bar_rect = pygame.Rect(10, 10, 150, 20)
-        draw_health_bar(screen, player.health, player.max_health, player_hud_health_bar_rect)
-        player_hud_stamina_bar_rect = pygame.Rect(10, 35, 130, 15)
-        draw_health_bar(screen, player.stamina, player.max_stamina, player_hud_stamina_bar_rect)
-        money_text = UI_FONT.render(f"Money: ${player.money}", True, pygame.Color('white'))
-        screen.blit(money_text, (10, 60))
-        xp_text = UI_FONT.render(f"XP: {player.xp} / {player.xp_to_next_level}", True, pygame.Color('white'))
-        screen.blit(xp_text, (10, 85))
-        stage_name_text = stage_manager.current_stage_data['name'] if stage_manager.current_stage_data else "Loading..."
-        stage_text = UI_FONT.render(f"Stage: {stage_manager.current_stage_number} - {stage_name_text}", True, pygame.Color('white'))
-        screen.blit(stage_text, (10, 110))
-
-        if stage_manager.boss and stage_manager.boss.alive(): # Boss HUD Health Bar
-            boss_name_text = UI_FONT.render(f"{stage_manager.boss.__class__.__name__}", True, pygame.Color('white'))
-            boss_name_rect = boss_name_text.get_rect(centerx=SCREEN_WIDTH / 2, y=10)
-            screen.blit(boss_name_text, boss_name_rect)
-            boss_health_bar_width = SCREEN_WIDTH * 0.6
-            boss_health_bar_height = 25
-            boss_health_bar_x = (SCREEN_WIDTH - boss_health_bar_width) / 2
-            boss_health_bar_y = boss_name_rect.bottom + 5
-            boss_health_bar_rect = pygame.Rect(boss_health_bar_x, boss_health_bar_y, boss_health_bar_width, boss_health_bar_height)
-            draw_health_bar(screen, stage_manager.boss.health, stage_manager.boss.max_health, boss_health_bar_rect)
-
-        if dialogue_box.is_showing: # Draw dialogue box on top of game world
-            dialogue_box.draw(screen)
-
-    elif game_state == "ENDING":
-        if current_scene_index < len(ENDING_SCENES_DATA):
-            draw_scene(screen, ENDING_SCENES_DATA[current_scene_index], INTRO_FONT, SCENE_TEXT_COLOR, SCENE_TEXT_PADDING)
-
-    pygame.display.flip()
-    draw_health_bar(screen, player.health, player.max_health, player_hud_health_bar_rect)
-    player_hud_stamina_bar_rect = pygame.Rect(10, 35, 130, 15)
-    draw_health_bar(screen, player.stamina, player.max_stamina, player_hud_stamina_bar_rect)
-    money_text = UI_FONT.render(f"Money: ${player.money}", True, pygame.Color('white'))
-    screen.blit(money_text, (10, 60))
-    xp_text = UI_FONT.render(f"XP: {player.xp} / {player.xp_to_next_level}", True, pygame.Color('white'))
-    screen.blit(xp_text, (10, 85))
-    stage_name_text = stage_manager.current_stage_data['name'] if stage_manager.current_stage_data else "Loading..."
-    stage_text = UI_FONT.render(f"Stage: {stage_manager.current_stage_number} - {stage_name_text}", True, pygame.Color('white'))
-    screen.blit(stage_text, (10, 110))
-
-    if stage_manager.boss and stage_manager.boss.alive():
-        boss_name_text = UI_FONT.render(f"{stage_manager.boss.__class__.__name__}", True, pygame.Color('white'))
-        boss_name_rect = boss_name_text.get_rect(centerx=SCREEN_WIDTH / 2, y=10)
-        screen.blit(boss_name_text, boss_name_rect)
-        boss_health_bar_width = SCREEN_WIDTH * 0.6
-        boss_health_bar_height = 25
-        boss_health_bar_x = (SCREEN_WIDTH - boss_health_bar_width) / 2
-        boss_health_bar_y = boss_name_rect.bottom + 5
-        boss_health_bar_rect = pygame.Rect(boss_health_bar_x, boss_health_bar_y, boss_health_bar_width, boss_health_bar_height)
-        draw_health_bar(screen, stage_manager.boss.health, stage_manager.boss.max_health, boss_health_bar_rect)
-
-    if dialogue_box.is_showing:
-        dialogue_box.draw(screen)
-
-    pygame.display.flip()
-
-stop_music() # Ensure music is stopped when the game loop ends
-pygame.quit()
+                pygame.mixer.music.load(music_file)
+            pygame.mixer.music.play(-1) # Play in a loop
+        except pygame.error as e:
+            print(f"Warning: Could not load music for stage {stage_number} from {music_file}. Error: {e}")
+        self.stage_loader.record(stage_number, "music", time.perf_counter() - start)
+        print(self.stage_loader.format_metrics(stage_number))
+
+    def stop_music(self):
+        if not pygame.mixer.get_init():
+            return
+        pygame.mixer.music.stop()
+        pygame.mixer.music.unload() # Unload to free resources, good practice
+
+    def stop_sound_effects(self):
+        # Cuts effects still ringing from the previous stage or attempt
+        if self.sound_manager is not None:
+            self.sound_manager.stop_all()
+
+    # Helper function to draw scenes
+    def draw_scene(self, surface, scene_data, font, text_color, padding):
+        surface.fill(scene_data["image_color"])
+        y_offset = padding
+        for i, line in enumerate(scene_data["text_lines"]):
+            text_surface = self.text_cache.render(font, line, True, text_color)
+            text_rect = text_surface.get_rect(centerx=surface.get_width() / 2, y=y_offset + i * (font.get_linesize() * 0.8) )
+            surface.blit(text_surface, text_rect)
+
+        hint_surface = self.text_cache.render(self.get_font("hint"), "Press Enter to continue...", True, text_color)
+        hint_rect = hint_surface.get_rect(centerx=surface.get_width() / 2, bottom=surface.get_height() - padding / 2)
+        surface.blit(hint_surface, hint_rect)
+
+    # Menu screens (main menu, game over): a title and a list of options
+    def draw_menu(self, surface, title, options, selected_option):
+        surface.fill(pygame.Color('black')) # Background for menu
+
+        # Title
+        title_text = self.text_cache.render(self.get_font("menu_title"), title, True, MENU_TEXT_COLOR)
+        title_rect = title_text.get_rect(center=(SCREEN_WIDTH / 2, SCREEN_HEIGHT / 4))
+        surface.blit(title_text, title_rect)
+
+        # Menu Options
+        for i, option_text in enumerate(options):
+            color = MENU_HIGHLIGHT_COLOR if i == selected_option else MENU_TEXT_COLOR
+            text_surf = self.text_cache.render(self.get_font("menu_options"), option_text, True, color)
+            text_rect = text_surf.get_rect(center=(SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + i * 60))
+            surface.blit(text_surf, text_rect)
+
+    def run(self):
+        # Main game loop; returns the process exit code
+        profiler = self.profiler
+        frame_count = 0
+        while self.running:
+            frame_dt = self.clock.tick(0 if self.args.uncapped else 60) / 1000.0
+            if self.args.uncapped:
+                frame_dt = FIXED_DT # Game time runs as fast as frames can be produced
+            frame_start = time.perf_counter()
+            profiler.begin_frame()
+            if self.bot is not None:
+                keys, bot_presses = self.bot.get_keys(self.game_state, self.world)
+                for key in bot_presses: # Handled below like real key presses
+                    pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=key))
+                if self.bot.is_stalled():
+                    self.restart_stalled_autoplay()
+            pressed_this_frame = self.handle_events()
+            if self.bot is None:
+                # Get pressed keys for movement (polled continuously)
+                keys = pygame.key.get_pressed() # Get keys regardless of state, but apply movement only if PLAYING
+            profiler.mark("events")
+            self.update(frame_dt, keys, pressed_this_frame)
+            profiler.mark("simulation") # Whatever the world phases didn't cover (tick loop, event handling, dialogue)
+            if self.sound_manager is not None:
+                self.sound_manager.flush() # Play this frame's sound requests
+            profiler.mark("audio")
+            self.render()
+            profiler.end_frame()
+            if self.soak_sampler is not None:
+                self.soak_sampler.record_frame(time.perf_counter() - frame_start, self.game_state, self.world, self.timestep)
+                if self.args.soak_minutes and self.soak_sampler.get_elapsed() >= self.args.soak_minutes * 60:
+                    self.running = False
+
+            frame_count += 1
+            if frame_count == 1:
+                self.startup["first_frame"] = time.perf_counter() - STARTUP_TIME
+                self.init_audio() # The menu is on screen; now the slow part
+                self.stage_loader.prefetch(1)
+                over_budget = self.report_startup()
+                if self.args.measure_startup:
+                    self.running = False
+                    self.shutdown()
+                    return 1 if over_budget else 0
+        self.shutdown()
+        return 0
+
+    def report_startup(self):
+        # Prints the startup timings; returns True if the first frame missed STARTUP_FIRST_FRAME_BUDGET_MS
+        startup = self.startup
+        first_frame_ms = startup["first_frame"] * 1000
+        print(f"Startup: imports {startup['imports'] * 1000:.1f} ms, init {startup['init'] * 1000:.1f} ms, "
+              f"first frame {first_frame_ms:.1f} ms, audio ready {startup['audio_ready'] * 1000:.1f} ms "
+              f"(first frame budget {STARTUP_FIRST_FRAME_BUDGET_MS} ms)")
+        if first_frame_ms > STARTUP_FIRST_FRAME_BUDGET_MS:
+            print(f"Warning: first frame took {first_frame_ms - STARTUP_FIRST_FRAME_BUDGET_MS:.1f} ms longer than budgeted")
+            return True
+        return False
+
+    def handle_events(self):
+        # Returns the KEYDOWN key codes seen while PLAYING (attack keys for World.step)
+        pressed_this_frame = []
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                self.running = False
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                if self.profiler_overlay is None:
+                    self.profiler_overlay = ProfilerOverlay(self.get_font("hint"), self.text_cache)
+                self.profiler_overlay.toggle()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+                event_count = self.profiler.export_chrome_trace(PROFILER_TRACE_PATH)
+                print(f"Wrote {event_count} profiler events to {PROFILER_TRACE_PATH}")
+            elif event.type == pygame.KEYDOWN and event.key in (pygame.K_F5, pygame.K_F9) and self.game_state == "PLAYING":
+                self.handle_quicksave(event.key == pygame.K_F9)
+            elif event.type == pygame.KEYDOWN:
+                self.handle_key(event.key)
+                if self.game_state == "PLAYING": # Attack keys are edge-triggered, collected for World.step
+                    pressed_this_frame.append(event.key)
+        return pressed_this_frame
+
+    def handle_quicksave(self, load):
+        # F5 saves the world in memory, F9 goes back to it. Off while recording,
+        # since a replay can only restart stages.
+        world = self.world
+        if self.replay_recorder:
+            print("Quicksave is disabled while recording a replay")
+        elif not load:
+            snapshot = world.quicksave()
+            print(f"Quicksaved ({snapshot.get_entity_count()} entities, {snapshot.capture_seconds * 1000:.2f} ms)")
+        else:
+            level_number = world.stage_manager.current_stage_number
+            if not world.quickload():
+                print("Nothing to quickload")
+            elif world.stage_manager.current_stage_number != level_number:
+                self.play_stage_music(world.stage_manager.current_stage_number)
+
+    def handle_key(self, key):
+        if self.game_state == "MENU":
+            if key == pygame.K_UP:
+                self.selected_menu_option = (self.selected_menu_option - 1) % 2 # 2 options
+            elif key == pygame.K_DOWN:
+                self.selected_menu_option = (self.selected_menu_option + 1) % 2
+            elif key == pygame.K_RETURN:
+                if self.selected_menu_option == 0: # Start Game
+                    self.game_state = "INTRO"
+                    self.current_scene_index = 0 # Start intro from the beginning
+                    # Menu music is already playing, it will transition to stage music after intro
+                elif self.selected_menu_option == 1: # Quit
+                    self.running = False
+        elif self.game_state == "GAME_OVER":
+            if key == pygame.K_UP:
+                self.selected_game_over_option = (self.selected_game_over_option - 1) % 2
+            elif key == pygame.K_DOWN:
+                self.selected_game_over_option = (self.selected_game_over_option + 1) % 2
+            elif key == pygame.K_RETURN:
+                if self.selected_game_over_option == 0: # Retry
+                    # Restores health/stamina, reloads the current stage and resets the player position
+                    world = self.get_world()
+                    if self.replay_recorder: self.replay_recorder.record_retry()
+                    self.stop_sound_effects()
+                    if not world.retry_stage():
+                        print(f"Failed to reload stage {world.stage_manager.current_stage_number}. Returning to menu.")
+                        self.game_state = "MENU"
+                        self.play_menu_music()
+                    else:
+                        self.game_state = "PLAYING"
+                        self.play_stage_music(world.stage_manager.current_stage_number)
+                elif self.selected_game_over_option == 1: # Quit to Menu
+                    self.stop_sound_effects()
+                    self.game_state = "MENU"
+                    self.selected_menu_option = 0 # Reset menu selection
+                    self.play_menu_music()
+        elif self.game_state == "INTRO":
+            if key == pygame.K_RETURN:
+                self.current_scene_index += 1
+                if self.current_scene_index >= len(INTRO_SCENES_DATA):
+                    self.game_state = "PLAYING"
+                    self.current_scene_index = 0 # Reset for potential future use
+                    # Load stage 1 and play its music
+                    world = self.get_world()
+                    if self.replay_recorder:
+                        self.save_replay() # The previous game's, if any
+                        self.replay_recorder.start(world, 1) # Reseeds the world
+                    if not world.load_stage(1):
+                        print("Failed to load initial stage. Exiting.")
+                        self.running = False
+                    else:
+                        self.play_stage_music(1) # Play stage 1 music
+        elif self.game_state == "BOSS_DIALOGUE" and self.dialogue_box.is_showing:
+            if key == pygame.K_RETURN:
+                if not self.dialogue_box.next_page():
+                    self.game_state = "PLAYING"
+        elif self.game_state == "ENDING":
+            if key == pygame.K_RETURN:
+                self.current_scene_index += 1
+                if self.current_scene_index >= len(ENDING_SCENES_DATA):
+                    if self.bot is not None: # Autoplay starts over from the menu
+                        self.game_state = "MENU"
+                        self.selected_menu_option = 0
+                        self.play_menu_music()
+                        return
+                    self.stop_music() # Stop music before quitting
+                    self.running = False # End of game after ending sequence
+
+    def restart_stalled_autoplay(self):
+        # Nothing left to fight and no way forward; start over from the menu like after the ending
+        print(f"Autoplay: stage {self.world.stage_manager.current_stage_number} stalled (no enemies left, "
+              f"no progress for {self.bot.stall_frames} frames); starting over from the menu")
+        self.bot.restart()
+        self.stop_music()
+        self.stop_sound_effects()
+        self.game_state = "MENU"
+        self.selected_menu_option = 0
+        self.play_menu_music()
+
+    def update(self, frame_dt, keys, pressed_this_frame):
+        # --- Update section based on game_state ---
+        if self.game_state == "PLAYING":
+            world = self.world
+            self.pending_attack_keys.extend(pressed_this_frame)
+            steps = self.timestep.advance(frame_dt)
+            if self.timestep.last_dropped_time > 0:
+                print(f"Simulation fell behind: dropped {self.timestep.last_dropped_time * 1000:.0f} ms "
+                      f"({self.timestep.dropped_time * 1000:.0f} ms over {self.timestep.dropped_frames} frames so far)")
+            for _ in range(steps):
+                tick_input = PlayerInput.from_keys(keys, self.pending_attack_keys)
+                self.pending_attack_keys = [] # Presses apply to the first tick only
+                world_events = world.step(tick_input, FIXED_DT)
+                if self.replay_recorder: self.replay_recorder.record_tick(tick_input, world)
+                for world_event in world_events:
+                    self.handle_world_event(world_event)
+                if self.game_state != "PLAYING" or not self.running:
+                    break
+        elif self.game_state == "BOSS_DIALOGUE":
+            self.dialogue_box.update(frame_dt) # Typewriter reveal
+        if self.game_state != "PLAYING":
+            self.timestep.reset() # Don't bank time while paused; resume cleanly
+            self.pending_attack_keys = []
+
+    def handle_world_event(self, world_event):
+        if world_event[0] == "game_over":
+            self.stop_music() # Stop stage music
+            self.game_state = "GAME_OVER"
+            self.selected_game_over_option = 0 # Reset game over menu selection
+        elif world_event[0] == "boss_dialogue" and not self.dialogue_box.is_showing:
+            self.dialogue_box.start_dialogue(world_event[1]["name"], world_event[1]["lines"])
+            self.game_state = "BOSS_DIALOGUE"
+        elif world_event[0] == "stage_loaded":
+            self.stop_sound_effects()
+            self.play_stage_music(world_event[1]) # Play music for the new stage
+        elif world_event[0] == "stage_load_failed":
+            self.stop_music() # Stop music if loading fails
+            self.running = False
+        elif world_event[0] == "game_complete":
+            self.stop_sound_effects()
+            self.game_state = "ENDING"
+            self.current_scene_index = 0 # Reset for ending scenes
+            self.play_menu_music() # Or a specific victory/ending music if available
+
+    def render(self):
+        screen = self.screen
+        profiler = self.profiler
+        overlay = self.profiler_overlay
+        render_alpha = self.timestep.alpha if self.game_state == "PLAYING" else 1.0
+        if self.game_state == "PLAYING" or self.game_state == "BOSS_DIALOGUE": # Draw game world if playing or dialogue overlay
+            # Returns None after a full redraw, otherwise only the regions that changed (possibly none)
+            dirty_rects = self.world_renderer.draw(screen, self.world, self.dialogue_box, render_alpha)
+            if overlay is not None and overlay.visible:
+                overlay.draw(screen, profiler, self.timestep)
+                self.world_renderer.invalidate() # The overlay isn't tracked by the dirty-rect renderer
+                dirty_rects = None
+                profiler.mark("render.profiler_overlay")
+            if dirty_rects is None:
+                pygame.display.flip()
+            elif dirty_rects:
+                pygame.display.update(dirty_rects)
+            profiler.mark("display.flip")
+            return
+
+        if self.world_renderer is not None:
+            self.world_renderer.invalidate() # Menus and scenes cover the world view
+        screen.fill(pygame.Color('black')) # Default background
+
+        if self.game_state == "MENU":
+            self.draw_menu(screen, "Metro City Mayhem", ["Start Game", "Quit"], self.selected_menu_option)
+        elif self.game_state == "GAME_OVER":
+            self.draw_menu(screen, "Game Over", ["Retry", "Quit to Menu"], self.selected_game_over_option)
+        elif self.game_state == "INTRO":
+            if self.current_scene_index < len(INTRO_SCENES_DATA):
+                self.draw_scene(screen, INTRO_SCENES_DATA[self.current_scene_index], self.get_font("intro"), SCENE_TEXT_COLOR, SCENE_TEXT_PADDING)
+        elif self.game_state == "ENDING":
+            if self.current_scene_index < len(ENDING_SCENES_DATA):
+                self.draw_scene(screen, ENDING_SCENES_DATA[self.current_scene_index], self.get_font("intro"), SCENE_TEXT_COLOR, SCENE_TEXT_PADDING)
+        if overlay is not None:
+            overlay.draw(screen, profiler, self.timestep)
+        profiler.mark("render.menus")
+
+        pygame.display.flip()
+        profiler.mark("display.flip")
+
+    def shutdown(self):
+        self.stop_music() # Ensure music is stopped when the game loop ends
+        self.stage_loader.shutdown()
+        if self.sound_manager is not None:
+            sound_stats = self.sound_manager.get_stats()
+            print(f"Sound effects: {sound_stats['requested']} requested, {sound_stats['played']} played, "
+                  f"{sound_stats['coalesced']} coalesced, {sound_stats['dropped_voice_limit'] + sound_stats['dropped_no_channel']} dropped, "
+                  f"{sound_stats['stolen']} cut off")
+        timestep_stats = self.timestep.get_stats()
+        if timestep_stats["dropped_frames"]:
+            print(f"Catch-up cap: {timestep_stats['dropped_time'] * 1000:.0f} ms of simulation time dropped "
+                  f"over {timestep_stats['dropped_frames']} frames ({timestep_stats['total_steps']} ticks run)")
+        if self.world is not None and self.world.entity_pool is not None:
+            pool_stats = self.world.entity_pool.get_stats()
+            print(f"Enemy pool: {pool_stats['created']} created, {pool_stats['reused']} reused "
+                  f"({pool_stats['reuse_rate']:.0%}), {pool_stats['discarded']} discarded")
+        if self.soak_sampler is not None:
+            report = self.soak_sampler.get_report()
+            print(f"Soak: {self.soak_sampler.get_elapsed() / 60:.1f} min, {report['samples']} samples, "
+                  f"{report['stage_changes']} stage changes, {report['game_overs']} game overs, {report['retries']} retries, "
+                  f"{report['games_completed']} games completed")
+            if "object_growth" in report:
+                resident = f"{report['rss_growth_kb']} KB resident, " if "rss_growth_kb" in report else ""
+                print(f"  Growth after warm-up: {resident}{report['object_growth']} Python objects, "
+                      f"mean frame time {report['frame_time_growth']:+.0%}")
+            for warning in report["warnings"]:
+                print(f"  Warning: {warning}")
+        if self.bot is not None and self.bot.stalls:
+            print(f"Autoplay: {self.bot.stalls} stalled run(s) restarted from the menu")
+        if self.replay_recorder:
+            self.save_replay()
+
+    def save_replay(self):
+        path = self.replay_recorder.get_game_path()
+        if self.replay_recorder.stop(path):
+            print(f"Replay saved to {path}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # The simulation logs loads, hits and kills at INFO; shown while playing, not when verifying a replay
+    logging.basicConfig(level=logging.WARNING if args.replay else logging.INFO, format="%(message)s", stream=sys.stdout)
+    if args.replay:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy") # Headless, as fast as the CPU allows
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+        exit_code = run_replay(args.replay)
+    else:
+        exit_code = Game(args).run()
+    pygame.quit()
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
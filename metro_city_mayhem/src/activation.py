@@ -0,0 +1,73 @@
+import pygame
+from src.settings import ACTIVATION_WAKE_MARGIN, ACTIVATION_SLEEP_HYSTERESIS
+
+class ActivationManager:
+    # Splits the enemies group into awake and dormant sets. Only awake enemies
+    # get update() calls; dormant ones cost nothing per frame. An enemy is dormant
+    # whenever it is in the enemies group but not in self.awake, so enemies that
+    # are spawned later need no registration.
+    #
+    # Waking uses the enemies' spatial index, so it only touches the cells around
+    # the camera. The decision depends only on positions at the start of the
+    # tick, which keeps it deterministic.
+    #
+    # Enemies simulated by a CrowdSystem are never woken; the crowd updates them
+    # every tick, so they are counted as "crowd" rather than awake or asleep.
+    def __init__(self, wake_margin=ACTIVATION_WAKE_MARGIN, sleep_hysteresis=ACTIVATION_SLEEP_HYSTERESIS):
+        self.wake_margin = wake_margin
+        self.sleep_hysteresis = sleep_hysteresis
+        self.awake = pygame.sprite.Group()
+
+        # Counters
+        self.awake_count = 0
+        self.asleep_count = 0
+        self.crowd_count = 0
+        self.total_wakes = 0
+        self.total_sleeps = 0
+
+    def reset(self):
+        self.awake.empty()
+        self.awake_count = self.asleep_count = self.crowd_count = 0
+
+    def get_wake_region(self, camera, player, screen_height):
+        # Camera view widened by the wake margin, plus the player's surroundings
+        # in case the camera isn't following the player (e.g. before the first update)
+        region = pygame.Rect(round(camera.offset.x) - self.wake_margin, 0, camera.screen_width + 2 * self.wake_margin, screen_height)
+        region.union_ip(player.rect.inflate(2 * self.wake_margin, 0))
+        return region
+
+    def refresh(self, enemies, camera, player, screen_height, crowd_count=0):
+        # enemies: the World's SpatialGroup of all enemies (including bosses)
+        # crowd_count: how many of them a CrowdSystem simulates
+        wake_region = self.get_wake_region(camera, player, screen_height)
+        awake = self.awake
+
+        # Wake dormant enemies that came into range
+        for enemy in enemies.query(wake_region):
+            if enemy.crowd is None and enemy not in awake:
+                awake.add(enemy)
+                self.total_wakes += 1
+
+        # Put idle enemies that drifted out of range to sleep
+        sleep_region = wake_region.inflate(2 * self.sleep_hysteresis, 0)
+        for enemy in awake.sprites():
+            if not sleep_region.colliderect(enemy.rect) and self.is_settled(enemy):
+                awake.remove(enemy)
+                self.total_sleeps += 1
+
+        self.awake_count = len(awake)
+        self.crowd_count = crowd_count
+        self.asleep_count = len(enemies) - self.awake_count - crowd_count
+
+    def is_settled(self, enemy):
+        # Only sleep enemies with nothing in flight, so waking up later resumes cleanly
+        return enemy.vel.x == 0 and enemy.vel.y == 0 and not enemy.is_flashing and enemy.hit_cooldown_timer <= 0
+
+    def get_stats(self):
+        return {
+            "awake": self.awake_count,
+            "asleep": self.asleep_count,
+            "crowd": self.crowd_count,
+            "total_wakes": self.total_wakes,
+            "total_sleeps": self.total_sleeps,
+        }
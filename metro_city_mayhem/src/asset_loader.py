@@ -0,0 +1,139 @@
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from src.settings import STAGE_MUSIC_PATH, STAGE_PREFETCH_TILES
+from src.background import ChunkedBackground
+from src.image_cache import get_sprite_image, get_flash_image
+from src.stage_data import get_stage_table
+
+
+class StageAssets:
+    # Everything a stage load needs that can be prepared ahead of time
+    def __init__(self, level_number, background, entity_classes, music_path, music_data=None, music_error=None):
+        self.level_number = level_number
+        self.background = background # ChunkedBackground with its first tiles already built
+        self.entity_classes = entity_classes # Regular enemy classes placed in the stage
+        self.music_path = music_path
+        self.music_data = music_data # Raw file bytes, or None if the file couldn't be read
+        self.music_error = music_error
+        self.installed = False
+
+
+class StageAssetLoader:
+    # Prepares stages on a background thread so that loading one on the main
+    # thread only swaps finished objects in. World.load_stage() takes the
+    # assets for the stage it loads and asks for the next stage to be
+    # prefetched while the current one is played.
+    #
+    # The worker only does plain data work: reading the music file into
+    # memory and filling the first background tiles. Anything that touches the display (converting tiles to the
+    # screen format, the shared sprite images) is finished in take() on the
+    # main thread.
+    def __init__(self, stage_configurations, screen_height, music_path_format=STAGE_MUSIC_PATH, prefetch_tiles=STAGE_PREFETCH_TILES):
+        self.stage_table = get_stage_table(stage_configurations, screen_height)
+        self.screen_height = screen_height
+        self.music_path_format = music_path_format
+        self.prefetch_tiles = prefetch_tiles
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stage-loader")
+        self.pending = {} # level_number -> Future of StageAssets
+        self.metrics = {} # level_number -> {metric: milliseconds or flag}, see record()
+
+    def prefetch(self, level_number):
+        # Queue a stage for loading on the worker. Returns False for unknown stages.
+        config = self.stage_table.get(level_number)
+        if config is None:
+            return False
+        if level_number not in self.pending:
+            self.pending[level_number] = self.executor.submit(self._load, config)
+        return True
+
+    def wait(self, level_number, timeout=None):
+        # Block until a prefetch finishes; True if the stage is ready
+        future = self.pending.get(level_number)
+        if future is None:
+            return False
+        try:
+            future.exception(timeout)
+        except TimeoutError:
+            return False
+        return True
+
+    def retain(self, level_numbers):
+        # Forget prefetched stages that aren't in level_numbers (e.g. the current and next stage)
+        for level_number in list(self.pending):
+            if level_number not in level_numbers:
+                del self.pending[level_number]
+
+    def _load(self, config):
+        # Runs on the worker thread
+        start = time.perf_counter()
+        level_number = config["level_number"]
+        background = ChunkedBackground(config["length"], self.screen_height,
+                                       config.get("background_color", "darkgrey"),
+                                       image_path=config.get("background_image_path"))
+        background.prebuild(self.prefetch_tiles)
+
+        music_path = self.music_path_format.format(level_number)
+        music_data = music_error = None
+        try:
+            with open(music_path, "rb") as music_file:
+                music_data = music_file.read()
+        except OSError as e:
+            music_error = e
+
+        assets = StageAssets(level_number, background, config["enemy_placements"].classes, music_path, music_data, music_error)
+        self.record(level_number, "prefetch", time.perf_counter() - start)
+        self.record_value(level_number, "music_bytes", len(music_data) if music_data else 0)
+        return assets
+
+    def take(self, level_number):
+        # Assets for a stage about to be loaded, or None for unknown stages.
+        # Waits for the worker if the prefetch hasn't finished, and loads on
+        # the spot if the stage was never prefetched.
+        start = time.perf_counter()
+        future = self.pending.get(level_number)
+        self.record_value(level_number, "prefetched", future is not None and future.done())
+        if future is None:
+            if not self.prefetch(level_number):
+                return None
+            future = self.pending[level_number]
+        assets = future.result()
+        self.record(level_number, "wait", time.perf_counter() - start)
+
+        if not assets.installed:
+            install_start = time.perf_counter()
+            assets.background.convert_tiles()
+            for EnemyClass in assets.entity_classes: # Warm the shared sprite images before the first spawn
+                image_size = getattr(EnemyClass, "image_size", None)
+                if image_size is not None and not EnemyClass.is_boss:
+                    get_flash_image(get_sprite_image(image_size, EnemyClass.image_color))
+            assets.installed = True
+            self.record(level_number, "convert", time.perf_counter() - install_start)
+        return assets
+
+    def get_music_file(self, level_number):
+        # In-memory file for pygame.mixer.music.load(), or None if it isn't available.
+        # Doesn't block: a stage whose prefetch is still running returns None.
+        future = self.pending.get(level_number)
+        if future is None or not future.done() or future.exception() is not None:
+            return None
+        data = future.result().music_data
+        return io.BytesIO(data) if data is not None else None
+
+    def record(self, level_number, name, seconds):
+        self.record_value(level_number, name, seconds * 1000)
+
+    def record_value(self, level_number, name, value):
+        self.metrics.setdefault(level_number, {})[name] = value
+
+    def get_metrics(self, level_number):
+        return dict(self.metrics.get(level_number, {}))
+
+    def format_metrics(self, level_number):
+        metrics = self.metrics.get(level_number, {})
+        parts = [f"{name} {metrics[name]:.2f} ms" for name in ("prefetch", "wait", "convert", "install", "music") if name in metrics]
+        source = "prefetched" if metrics.get("prefetched") else "loaded on demand"
+        return f"Stage {level_number} assets ({source}): " + ", ".join(parts)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
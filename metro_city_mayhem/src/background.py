@@ -0,0 +1,85 @@
+import pygame
+from collections import OrderedDict
+from src.settings import BACKGROUND_TILE_WIDTH, BACKGROUND_MAX_CACHED_TILES
+from src.image_cache import convert_for_display
+
+class ChunkedBackground:
+    # A stage-length background made of fixed-width tiles. Tiles are built the
+    # first time they scroll into view and kept in a small LRU cache, so memory
+    # stays constant no matter how long the stage is and drawing only blits the
+    # tiles that intersect the viewport.
+    def __init__(self, stage_length, height, color, tile_width=BACKGROUND_TILE_WIDTH, max_cached_tiles=BACKGROUND_MAX_CACHED_TILES, image_path=None):
+        self.stage_length = stage_length
+        self.height = height
+        self.color = pygame.Color(color)
+        self.tile_width = tile_width
+        self.max_cached_tiles = max(2, max_cached_tiles) # Never evict a tile we're about to draw
+        self.image_path = image_path # Placeholder: real art would be sliced per tile in _build_tile
+        self.num_tiles = max(1, -(-stage_length // tile_width)) # Ceiling division
+
+        self.tiles = OrderedDict() # tile index -> Surface, least recently used first
+        self.unconverted_tiles = set() # Prebuilt before a window existed, see prebuild()
+        self.tiles_built = 0
+        self.tiles_evicted = 0
+
+    def get_width(self):
+        return self.stage_length
+
+    def _build_tile(self, index, convert=True, pixel_format=None):
+        width = min(self.tile_width, self.stage_length - index * self.tile_width)
+        if pixel_format is not None:
+            tile = pygame.Surface((width, self.height), 0, pixel_format) # Already in the display's format
+        else:
+            tile = pygame.Surface((width, self.height))
+        tile.fill(self.color)
+        self.tiles_built += 1
+        return convert_for_display(tile) if convert else tile
+
+    def prebuild(self, count):
+        # Build the first tiles ahead of time without calling convert(), so this
+        # can run on a loader thread. If a window exists the tiles are created
+        # in its pixel format directly; otherwise convert_tiles() does it later.
+        display = pygame.display.get_surface()
+        for index in range(min(count, self.num_tiles, self.max_cached_tiles)):
+            if index not in self.tiles:
+                self.tiles[index] = self._build_tile(index, convert=False, pixel_format=display)
+                if display is None:
+                    self.unconverted_tiles.add(index)
+
+    def convert_tiles(self):
+        for index in self.unconverted_tiles:
+            if index in self.tiles:
+                self.tiles[index] = convert_for_display(self.tiles[index])
+        self.unconverted_tiles.clear()
+
+    def get_tile(self, index):
+        tile = self.tiles.get(index)
+        if tile is not None:
+            self.tiles.move_to_end(index)
+            return tile
+        tile = self._build_tile(index)
+        self.tiles[index] = tile
+        if len(self.tiles) > self.max_cached_tiles:
+            self.tiles.popitem(last=False) # Evict least recently used
+            self.tiles_evicted += 1
+        return tile
+
+    def get_visible_tile_range(self, offset_x, view_width):
+        first = max(0, int(offset_x) // self.tile_width)
+        last = min(self.num_tiles - 1, (int(offset_x) + view_width - 1) // self.tile_width)
+        return first, last
+
+    def draw(self, surface, offset_x, offset_y=0):
+        offset_x = round(offset_x)
+        offset_y = round(offset_y)
+        first, last = self.get_visible_tile_range(offset_x, surface.get_width())
+        for index in range(first, last + 1):
+            surface.blit(self.get_tile(index), (index * self.tile_width - offset_x, -offset_y))
+
+    def get_stats(self):
+        return {
+            "tiles_total": self.num_tiles,
+            "tiles_cached": len(self.tiles),
+            "tiles_built": self.tiles_built,
+            "tiles_evicted": self.tiles_evicted,
+        }
@@ -1,25 +1,15 @@
 import pygame
 from src.enemy import Enemy # Bosses are a type of Enemy
 from src.projectile import Projectile # For Viper boss
+from src.image_cache import get_sprite_image, get_flash_image
 
 class Boss(Enemy):
+    is_boss = True
+
     def __init__(self, start_pos_x, start_pos_y, player_ref, health, strength, defense, speed, xp_reward, money_drop, image_path=None, image_color=None, image_size=None):
+        self.base_stats = (health, strength, defense, speed, xp_reward, money_drop) # Applied by reset()
         super().__init__(start_pos_x, start_pos_y, player_ref) # Call Enemy's init
 
-        # Override or set specific boss stats
-        self.health = health
-        self.max_health = self.health # Ensure max_health is also set
-        self.strength = strength
-        self.defense = defense
-        self.speed = speed
-        self.xp_reward = xp_reward
-        self.money_drop = money_drop
-
-        # Boss-specific attributes
-        self.special_attack_cooldown_max = 10.0 # Default: 10 seconds cooldown for special
-        self.special_attack_cooldown_timer = 0.0
-        self.current_state = "idle" # e.g., "idle", "chasing", "attacking", "special_attack_charging", "special_attack_active", "vulnerable"
-
         # Visuals - Allow customization via parameters
         # Base Enemy class already creates a default surface. We might override it here.
         original_rect_midbottom = self.rect.midbottom # Preserve position from Enemy.__init__
@@ -29,8 +19,7 @@ class Boss(Enemy):
             # For now, if image_path is provided but not loaded, we don't change the image from super
             pass # Placeholder for now, actual image loading would replace self.image
         elif image_color and image_size:
-            self.image = pygame.Surface(image_size)
-            self.image.fill(pygame.Color(image_color))
+            self.image = get_sprite_image(image_size, image_color)
         # else, it will use the default red Enemy image if not overridden by subclass or above logic
 
         # Update rect if image was changed from the default Enemy image
@@ -38,10 +27,23 @@ class Boss(Enemy):
             self.rect = self.image.get_rect()
             self.rect.midbottom = original_rect_midbottom # Restore position
 
-        self.original_image = self.image.copy() # Ensure original_image is based on the final boss image
+        self.original_image = self.image # Ensure original_image is based on the final boss image
+        self.flash_image = get_flash_image(self.original_image)
 
         # print(f"Boss {self.__class__.__name__} initialized. State: {self.current_state}, HP: {self.health}")
 
+    def reset(self, start_pos_x, start_pos_y, player_ref):
+        super().reset(start_pos_x, start_pos_y, player_ref)
+
+        # Override or set specific boss stats
+        self.health, self.strength, self.defense, self.speed, self.xp_reward, self.money_drop = self.base_stats
+        self.max_health = self.health # Ensure max_health is also set
+
+        # Boss-specific attributes
+        self.special_attack_cooldown_max = 10.0 # Default: 10 seconds cooldown for special
+        self.special_attack_cooldown_timer = 0.0
+        self.current_state = "idle" # e.g., "idle", "chasing", "attacking", "special_attack_charging", "special_attack_active", "vulnerable"
+
     def update(self, dt, stage_width, screen_height): # Ensure it takes all params
         # Flash timer logic is now handled by Enemy's update method
         # if self.is_flashing:
@@ -67,6 +69,10 @@ class Boss(Enemy):
         # print(f"Boss {self.__class__.__name__} update. State: {self.current_state}, Cooldown: {self.special_attack_cooldown_timer:.2f}")
 
 
+    def get_hitbox(self):
+        # Subclasses return their active attack hitbox; a plain Boss has none
+        return None
+
     def attempt_special_attack(self):
         if self.special_attack_cooldown_timer <= 0:
             # Logic for special attack would go here or be triggered by state change
@@ -111,6 +117,9 @@ class Spike(Boss):
             xp_reward=100, money_drop=50,
             image_color='darkgreen', image_size=(40, 70)
         )
+
+    def reset(self, start_pos_x, start_pos_y, player_ref):
+        super().reset(start_pos_x, start_pos_y, player_ref)
         self.attack_range = 60
         self.punch_cooldown_max = 0.8
         self.punch_cooldown_timer = 0.0
@@ -166,6 +175,9 @@ class Crusher(Boss):
             xp_reward=200, money_drop=100,
             image_color='darkblue', image_size=(60, 80)
         )
+
+    def reset(self, start_pos_x, start_pos_y, player_ref):
+        super().reset(start_pos_x, start_pos_y, player_ref)
         self.stomp_charge_time = 1.2
         self.stomp_duration = 0.6
         self.stomp_aoe_width = 180
@@ -214,13 +226,20 @@ class Crusher(Boss):
         return None
 
 class Viper(Boss):
-    def __init__(self, start_pos_x, start_pos_y, player_ref, all_sprites_group, projectiles_group):
+    def __init__(self, start_pos_x, start_pos_y, player_ref, all_sprites_group, projectiles_group, projectile_pool=None, bullet_system=None):
         super().__init__(
             start_pos_x, start_pos_y, player_ref,
             health=200, strength=18, defense=6, speed=3.2,
             xp_reward=300, money_drop=150,
             image_color='purple', image_size=(45, 65)
         )
+        self.all_sprites = all_sprites_group # For adding projectiles
+        self.projectiles = projectiles_group # For adding projectiles
+        self.projectile_pool = projectile_pool # If set, shots are recycled instead of allocated
+        self.bullet_system = bullet_system # If set, shots go to the array-backed BulletSystem
+
+    def reset(self, start_pos_x, start_pos_y, player_ref):
+        super().reset(start_pos_x, start_pos_y, player_ref)
         self.melee_attack_range = 70
         self.melee_cooldown_max = 1.2; self.melee_cooldown_timer = 0.0
         self.is_melee_attacking_now = False # Specific to Viper's melee
@@ -229,9 +248,12 @@ class Viper(Boss):
         self.ranged_attack_range_min = 180
         self.ranged_attack_range_max = 450
         self.special_attack_cooldown_max = 4.0 # Uses Boss's timer for ranged attack
+        # Shots used to be updated twice per frame (through all_sprites and projectiles), so 450
+        # travelled ~900 px/s; now they are updated once per tick, and this keeps that speed
+        self.projectile_speed = 900
 
-        self.all_sprites = all_sprites_group # For adding projectiles
-        self.projectiles = projectiles_group # For adding projectiles
+        self.shot_count = 1 # Bullets per ranged attack; >1 fires a fan (BulletSystem only)
+        self.shot_spread_degrees = 30
 
     def update(self, dt, stage_width, screen_height):
         self.vel.x = 0
@@ -253,12 +275,19 @@ class Viper(Boss):
                 self.current_state = "special_attack_active" # Viper's special is shooting
                 proj_start_x = self.rect.centerx
                 proj_start_y = self.rect.centery
-                proj_vel_x = 450
+                proj_vel_x = self.projectile_speed
                 if self.player_ref.pos.x < self.pos.x: proj_vel_x = -proj_vel_x
 
-                projectile = Projectile(proj_start_x, proj_start_y, proj_vel_x)
-                if self.all_sprites is not None: self.all_sprites.add(projectile)
-                if self.projectiles is not None: self.projectiles.add(projectile)
+                if self.bullet_system is not None:
+                    direction = 1 if proj_vel_x > 0 else -1
+                    self.bullet_system.spawn_spread(proj_start_x, proj_start_y, abs(proj_vel_x), direction,
+                                                    self.shot_count, self.shot_spread_degrees)
+                elif self.projectile_pool is not None:
+                    self.projectile_pool.acquire(proj_start_x, proj_start_y, proj_vel_x) # Adds to the pool's groups
+                else:
+                    projectile = Projectile(proj_start_x, proj_start_y, proj_vel_x)
+                    if self.all_sprites is not None: self.all_sprites.add(projectile)
+                    if self.projectiles is not None: self.projectiles.add(projectile)
                 self.special_attack_cooldown_timer = self.special_attack_cooldown_max # Main cooldown used for ranged
             elif distance_to_player < self.melee_attack_range and self.melee_cooldown_timer <= 0:
                 self.current_state = "attacking"
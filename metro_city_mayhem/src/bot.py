@@ -0,0 +1,316 @@
+import gc
+import json
+import os
+import random
+import sys
+import time
+import pygame
+from src.settings import (BOT_SIGHT, BOT_ALIGN_TOLERANCE, BOT_SHOT_CLEARANCE, BOT_CAUTIOUS_HEALTH_FRACTION, BOT_MENU_PRESS_INTERVAL,
+                          BOT_STALL_FRAMES, SOAK_SAMPLE_INTERVAL, SOAK_MEMORY_GROWTH_WARNING_KB, SOAK_FRAME_TIME_GROWTH_WARNING)
+from src.world import PlayerInput
+
+try:
+    import resource
+except ImportError: # Not on Windows; memory is then read from /proc or not at all
+    resource = None
+
+# Autoplay. A BotController stands in for the keyboard: every frame it says
+# which keys are held and which were just pressed for the state the game is
+# in. While PLAYING that's a policy's movement and attacks; on menus, scenes,
+# boss dialogue and the game-over screen (Retry is preselected) it presses
+# Enter. main.py posts the presses as KEYDOWN events and reads the held keys
+# instead of pygame.key.get_pressed(), so the bot runs exactly the code a
+# player's keys do. The bot only ever plays by the game's rules: as a
+# fallback, when a run can't go anywhere (no enemies left, and walking right
+# gets the player no further) it reports the run as stalled, and autoplay
+# starts over from the menu.
+#
+# Policies are policy(world, rng) -> PlayerInput; batch_runner.py uses them
+# directly, without the game loop.
+
+
+# --- Scripted player policies ---
+
+def find_target(world):
+    # The closest enemy within BOT_SIGHT of the player, or None
+    player = world.player
+    view = pygame.Rect(0, 0, 2 * BOT_SIGHT, world.screen_height)
+    view.center = player.rect.center
+    target = None
+    best = None
+    for enemy in world.enemies.query(view):
+        distance = abs(enemy.pos.x - player.pos.x)
+        if best is None or distance < best:
+            target, best = enemy, distance
+    return target
+
+
+def approach_and_attack(world, rng, target, reaction):
+    # Lines up with target, turns to face it and attacks once in reach.
+    # reaction: chance per tick of attacking when an attack is possible.
+    player = world.player
+    dx = target.pos.x - player.pos.x
+    dy = target.pos.y - player.pos.y
+    tolerance = BOT_ALIGN_TOLERANCE
+    if hasattr(target, "ranged_attack_range_min"):
+        # A shooter (Viper): stand just above its shot line, out of its shots but still in reach
+        dy = target.rect.centery - BOT_SHOT_CLEARANCE - player.pos.y
+        tolerance = 1
+    facing = 1 if dx > 0 else -1
+    move_y = 0 if abs(dy) <= tolerance else (1 if dy > 0 else -1)
+    reach = (player.rect.width + target.rect.width) / 2 + 40 # 40: the player's hitbox width
+    if abs(dx) > reach - 4:
+        return PlayerInput(facing, move_y)
+    if player.facing_right != (facing > 0):
+        return PlayerInput(facing, move_y) # One tick of movement turns the player around
+    if rng.random() < reaction:
+        punch = rng.random() < 0.5
+        return PlayerInput(0, move_y, punch=punch, kick=not punch)
+    return PlayerInput(0, move_y)
+
+
+def policy_brawler(world, rng):
+    # Walks right and fights whatever is closest
+    target = find_target(world)
+    if target is None:
+        return PlayerInput(1, 0)
+    return approach_and_attack(world, rng, target, reaction=0.5)
+
+
+def policy_cautious(world, rng):
+    # Fights like the brawler, but backs away from attacking enemies while hurt
+    player = world.player
+    target = find_target(world)
+    if target is None:
+        return PlayerInput(1, 0)
+    hurt = player.health < player.max_health * BOT_CAUTIOUS_HEALTH_FRACTION
+    attacking = target.is_attacking or getattr(target, "current_state", "") == "special_attack_active"
+    if hurt and attacking and player.invulnerability_timer <= 0:
+        return PlayerInput(-1 if target.pos.x > player.pos.x else 1, 0)
+    return approach_and_attack(world, rng, target, reaction=0.3)
+
+
+def policy_masher(world, rng):
+    # Walks right mashing random attacks; a skill floor for comparison
+    return PlayerInput(1 if rng.random() < 0.8 else -1, rng.choice((-1, 0, 0, 1)),
+                       punch=rng.random() < 0.2, kick=rng.random() < 0.1)
+
+
+POLICIES = {
+    "brawler": policy_brawler,
+    "cautious": policy_cautious,
+    "masher": policy_masher,
+}
+
+
+# --- Keyboard stand-in ---
+
+class HeldKeys:
+    # Indexed like the result of pygame.key.get_pressed()
+    def __init__(self, keys=()):
+        self.keys = frozenset(keys)
+
+    def __getitem__(self, key):
+        return key in self.keys
+
+
+NO_KEYS = HeldKeys()
+
+
+class BotController:
+    def __init__(self, policy=policy_brawler, seed=None, menu_press_interval=BOT_MENU_PRESS_INTERVAL, stall_frames=BOT_STALL_FRAMES):
+        self.policy = policy
+        self.rng = random.Random(seed)
+        self.menu_press_interval = menu_press_interval # Frames each screen stays up before Enter
+        self.stall_frames = stall_frames
+        self.game_state = None
+        self.frames_in_state = 0
+
+        # Progress while PLAYING, see is_stalled()
+        self.stage_number = None
+        self.furthest_x = 0.0
+        self.frames_without_progress = 0
+        self.stalls = 0
+
+    def get_keys(self, game_state, world):
+        # (held keys, key codes pressed this frame)
+        if game_state != self.game_state:
+            self.game_state = game_state
+            self.frames_in_state = 0
+        self.frames_in_state += 1
+        if game_state != "PLAYING":
+            if self.frames_in_state % self.menu_press_interval == 0:
+                return NO_KEYS, [pygame.K_RETURN]
+            return NO_KEYS, []
+
+        self._track_progress(world)
+        inputs = self.policy(world, self.rng)
+        held = []
+        if inputs.move_x < 0: held.append(pygame.K_LEFT)
+        if inputs.move_x > 0: held.append(pygame.K_RIGHT)
+        if inputs.move_y < 0: held.append(pygame.K_UP)
+        if inputs.move_y > 0: held.append(pygame.K_DOWN)
+        pressed = []
+        if inputs.punch: pressed.append(pygame.K_j)
+        if inputs.kick: pressed.append(pygame.K_k)
+        return HeldKeys(held), pressed
+
+    def _track_progress(self, world):
+        player = world.player
+        stage_number = world.stage_manager.current_stage_number
+        new_run = stage_number != self.stage_number or self.frames_in_state == 1
+        if new_run or len(world.enemies) or player.pos.x > self.furthest_x:
+            self.frames_without_progress = 0
+        else:
+            self.frames_without_progress += 1
+        self.furthest_x = player.pos.x if new_run else max(self.furthest_x, player.pos.x)
+        self.stage_number = stage_number
+
+    def is_stalled(self):
+        # True once a run has gone stall_frames PLAYING frames with nothing left to do
+        return self.game_state == "PLAYING" and self.frames_without_progress >= self.stall_frames
+
+    def restart(self):
+        # Called when the driver gives up on a stalled run
+        self.stalls += 1
+        self.frames_without_progress = 0
+
+
+# --- Soak sampling ---
+
+def get_memory_kb():
+    # Resident set size, or the peak RSS where /proc isn't available; None if unknown
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak # Bytes on macOS, KB elsewhere
+
+
+class SoakSampler:
+    # Fed every frame by main.py during autoplay. Every `interval` seconds of
+    # wall time it records memory, frame times since the last sample and
+    # entity counts, so leaks and slowdowns that only build up over many stage
+    # transitions show up as trends. Samples are printed and, with a path,
+    # written to a JSON-lines file as they are taken.
+    def __init__(self, interval=SOAK_SAMPLE_INTERVAL, path=None):
+        self.interval = interval
+        self.path = path
+        self.samples = []
+        self.start_time = time.perf_counter()
+        self.next_sample_time = self.start_time + interval
+
+        # Since the last sample
+        self.frames = 0
+        self.frame_seconds = 0.0
+        self.max_frame_seconds = 0.0
+
+        # Totals
+        self.total_frames = 0
+        self.game_state = None
+        self.stage_number = None
+        self.stage_changes = 0 # Moves to another stage, including a new game going back to stage 1
+        self.game_overs = 0
+        self.retries = 0
+        self.games_completed = 0
+
+        if path:
+            open(path, "w").close() # Start a fresh log
+
+    def get_elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    def record_frame(self, seconds, game_state, world, timestep=None):
+        self.frames += 1
+        self.total_frames += 1
+        self.frame_seconds += seconds
+        self.max_frame_seconds = max(self.max_frame_seconds, seconds)
+
+        if game_state != self.game_state:
+            if self.game_state == "GAME_OVER" and game_state != "MENU":
+                self.retries += 1 # Back to PLAYING, or straight into the boss dialogue again
+            if game_state == "GAME_OVER":
+                self.game_overs += 1
+            elif game_state == "ENDING":
+                self.games_completed += 1
+            self.game_state = game_state
+        if world is not None and world.stage_manager.current_stage_number != self.stage_number:
+            self.stage_number = world.stage_manager.current_stage_number
+            self.stage_changes += 1
+
+        if time.perf_counter() >= self.next_sample_time:
+            self.take_sample(world, timestep)
+
+    def take_sample(self, world, timestep=None):
+        now = time.perf_counter()
+        sample = {
+            "elapsed_s": round(now - self.start_time, 1),
+            "frames": self.total_frames,
+            "fps": round(self.frames / (now - (self.next_sample_time - self.interval)), 1),
+            "frame_ms_mean": round(self.frame_seconds / self.frames * 1000, 3) if self.frames else 0.0,
+            "frame_ms_max": round(self.max_frame_seconds * 1000, 3),
+            "state": self.game_state,
+            "stage": self.stage_number,
+            "stage_changes": self.stage_changes,
+            "game_overs": self.game_overs,
+            "retries": self.retries,
+            "games_completed": self.games_completed,
+            "rss_kb": get_memory_kb(),
+            "python_objects": len(gc.get_objects()),
+        }
+        if timestep is not None: # Time the fixed-step catch-up cap discarded (the game ran slower than real time)
+            sample["dropped_ms"] = round(timestep.dropped_time * 1000, 1)
+            sample["dropped_frames"] = timestep.dropped_frames
+        if world is not None:
+            streaming = world.stage_manager.get_streaming_stats()
+            sample.update({
+                "ticks": world.frame_count,
+                "sprites": len(world.all_sprites),
+                "enemies": len(world.enemies),
+                "awake_enemies": world.activation.awake_count,
+                "asleep_enemies": world.activation.asleep_count,
+                "projectiles": len(world.projectiles),
+                "bullets": world.bullets.get_alive_count() if world.bullets is not None else 0,
+                "crowd_members": len(world.crowd.members) if world.crowd is not None else 0,
+                "pending_spawns": streaming["pending"], # Placements of this stage not streamed in yet
+                "retired_enemies": streaming["retired"],
+                "pooled_enemies": sum(len(free) for free in world.entity_pool.free.values()) if world.entity_pool is not None else 0,
+                "spatial_cells": len(world.enemies.index.cells),
+                "background_tiles": len(world.stage_manager.background.tiles) if world.stage_manager.background is not None else 0,
+            })
+        self.samples.append(sample)
+        if self.path:
+            with open(self.path, "a") as log_file:
+                log_file.write(json.dumps(sample) + "\n")
+        print(f"[soak {sample['elapsed_s']:.0f}s] stage {sample['stage']} {sample['state']}, "
+              f"{sample['fps']:.0f} fps, frame {sample['frame_ms_mean']:.2f}/{sample['frame_ms_max']:.2f} ms mean/max, "
+              f"rss {sample['rss_kb']} KB, {sample['python_objects']} objects, {sample.get('sprites', 0)} sprites")
+
+        self.frames = 0
+        self.frame_seconds = 0.0
+        self.max_frame_seconds = 0.0
+        while self.next_sample_time <= now:
+            self.next_sample_time += self.interval
+        return sample
+
+    def get_report(self):
+        # Growth from the second sample (the first includes warm-up: caches,
+        # pools, first stage loads) to the last, and the warnings it triggers
+        report = {"samples": len(self.samples), "stage_changes": self.stage_changes, "game_overs": self.game_overs,
+                  "retries": self.retries, "games_completed": self.games_completed, "warnings": []}
+        if len(self.samples) < 3:
+            return report
+        first, last = self.samples[1], self.samples[-1]
+        if first["rss_kb"] is not None and last["rss_kb"] is not None:
+            report["rss_growth_kb"] = last["rss_kb"] - first["rss_kb"]
+            if report["rss_growth_kb"] > SOAK_MEMORY_GROWTH_WARNING_KB:
+                report["warnings"].append(f"resident memory grew {report['rss_growth_kb']} KB")
+        report["object_growth"] = last["python_objects"] - first["python_objects"]
+        report["frame_time_growth"] = last["frame_ms_mean"] / first["frame_ms_mean"] - 1 if first["frame_ms_mean"] > 0 else 0.0
+        if report["frame_time_growth"] > SOAK_FRAME_TIME_GROWTH_WARNING:
+            report["warnings"].append(f"mean frame time grew {report['frame_time_growth']:.0%}")
+        return report
@@ -0,0 +1,196 @@
+import math
+import pygame
+from src.image_cache import get_sprite_image
+from src.settings import BULLET_SYSTEM_CAPACITY
+
+try:
+    import numpy as np
+except ImportError: # Optional: without NumPy the World falls back to pooled Projectile sprites
+    np = None
+
+NUMPY_AVAILABLE = np is not None
+
+
+class BulletSystem:
+    # Array-backed store for enemy bullets. Instead of one Sprite per bullet,
+    # each attribute is a NumPy array indexed by slot and a bullet is just a
+    # slot with alive[i] set. Movement, off-stage culling and the collision
+    # test against the player are done for every bullet at once, and drawing
+    # is a single Surface.blits() call, so bullet count barely touches frame
+    # time until the thousands.
+    #
+    # Positions are rect-style top-left corners in world space. Slots are
+    # scanned lowest-first, which keeps spawning and hit order deterministic.
+    def __init__(self, capacity=BULLET_SYSTEM_CAPACITY):
+        if np is None:
+            raise RuntimeError("BulletSystem requires NumPy")
+        self.capacity = 0
+        self.x = np.zeros(0)
+        self.y = np.zeros(0)
+        self.prev_x = np.zeros(0)
+        self.prev_y = np.zeros(0)
+        self.vx = np.zeros(0)
+        self.vy = np.zeros(0)
+        self.width = np.zeros(0)
+        self.height = np.zeros(0)
+        self.damage = np.zeros(0, dtype=np.int32)
+        self.style = np.zeros(0, dtype=np.int32)
+        self.alive = np.zeros(0, dtype=bool)
+        self._grow(capacity)
+
+        self.styles = []       # style index -> shared image
+        self.style_index = {}  # (size, color) -> style index
+
+        # Stats
+        self.spawned = 0
+        self.expired = 0   # Left the stage
+        self.hits = 0      # Hit the player
+        self.grown = 0     # Times the arrays had to be enlarged
+        self.peak_alive = 0
+
+    def _grow(self, capacity):
+        # Enlarge every array to `capacity` slots, keeping existing bullets
+        extra = capacity - self.capacity
+        if extra <= 0:
+            return
+        for name in ("x", "y", "prev_x", "prev_y", "vx", "vy", "width", "height", "damage", "style", "alive"):
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate((array, np.zeros(extra, dtype=array.dtype))))
+        self.capacity = capacity
+
+    def get_style(self, size, color):
+        key = (tuple(size), tuple(pygame.Color(color)))
+        index = self.style_index.get(key)
+        if index is None:
+            index = self.style_index[key] = len(self.styles)
+            self.styles.append(get_sprite_image(size, color))
+        return index
+
+    def get_alive_count(self):
+        return int(np.count_nonzero(self.alive))
+
+    def spawn(self, center_x, center_y, velocity_x, velocity_y=0.0, damage=15, size=(25, 10), color='magenta'):
+        # Same defaults as Projectile, so a single Viper shot looks and hits the same
+        return self.spawn_many([center_x], [center_y], [velocity_x], [velocity_y], damage, size, color)
+
+    def spawn_many(self, centers_x, centers_y, velocities_x, velocities_y, damage=15, size=(25, 10), color='magenta'):
+        # Spawn a batch of identical-looking bullets; returns the slot indices used
+        count = len(centers_x)
+        if count == 0:
+            return np.zeros(0, dtype=np.intp)
+        free = np.flatnonzero(~self.alive)
+        if len(free) < count:
+            self._grow(max(self.capacity * 2, self.capacity + count))
+            self.grown += 1
+            free = np.flatnonzero(~self.alive)
+        slots = free[:count]
+
+        width, height = size
+        self.x[slots] = np.asarray(centers_x, dtype=float) - width / 2
+        self.y[slots] = np.asarray(centers_y, dtype=float) - height / 2
+        self.prev_x[slots] = self.x[slots] # Don't interpolate from wherever the slot was before
+        self.prev_y[slots] = self.y[slots]
+        self.vx[slots] = velocities_x
+        self.vy[slots] = velocities_y
+        self.width[slots] = width
+        self.height[slots] = height
+        self.damage[slots] = damage
+        self.style[slots] = self.get_style(size, color)
+        self.alive[slots] = True
+
+        self.spawned += count
+        self.peak_alive = max(self.peak_alive, self.get_alive_count())
+        return slots
+
+    def spawn_spread(self, center_x, center_y, speed, direction, count, spread_degrees, damage=15, size=(25, 10), color='magenta'):
+        # Fan of `count` bullets centred on the horizontal direction (1 = right, -1 = left)
+        if count == 1:
+            angles = np.zeros(1)
+        else:
+            half_spread = math.radians(spread_degrees) / 2
+            angles = np.linspace(-half_spread, half_spread, count)
+        velocities_x = np.cos(angles) * speed * direction
+        velocities_y = np.sin(angles) * speed
+        return self.spawn_many(np.full(count, center_x, dtype=float), np.full(count, center_y, dtype=float),
+                               velocities_x, velocities_y, damage, size, color)
+
+    def capture_previous_positions(self):
+        # Start of tick, mirrors World.capture_previous_positions for sprites
+        self.prev_x[:] = self.x
+        self.prev_y[:] = self.y
+
+    def update(self, dt, stage_width, screen_height):
+        alive = self.alive
+        if not alive.any():
+            return
+        self.x += self.vx * dt # Dead slots move too; cheaper than masking and harmless
+        self.y += self.vy * dt
+        off_stage = alive & ((self.x + self.width < 0) | (self.x > stage_width) |
+                             (self.y + self.height < 0) | (self.y > screen_height))
+        expired = int(np.count_nonzero(off_stage))
+        if expired:
+            alive &= ~off_stage
+            self.expired += expired
+
+    def find_hits(self, rect):
+        # Slot indices of live bullets overlapping the rect, lowest first
+        return np.flatnonzero(self.alive & (self.x < rect.right) & (self.x + self.width > rect.left) &
+                              (self.y < rect.bottom) & (self.y + self.height > rect.top))
+
+    def find_first_hit(self, rect):
+        hits = self.find_hits(rect)
+        return int(hits[0]) if len(hits) else None
+
+    def kill(self, slot):
+        if self.alive[slot]:
+            self.alive[slot] = False
+            self.hits += 1
+
+    def clear(self):
+        self.alive[:] = False
+
+    def get_draw_batch(self, offset, alpha, screen_rect):
+        # (blit sequence, bounding rect) for the bullets on screen, interpolated like sprites.
+        # Returns ([], None) when none are visible.
+        slots = np.flatnonzero(self.alive)
+        if len(slots) == 0:
+            return [], None
+        x = self.x[slots]
+        y = self.y[slots]
+        if alpha < 1.0:
+            prev_x = self.prev_x[slots]
+            prev_y = self.prev_y[slots]
+            x = prev_x + (x - prev_x) * alpha
+            y = prev_y + (y - prev_y) * alpha
+        screen_x = np.rint(x - offset[0]).astype(np.int64)
+        screen_y = np.rint(y - offset[1]).astype(np.int64)
+        width = self.width[slots].astype(np.int64)
+        height = self.height[slots].astype(np.int64)
+
+        visible = ((screen_x < screen_rect.right) & (screen_x + width > screen_rect.left) &
+                   (screen_y < screen_rect.bottom) & (screen_y + height > screen_rect.top))
+        if not visible.any():
+            return [], None
+        screen_x = screen_x[visible]
+        screen_y = screen_y[visible]
+        width = width[visible]
+        height = height[visible]
+
+        left = int(screen_x.min())
+        top = int(screen_y.min())
+        bounds = pygame.Rect(left, top, int((screen_x + width).max()) - left, int((screen_y + height).max()) - top)
+        styles = self.styles
+        batch = [(styles[style], (bx, by)) for style, bx, by in
+                 zip(self.style[slots][visible].tolist(), screen_x.tolist(), screen_y.tolist())]
+        return batch, bounds
+
+    def get_stats(self):
+        return {
+            "capacity": self.capacity,
+            "alive": self.get_alive_count(),
+            "peak_alive": self.peak_alive,
+            "spawned": self.spawned,
+            "expired": self.expired,
+            "hits": self.hits,
+            "grown": self.grown,
+        }
@@ -5,6 +5,7 @@ import random
 class Camera:
     def __init__(self, screen_width, screen_height):
         self.offset = pygame.math.Vector2(0, 0)
+        self.previous_offset = pygame.math.Vector2(0, 0) # Offset at the previous logic tick, for render interpolation
         self.screen_width = screen_width
         self.screen_height = screen_height
 
@@ -12,6 +13,7 @@ class Camera:
         self.shake_intensity = 0
         self.shake_timer = 0.0
         self.shake_duration = 0.0
+        self.rng = random.Random() # Own generator so shakes can be reproduced (World.reseed)
 
     def start_shake(self, intensity, duration):
         self.shake_intensity = intensity
@@ -19,6 +21,8 @@ class Camera:
         self.shake_timer = duration # Start the timer
 
     def update(self, target_sprite_rect, stage_length, dt): # Added dt for shake timer
+        self.previous_offset.update(self.offset)
+
         # Calculate the ideal camera position to center the target
         ideal_x = target_sprite_rect.centerx - self.screen_width / 2
 
@@ -36,7 +40,7 @@ class Camera:
         if self.shake_timer > 0:
             self.shake_timer -= dt
             if self.shake_timer > 0:
-                shake_offset_x = random.randint(-self.shake_intensity, self.shake_intensity)
+                shake_offset_x = self.rng.randint(-self.shake_intensity, self.shake_intensity)
                 # shake_offset_y = random.randint(-self.shake_intensity, self.shake_intensity) # Optional vertical shake
                 self.offset.x += shake_offset_x
                 # self.offset.y += shake_offset_y
@@ -53,6 +57,14 @@ class Camera:
                 # self.offset.x is already set to calculated_offset_x from the start of this frame,
                 # so no need to "reset" it explicitly here, as the shake is additive for the current frame only.
 
+    def snap(self):
+        # Forget the previous tick (after a teleport such as a stage load) so nothing interpolates across it
+        self.previous_offset.update(self.offset)
+
+    def get_render_offset(self, alpha):
+        # Offset blended between the previous and current logic tick
+        return self.previous_offset.lerp(self.offset, alpha)
+
     def apply_to_rect(self, rect):
         # Moves a given rect by the inverse of the camera's offset for rendering
         return rect.move(-self.offset.x, -self.offset.y)
@@ -0,0 +1,278 @@
+import pygame
+from src.enemy import Enemy
+from src.settings import CROWD_INITIAL_CAPACITY, CROWD_SYNC_MARGIN
+
+try:
+    import numpy as np
+except ImportError: # Optional: without NumPy every enemy runs its own update()
+    np = None
+
+NUMPY_AVAILABLE = np is not None
+
+# Per-member state that lives in the arrays, and the copy of it last written to the sprite
+_STATE_ARRAYS = (
+    ("pos_x", float), ("pos_y", float), ("vel_x", float), ("vel_y", float),
+    ("speed", float), ("detection_radius", float), ("attack_range", float),
+    ("width", int), ("height", int),
+    ("hit_cooldown", float), ("flash_timer", float), ("is_flashing", bool), ("is_attacking", bool),
+    ("left", int), ("top", int),
+)
+_SYNCED_ARRAYS = ("left", "top", "vel_x", "vel_y", "hit_cooldown", "flash_timer", "is_flashing", "is_attacking")
+
+
+class CrowdSystem:
+    # Simulates regular enemies (classes that use Enemy.update unchanged, e.g.
+    # Thug and Bruiser) as one crowd. Their position, velocity, timers and AI
+    # stats are copied into NumPy arrays when they join; each tick the timers,
+    # chase/attack decisions, movement and boundary clamps run for the whole
+    # crowd in a handful of array operations, with the same rules and order as
+    # Enemy.update.
+    #
+    # The arrays are authoritative. Results are written back to a sprite only
+    # when something it exposes changed (rect, velocity, timers, flags) and it
+    # is inside the sync region: the camera view widened by CROWD_SYNC_MARGIN,
+    # which covers everything that can be drawn or touch the player. Members
+    # outside it catch up when they enter it, or on sync_all().
+    #
+    # Crowd members stay in the usual groups (drawing, spatial combat queries,
+    # streaming); the ActivationManager just leaves them to the crowd.
+    def __init__(self, capacity=CROWD_INITIAL_CAPACITY, sync_margin=CROWD_SYNC_MARGIN):
+        if np is None:
+            raise RuntimeError("CrowdSystem requires NumPy")
+        self.sync_margin = sync_margin
+        self.members = [] # slot -> Enemy
+        self.capacity = 0
+        for name, dtype in _STATE_ARRAYS:
+            setattr(self, name, np.zeros(0, dtype=dtype))
+        for name in _SYNCED_ARRAYS:
+            setattr(self, "synced_" + name, getattr(self, name).copy())
+        self._grow(capacity)
+
+        # Stats
+        self.ticks = 0
+        self.last_synced = 0  # Sprites written back during the last tick
+        self.total_synced = 0
+        self.peak_members = 0
+
+    def _grow(self, capacity):
+        extra = capacity - self.capacity
+        if extra <= 0:
+            return
+        names = [name for name, dtype in _STATE_ARRAYS] + ["synced_" + name for name in _SYNCED_ARRAYS]
+        for name in names:
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate((array, np.zeros(extra, dtype=array.dtype))))
+        self.capacity = capacity
+
+    def accepts(self, enemy):
+        # Only enemies whose behaviour is exactly Enemy.update can be batched
+        return type(enemy).update is Enemy.update and not enemy.is_boss
+
+    def add(self, enemy):
+        # Returns False if the enemy should keep updating itself
+        if enemy.crowd is not None or not self.accepts(enemy):
+            return False
+        slot = len(self.members)
+        if slot >= self.capacity:
+            self._grow(max(self.capacity * 2, 1))
+        self.members.append(enemy)
+        enemy.crowd = self
+        enemy.crowd_slot = slot
+
+        self.speed[slot] = enemy.speed
+        self.detection_radius[slot] = enemy.detection_radius
+        self.attack_range[slot] = enemy.attack_range
+        self.width[slot] = enemy.rect.width
+        self.height[slot] = enemy.image.get_height()
+        self.pos_x[slot] = enemy.pos.x
+        self.pos_y[slot] = enemy.pos.y
+        self.vel_x[slot] = enemy.vel.x
+        self.vel_y[slot] = enemy.vel.y
+        self.left[slot] = enemy.rect.left
+        self.top[slot] = enemy.rect.top
+        self.pull(enemy)
+        self.peak_members = max(self.peak_members, len(self.members))
+        return True
+
+    def add_many(self, enemies):
+        # add() for a batch, filling the arrays in one go (e.g. restoring a snapshot).
+        # Returns the number of enemies that joined.
+        joining = [enemy for enemy in enemies if enemy.crowd is None and self.accepts(enemy)]
+        if not joining:
+            return 0
+        first = len(self.members)
+        end = first + len(joining)
+        if end > self.capacity:
+            self._grow(max(self.capacity * 2, end))
+        for slot, enemy in enumerate(joining, first):
+            enemy.crowd = self
+            enemy.crowd_slot = slot
+        self.members.extend(joining)
+
+        slots = slice(first, end)
+        self.speed[slots] = [enemy.speed for enemy in joining]
+        self.detection_radius[slots] = [enemy.detection_radius for enemy in joining]
+        self.attack_range[slots] = [enemy.attack_range for enemy in joining]
+        self.width[slots] = [enemy.rect.width for enemy in joining]
+        self.height[slots] = [enemy.image.get_height() for enemy in joining]
+        self.pos_x[slots] = [enemy.pos.x for enemy in joining]
+        self.pos_y[slots] = [enemy.pos.y for enemy in joining]
+        self.vel_x[slots] = [enemy.vel.x for enemy in joining]
+        self.vel_y[slots] = [enemy.vel.y for enemy in joining]
+        self.left[slots] = [enemy.rect.left for enemy in joining]
+        self.top[slots] = [enemy.rect.top for enemy in joining]
+        self.hit_cooldown[slots] = [enemy.hit_cooldown_timer for enemy in joining]
+        self.flash_timer[slots] = [enemy.flash_timer for enemy in joining]
+        self.is_flashing[slots] = [enemy.is_flashing for enemy in joining]
+        self.is_attacking[slots] = [enemy.is_attacking for enemy in joining]
+        for name in _SYNCED_ARRAYS:
+            getattr(self, "synced_" + name)[slots] = getattr(self, name)[slots]
+        self.peak_members = max(self.peak_members, len(self.members))
+        return len(joining)
+
+    def pull(self, enemy):
+        # Copy combat state changed on the sprite (take_damage) into the arrays.
+        # Position is not pulled: the sprite's copy may be behind the arrays.
+        slot = enemy.crowd_slot
+        self.hit_cooldown[slot] = enemy.hit_cooldown_timer
+        self.flash_timer[slot] = enemy.flash_timer
+        self.is_flashing[slot] = enemy.is_flashing
+        self.is_attacking[slot] = enemy.is_attacking
+        for name in _SYNCED_ARRAYS: # The sprite already shows this state
+            getattr(self, "synced_" + name)[slot] = getattr(self, name)[slot]
+
+    def remove(self, enemy):
+        # Called from Enemy.kill(); the last member moves into the freed slot
+        slot = enemy.crowd_slot
+        if enemy.crowd is not self or slot is None:
+            return
+        self._sync(np.array([slot]))
+        last = len(self.members) - 1
+        if slot != last:
+            moved = self.members[last]
+            self.members[slot] = moved
+            moved.crowd_slot = slot
+            names = [name for name, dtype in _STATE_ARRAYS] + ["synced_" + name for name in _SYNCED_ARRAYS]
+            for name in names:
+                array = getattr(self, name)
+                array[slot] = array[last]
+        self.members.pop()
+        enemy.crowd = None
+        enemy.crowd_slot = None
+
+    def clear(self):
+        for enemy in self.members:
+            enemy.crowd = None
+            enemy.crowd_slot = None
+        self.members = []
+
+    def update(self, dt, stage_width, screen_height, player, camera, spatial_group=None):
+        count = len(self.members)
+        self.ticks += 1
+        self.last_synced = 0
+        if count == 0:
+            return
+        pos_x = self.pos_x[:count]
+        pos_y = self.pos_y[:count]
+        vel_x = self.vel_x[:count]
+        vel_y = self.vel_y[:count]
+        hit_cooldown = self.hit_cooldown[:count]
+        flash_timer = self.flash_timer[:count]
+        is_flashing = self.is_flashing[:count]
+        is_attacking = self.is_attacking[:count]
+
+        # Timers
+        hit_cooldown[:] = np.where(hit_cooldown > 0, hit_cooldown - dt, 0.0)
+        flash_timer[is_flashing] -= dt
+        is_flashing &= flash_timer > 0
+
+        # AI: chase the player inside the detection radius, stop and attack inside the attack range
+        deciding = ~is_attacking
+        distance = np.sqrt((player.pos.x - pos_x) ** 2 + (player.pos.y - pos_y) ** 2)
+        speed = self.speed[:count]
+        chase = deciding & (distance < self.detection_radius[:count]) & (distance > self.attack_range[:count])
+        direction = np.sign(player.pos.x - pos_x)
+        vel_x[deciding] = 0.0
+        vel_x[chase] = (direction * speed)[chase]
+        is_attacking |= deciding & ~chase & (distance <= self.attack_range[:count])
+
+        pos_x += vel_x * dt
+        pos_y += vel_y * dt
+
+        # Boundary checks, same order as Enemy.update
+        half_width = self.width[:count] / 2
+        low = pos_x < half_width
+        pos_x[low] = half_width[low]
+        vel_x[low & (vel_x < 0)] = 0.0
+        high_x = stage_width - half_width
+        high = pos_x > high_x
+        pos_x[high] = high_x[high]
+        vel_x[high & (vel_x > 0)] = 0.0
+        height = self.height[:count]
+        floor = pos_y > screen_height
+        pos_y[floor] = screen_height
+        vel_y[floor & (vel_y > 0)] = 0.0
+        ceiling = pos_y < height
+        pos_y[ceiling] = height[ceiling]
+        vel_y[ceiling & (vel_y < 0)] = 0.0
+
+        # rect.midbottom = (round(pos.x), round(pos.y)); rint rounds halves to even like round()
+        self.left[:count] = np.rint(pos_x).astype(int) - self.width[:count] // 2
+        self.top[:count] = np.rint(pos_y).astype(int) - height
+
+        changed = np.zeros(count, dtype=bool)
+        for name in _SYNCED_ARRAYS:
+            changed |= getattr(self, name)[:count] != getattr(self, "synced_" + name)[:count]
+        region = self.get_sync_region(camera)
+        left = self.left[:count]
+        top = self.top[:count]
+        visible = ((left < region.right) & (left + self.width[:count] > region.left) &
+                   (top < region.bottom) & (top + height > region.top))
+        self._sync(np.flatnonzero(changed & visible), spatial_group)
+
+    def get_sync_region(self, camera):
+        return pygame.Rect(round(camera.offset.x), round(camera.offset.y),
+                           camera.screen_width, camera.screen_height).inflate(2 * self.sync_margin, 2 * self.sync_margin)
+
+    def sync_all(self, spatial_group=None):
+        # Bring every sprite up to date, e.g. before saving or inspecting state
+        self._sync(np.arange(len(self.members)), spatial_group)
+
+    def _sync(self, slots, spatial_group=None):
+        if len(slots) == 0:
+            return
+        members = self.members
+        rows = zip(slots.tolist(), self.pos_x[slots].tolist(), self.pos_y[slots].tolist(),
+                   self.vel_x[slots].tolist(), self.vel_y[slots].tolist(),
+                   self.hit_cooldown[slots].tolist(), self.flash_timer[slots].tolist(),
+                   self.is_flashing[slots].tolist(), self.is_attacking[slots].tolist(),
+                   self.left[slots].tolist(), self.top[slots].tolist())
+        for slot, x, y, vx, vy, hit_cooldown, flash_timer, is_flashing, is_attacking, left, top in rows:
+            enemy = members[slot]
+            enemy.pos.x = x
+            enemy.pos.y = y
+            enemy.vel.x = vx
+            enemy.vel.y = vy
+            enemy.hit_cooldown_timer = hit_cooldown
+            enemy.flash_timer = flash_timer
+            enemy.is_flashing = is_flashing
+            enemy.is_attacking = is_attacking
+            enemy.image = enemy.flash_image if is_flashing else enemy.original_image
+            if enemy.rect.left != left or enemy.rect.top != top:
+                enemy.rect.topleft = (left, top)
+                if spatial_group is not None:
+                    spatial_group.refresh(enemy)
+        for name in _SYNCED_ARRAYS:
+            getattr(self, "synced_" + name)[slots] = getattr(self, name)[slots]
+        self.last_synced += len(slots)
+        self.total_synced += len(slots)
+
+    def get_stats(self):
+        return {
+            "members": len(self.members),
+            "peak_members": self.peak_members,
+            "capacity": self.capacity,
+            "last_synced": self.last_synced,
+            "total_synced": self.total_synced,
+            "ticks": self.ticks,
+        }
@@ -1,12 +1,37 @@
 import pygame
+from collections import OrderedDict
+from src.settings import DIALOGUE_LAYOUT_CACHE_SIZE, DIALOGUE_PAGE_CACHE_SIZE
+from src.image_cache import convert_for_display
+
+# Shared across DialogueBox instances so a retry that replays the same
+# boss_dialogue reuses the work from the first time.
+_layout_cache = OrderedDict()       # (text, font, max_width) -> tuple of (wrapped line, glyph x offsets)
+_page_surface_cache = OrderedDict() # (font, box size, colors, name, page lines) -> composed page Surface
+cache_stats = {"layout_hits": 0, "layout_misses": 0, "page_hits": 0, "page_misses": 0}
+
+def _cache_get(cache, key, stat_prefix):
+    value = cache.get(key)
+    if value is None:
+        cache_stats[stat_prefix + "_misses"] += 1
+    else:
+        cache_stats[stat_prefix + "_hits"] += 1
+        cache.move_to_end(key)
+    return value
+
+def _cache_put(cache, key, value, max_entries):
+    cache[key] = value
+    if len(cache) > max_entries:
+        cache.popitem(last=False)
+
 
 class DialogueBox:
-    def __init__(self, screen_width, screen_height, font=None, padding=20, line_spacing=5):
+    def __init__(self, screen_width, screen_height, font=None, padding=20, line_spacing=5, typewriter_speed=0):
         self.screen_width = screen_width
         self.screen_height = screen_height
         self.font = font if font else pygame.font.Font(None, 28) # Default font
         self.padding = padding
         self.line_spacing = line_spacing
+        self.typewriter_speed = typewriter_speed # Characters per second; 0 shows each page at once
 
         self.box_height = 150 # Example height
         self.box_rect = pygame.Rect(
@@ -29,11 +54,40 @@ class DialogueBox:
 
         self.is_showing = False
         self.current_dialogue_lines = []
+        self.current_glyph_offsets = [] # Per line, x of each character (from the layout cache)
         self.current_character_name = ""
         self.current_line_index = 0 # For multi-page dialogues
         self.max_lines_per_page = 3 # How many lines fit in the box at once (approx)
 
+        # Typewriter state for the current page
+        self.page_glyphs = []      # (character, x, y) in box-local coordinates, in reveal order
+        self.reveal_progress = 0.0 # Fractional characters revealed
+        self.visible_chars = 0     # Characters that should be on screen
+        self.drawn_chars = 0       # Characters already blitted onto page_canvas
+        self.page_canvas = None
+        self.glyphs = {}           # character -> rendered glyph Surface
+
+    def _get_glyph_offsets(self, line):
+        # x of each character from the line start. Word starts are measured
+        # (font.size includes kerning and subpixel placement, so they line up
+        # with the composed page); characters inside a word add glyph advances
+        # from a single metrics call, instead of measuring every prefix.
+        offsets = []
+        x = 0
+        for j, (character, metrics) in enumerate(zip(line, self.font.metrics(line))):
+            if j > 0 and line[j - 1] == ' ':
+                x = self.font.size(line[:j])[0]
+            offsets.append(x)
+            x += metrics[4] if metrics else self.font.size(character)[0]
+        return tuple(offsets)
+
     def _wrap_text(self, text, max_width):
+        # Returns a list of (line, glyph x offsets); the typewriter needs the offsets
+        key = (text, self.font, max_width)
+        cached = _cache_get(_layout_cache, key, "layout")
+        if cached is not None:
+            return list(cached)
+
         words = text.split(' ')
         wrapped_lines = []
         current_line = ""
@@ -47,28 +101,36 @@ class DialogueBox:
                 wrapped_lines.append(current_line.strip())
                 current_line = word + " "
         wrapped_lines.append(current_line.strip())
-        return wrapped_lines
+        layout = tuple((line, self._get_glyph_offsets(line)) for line in wrapped_lines)
+        _cache_put(_layout_cache, key, layout, DIALOGUE_LAYOUT_CACHE_SIZE)
+        return list(layout)
 
     def start_dialogue(self, character_name, dialogue_content): # dialogue_content can be a list of lines or one long string
         self.current_character_name = character_name
 
         if isinstance(dialogue_content, str):
-            self.current_dialogue_lines = self._wrap_text(dialogue_content, self.text_area_rect.width)
-        elif isinstance(dialogue_content, list):
+            wrapped_content = self._wrap_text(dialogue_content, self.text_area_rect.width)
+        elif isinstance(dialogue_content, (list, tuple)):
             wrapped_content = []
             for line in dialogue_content:
                 wrapped_content.extend(self._wrap_text(line, self.text_area_rect.width))
-            self.current_dialogue_lines = wrapped_content
         else:
-            self.current_dialogue_lines = ["Error: Invalid dialogue content."]
+            wrapped_content = self._wrap_text("Error: Invalid dialogue content.", self.text_area_rect.width)
+        self.current_dialogue_lines = [line for line, offsets in wrapped_content]
+        self.current_glyph_offsets = [offsets for line, offsets in wrapped_content]
 
         self.current_line_index = 0
         self.is_showing = True
+        self._start_page()
         # print(f"Dialogue started. Name: {self.current_character_name}, Lines: {self.current_dialogue_lines}")
 
     def next_page(self):
+        if not self.is_page_revealed(): # First Enter finishes the typewriter for this page
+            self.reveal_progress = self.visible_chars = len(self.page_glyphs)
+            return True
         if self.current_line_index + self.max_lines_per_page < len(self.current_dialogue_lines):
             self.current_line_index += self.max_lines_per_page
+            self._start_page()
             # print(f"Dialogue next page. Index: {self.current_line_index}")
             return True # More pages exist
         else:
@@ -78,31 +140,103 @@ class DialogueBox:
     def end_dialogue(self):
         self.is_showing = False
         self.current_dialogue_lines = []
+        self.current_glyph_offsets = []
         self.current_character_name = ""
         self.current_line_index = 0
+        self.page_glyphs = []
+        self.page_canvas = None
         # print("Dialogue ended.")
 
-    def draw(self, surface):
-        if not self.is_showing:
-            return
+    def update(self, dt):
+        # Advances the typewriter; harmless when it is off
+        if self.is_showing and not self.is_page_revealed():
+            self.reveal_progress += self.typewriter_speed * dt
+            self.visible_chars = min(len(self.page_glyphs), int(self.reveal_progress))
+
+    def is_page_revealed(self):
+        return not self.typewriter_speed or self.visible_chars >= len(self.page_glyphs)
+
+    def get_render_key(self):
+        # Changes whenever the box would look different, so renderers can skip redrawing it
+        return (self.is_showing, self.current_character_name, self.current_line_index, len(self.current_dialogue_lines), self.visible_chars)
+
+    def _get_page_lines(self):
+        return tuple(self.current_dialogue_lines[self.current_line_index : self.current_line_index + self.max_lines_per_page])
+
+    def _get_text_origin(self):
+        # Box-local position of the first text line (below the name, if any)
+        text_x = self.text_area_rect.x - self.box_rect.x
+        text_y = self.text_area_rect.y - self.box_rect.y
+        if self.current_character_name:
+            text_y += self.font.size(self.current_character_name)[1] + self.line_spacing # Adjust y_offset for text below name
+        return text_x, text_y
 
-        pygame.draw.rect(surface, self.background_color, self.box_rect)
-        pygame.draw.rect(surface, self.border_color, self.box_rect, 2)
+    def _compose_page(self, page_lines):
+        # Box background, border, name and hint, plus the given lines, on one surface
+        page = pygame.Surface(self.box_rect.size)
+        page.fill(self.background_color)
+        pygame.draw.rect(page, self.border_color, page.get_rect(), 2)
 
-        name_y_pos = self.text_area_rect.y
         if self.current_character_name:
             name_surface = self.font.render(self.current_character_name, True, self.name_color)
             # Position name inside the box, above the first line of text
-            name_render_pos = (self.text_area_rect.x, self.text_area_rect.y)
-            surface.blit(name_surface, name_render_pos)
-            name_y_pos += name_surface.get_height() + self.line_spacing # Adjust y_offset for text below name
+            page.blit(name_surface, (self.text_area_rect.x - self.box_rect.x, self.text_area_rect.y - self.box_rect.y))
 
-        lines_to_display = self.current_dialogue_lines[self.current_line_index : self.current_line_index + self.max_lines_per_page]
-
-        for i, line in enumerate(lines_to_display):
+        text_x, text_y = self._get_text_origin()
+        for i, line in enumerate(page_lines):
             line_surface = self.font.render(line, True, self.text_color)
-            surface.blit(line_surface, (self.text_area_rect.x, name_y_pos + (i * (self.font.get_linesize() + self.line_spacing))))
+            page.blit(line_surface, (text_x, text_y + (i * (self.font.get_linesize() + self.line_spacing))))
 
         hint_text = self.font.render("Press Enter...", True, self.text_color) # Simplified hint
-        hint_rect = hint_text.get_rect(right=self.box_rect.right - self.padding, bottom=self.box_rect.bottom - self.padding / 2)
-        surface.blit(hint_text, hint_rect)
+        hint_rect = hint_text.get_rect(right=self.box_rect.width - self.padding, bottom=self.box_rect.height - self.padding / 2)
+        page.blit(hint_text, hint_rect)
+        return convert_for_display(page)
+
+    def _get_page_surface(self, page_lines):
+        key = (self.font, self.box_rect.size, tuple(self.background_color), tuple(self.text_color), tuple(self.name_color),
+               self.current_character_name, page_lines)
+        page = _cache_get(_page_surface_cache, key, "page")
+        if page is None:
+            page = self._compose_page(page_lines)
+            _cache_put(_page_surface_cache, key, page, DIALOGUE_PAGE_CACHE_SIZE)
+        return page
+
+    def _start_page(self):
+        self.reveal_progress = 0.0
+        self.visible_chars = 0
+        self.drawn_chars = 0
+        self.page_glyphs = []
+        self.page_canvas = None
+        if not self.typewriter_speed:
+            return
+
+        # Lay out every character of the page once; update()/draw() then only blit new ones
+        text_x, text_y = self._get_text_origin()
+        page_offsets = self.current_glyph_offsets[self.current_line_index : self.current_line_index + self.max_lines_per_page]
+        for i, (line, offsets) in enumerate(zip(self._get_page_lines(), page_offsets)):
+            y = text_y + (i * (self.font.get_linesize() + self.line_spacing))
+            for character, x in zip(line, offsets):
+                if character != ' ':
+                    self.page_glyphs.append((character, text_x + x, y))
+        self.page_canvas = self._get_page_surface(()).copy() # Empty page: box, name and hint only
+
+    def _get_glyph(self, character):
+        glyph = self.glyphs.get(character)
+        if glyph is None:
+            glyph = self.glyphs[character] = self.font.render(character, True, self.text_color)
+        return glyph
+
+    def draw(self, surface):
+        if not self.is_showing:
+            return
+
+        if not self.typewriter_speed:
+            surface.blit(self._get_page_surface(self._get_page_lines()), self.box_rect)
+            return
+
+        # Typewriter: blit only the glyphs revealed since the last draw onto the page canvas
+        canvas = self.page_canvas
+        for character, x, y in self.page_glyphs[self.drawn_chars:self.visible_chars]:
+            canvas.blit(self._get_glyph(character), (x, y))
+        self.drawn_chars = max(self.drawn_chars, self.visible_chars)
+        surface.blit(canvas, self.box_rect)
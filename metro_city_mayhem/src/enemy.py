@@ -1,20 +1,39 @@
 import pygame
+from src.image_cache import get_sprite_image, get_flash_image
 
 class Enemy(pygame.sprite.Sprite):
+    is_boss = False # Lets combat code branch without isinstance checks
+    image_size = (32, 64) # Placeholder size
+    image_color = 'red'   # Red color for enemies
+    crowd = None          # CrowdSystem simulating this enemy, if any (see src/crowd.py)
+    crowd_slot = None
+
     def __init__(self, start_pos_x, start_pos_y, player_ref):
         super().__init__()
 
-        # Appearance
-        self.image = pygame.Surface((32, 64)) # Placeholder size
-        self.image.fill(pygame.Color('red'))   # Red color for enemies
+        # Appearance (shared per class, see src/image_cache.py)
+        self.image = get_sprite_image(self.image_size, self.image_color)
         self.rect = self.image.get_rect()
-        self.original_image = self.image.copy() # Store original image
+        self.original_image = self.image # Store original image
+        self.flash_image = get_flash_image(self.original_image)
 
-        # Position and Movement
-        self.pos = pygame.math.Vector2(start_pos_x, start_pos_y)
-        self.rect.midbottom = (round(self.pos.x), round(self.pos.y))
+        # Position and Movement (set by reset)
+        self.pos = pygame.math.Vector2(0, 0)
         self.vel = pygame.math.Vector2(0, 0)
+        self.pool = None # Set by EntityPool; killed enemies go back to it
+
+        self.reset(start_pos_x, start_pos_y, player_ref)
+
+    def reset(self, start_pos_x, start_pos_y, player_ref):
+        # (Re)initialize stats, timers and AI state in place. Subclasses that
+        # change stats do it here, so a recycled instance (see src/entity_pool.py)
+        # is indistinguishable from a new one.
+        self.image = self.original_image
+        self.pos.update(start_pos_x, start_pos_y)
+        self.rect.midbottom = (round(self.pos.x), round(self.pos.y))
+        self.vel.update(0, 0)
         self.speed = 2  # Enemies are a bit slower than the player
+        self.prev_rect_topleft = None # Don't interpolate from wherever a recycled enemy was
 
         # Stats
         self.health = 50
@@ -112,25 +131,32 @@ class Enemy(pygame.sprite.Sprite):
         self.is_flashing = True
         self.flash_timer = self.flash_duration
 
-        # Create a temporary white version of the enemy's image for flashing
-        flash_image_surf = self.original_image.copy()
-        flash_image_surf.fill(pygame.Color('white')) # Simple white flash
-        self.image = flash_image_surf
+        self.image = self.flash_image # Shared white version of the enemy's image
 
         self.hit_cooldown_timer = 0.3 # Short cooldown to prevent instant multi-hits from single attack
+        if self.crowd is not None:
+            self.crowd.pull(self) # The crowd's arrays own this state between ticks
         # print(f"{self.__class__.__name__} took {actual_damage} damage, health: {self.health}")
 
+    def kill(self):
+        was_alive = self.alive()
+        if self.crowd is not None:
+            self.crowd.remove(self)
+        super().kill()
+        if was_alive and self.pool is not None:
+            self.pool.release(self)
+
 
 class Thug(Enemy):
-    def __init__(self, start_pos_x, start_pos_y, player_ref):
-        super().__init__(start_pos_x, start_pos_y, player_ref)
-        self.image.fill(pygame.Color('lightcoral'))
-        self.original_image = self.image.copy() # Re-assign original_image for Thug
+    image_color = 'lightcoral'
 
 
 class Bruiser(Enemy):
-    def __init__(self, start_pos_x, start_pos_y, player_ref):
-        super().__init__(start_pos_x, start_pos_y, player_ref)
+    image_size = (40, 70)
+    image_color = 'darkred'
+
+    def reset(self, start_pos_x, start_pos_y, player_ref):
+        super().reset(start_pos_x, start_pos_y, player_ref)
 
         self.health = 100
         self.max_health = self.health
@@ -139,11 +165,3 @@ class Bruiser(Enemy):
         self.speed = 1.5
         self.xp_reward = 25
         self.money_drop = 10
-
-        self.image = pygame.Surface((40, 70))
-        self.image.fill(pygame.Color('darkred'))
-        self.original_image = self.image.copy() # Re-assign original_image for Bruiser
-
-        current_midbottom = self.rect.midbottom
-        self.rect = self.image.get_rect()
-        self.rect.midbottom = current_midbottom
@@ -0,0 +1,80 @@
+from src.settings import ENTITY_POOL_PREALLOCATE
+
+class EntityPool:
+    # Recycles enemies and bosses per class. acquire() resets a killed instance
+    # in place (Enemy.reset) instead of running the whole constructor chain, and
+    # Enemy.kill() hands instances back. Stage loads, retries and streaming
+    # therefore stop allocating once every class has been seen.
+    #
+    # Each class keeps at most `capacity` free instances. reserve() raises the
+    # capacity to a stage's placement counts and preallocates up to
+    # `preallocate` of each so the first spawns don't construct either.
+    #
+    # Snapshots (src/snapshot.py) may revive a killed instance that is sitting
+    # in a free list; they call reclaim() so it can't be handed out twice.
+    def __init__(self, preallocate=ENTITY_POOL_PREALLOCATE):
+        self.preallocate = preallocate
+        self.free = {} # class -> {instance: None}, most recently released last
+        self.capacity = {} # class -> free instances kept
+
+        # Stats
+        self.created = 0    # Instances constructed
+        self.reused = 0     # Acquires served from a free list
+        self.released = 0   # Instances handed back by kill()
+        self.discarded = 0  # Released past the class's capacity and left to the GC
+        self.reclaimed = 0  # Taken back by a snapshot restore
+
+    def reserve(self, counts, player_ref):
+        # counts: {EnemyClass: instances a stage places}. Bosses aren't
+        # preallocated (Viper needs the stage's groups); they are kept once killed.
+        for EnemyClass, count in counts.items():
+            self.capacity[EnemyClass] = max(self.capacity.get(EnemyClass, 0), count)
+            free = self.free.setdefault(EnemyClass, {})
+            if EnemyClass.is_boss:
+                continue
+            while len(free) < min(count, self.preallocate):
+                free[self._create(EnemyClass, 0, 0, player_ref, {})] = None
+
+    def _create(self, EnemyClass, start_pos_x, start_pos_y, player_ref, kwargs):
+        enemy = EnemyClass(start_pos_x=start_pos_x, start_pos_y=start_pos_y, player_ref=player_ref, **kwargs)
+        enemy.pool = self
+        self.created += 1
+        return enemy
+
+    def acquire(self, EnemyClass, start_pos_x, start_pos_y, player_ref, **kwargs):
+        free = self.free.get(EnemyClass)
+        if not free:
+            return self._create(EnemyClass, start_pos_x, start_pos_y, player_ref, kwargs)
+        enemy = free.popitem()[0]
+        enemy.reset(start_pos_x, start_pos_y, player_ref)
+        self.reused += 1
+        return enemy
+
+    def release(self, enemy):
+        # Called from Enemy.kill()
+        EnemyClass = type(enemy)
+        free = self.free.setdefault(EnemyClass, {})
+        self.released += 1
+        if len(free) >= self.capacity.get(EnemyClass, 0):
+            enemy.pool = None # Forget it; a snapshot may still revive it
+            self.discarded += 1
+            return
+        free[enemy] = None
+
+    def reclaim(self, enemy):
+        free = self.free.get(type(enemy))
+        if free is not None and enemy in free:
+            del free[enemy]
+            self.reclaimed += 1
+
+    def get_stats(self):
+        acquired = self.created + self.reused
+        return {
+            "created": self.created,
+            "reused": self.reused,
+            "reuse_rate": self.reused / acquired if acquired else 0.0,
+            "released": self.released,
+            "discarded": self.discarded,
+            "reclaimed": self.reclaimed,
+            "free": {EnemyClass.__name__: len(free) for EnemyClass, free in self.free.items()},
+        }
@@ -0,0 +1,61 @@
+import pygame
+
+# Registry of shared sprite surfaces. Every instance of a class (all Thugs, all
+# Viper projectiles, ...) points at the same display-format surface and the same
+# precomputed white hit-flash variant, so spawning or hitting an entity allocates
+# nothing. Entities must treat these surfaces as read-only.
+
+_images = {}        # (size, color) -> Surface
+_flash_images = {}  # base Surface -> white Surface of the same size (keyed by identity)
+_unconverted = set() # Keys of _images created before a display mode was set
+cache_stats = {"allocations": 0, "hits": 0, "conversions": 0}
+
+def convert_for_display(surface):
+    # Match the display's pixel format so blits don't convert every frame.
+    # Headless runs (no display mode set) keep the plain surface.
+    if pygame.display.get_surface() is not None:
+        return surface.convert()
+    return surface
+
+def get_sprite_image(size, color):
+    key = (tuple(size), tuple(pygame.Color(color)))
+    image = _images.get(key)
+    if image is not None:
+        cache_stats["hits"] += 1
+        return image
+    image = pygame.Surface(size)
+    image.fill(pygame.Color(color))
+    if pygame.display.get_surface() is not None:
+        image = image.convert()
+    else:
+        _unconverted.add(key)
+    _images[key] = image
+    cache_stats["allocations"] += 1
+    return image
+
+def get_flash_image(image):
+    # Simple white flash for solid color sprites. For complex sprites, tinting or overlay might be better.
+    flash_image = _flash_images.get(image)
+    if flash_image is not None:
+        cache_stats["hits"] += 1
+        return flash_image
+    flash_image = image.copy()
+    flash_image.fill(pygame.Color('white'))
+    _flash_images[image] = flash_image
+    cache_stats["allocations"] += 1
+    return flash_image
+
+def convert_cached_images():
+    # Call after pygame.display.set_mode: images registered before the window
+    # existed are converted to its format. Only sprites created afterwards get
+    # the converted surfaces. Returns how many were converted.
+    if pygame.display.get_surface() is None:
+        return 0
+    for key in _unconverted:
+        image = _images[key]
+        _images[key] = image.convert()
+        _flash_images.pop(image, None) # Rebuilt from the converted image on first use
+    converted = len(_unconverted)
+    cache_stats["conversions"] += converted
+    _unconverted.clear()
+    return converted
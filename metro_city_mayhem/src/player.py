@@ -1,12 +1,21 @@
+import logging
 import pygame
+from src.image_cache import get_sprite_image, get_flash_image
+
+logger = logging.getLogger(__name__)
 
 class Player(pygame.sprite.Sprite):
+    # Stat increases per level (level_up), swept by batch_runner.py
+    level_up_health = 10
+    level_up_stamina = 10
+    level_up_strength = 2
+    level_up_defense = 1
+
     def __init__(self, screen_width, screen_height):
         super().__init__()
 
         # Appearance
-        self.image = pygame.Surface((32, 64))
-        self.image.fill(pygame.Color('blue'))
+        self.image = get_sprite_image((32, 64), 'blue')
         self.rect = self.image.get_rect()
 
         # Position and Movement
@@ -27,7 +36,8 @@ class Player(pygame.sprite.Sprite):
         self.is_flashing = False
         self.flash_timer = 0.0
         self.flash_duration = 0.1 # Duration of the flash in seconds
-        self.original_image = self.image.copy() # Store original image for flashing
+        self.original_image = self.image # Store original image for flashing
+        self.flash_image = get_flash_image(self.original_image)
 
         # Sound Effects (will be assigned from main.py)
         self.sound_effects = {}
@@ -50,7 +60,7 @@ class Player(pygame.sprite.Sprite):
             return
 
         self.xp += amount
-        print(f"Player gained {amount} XP. Total XP: {self.xp}/{self.xp_to_next_level}")
+        logger.info("Player gained %s XP. Total XP: %s/%s", amount, self.xp, self.xp_to_next_level)
 
         while self.xp >= self.xp_to_next_level and self.level < 99: # Check cap in loop condition
             self.level_up()
@@ -62,16 +72,11 @@ class Player(pygame.sprite.Sprite):
         self.xp -= self.xp_to_next_level # Subtract XP needed for current level, carry over excess
         self.level += 1
 
-        # Increase stats (example increments)
-        health_increase = 10
-        stamina_increase = 10
-        strength_increase = 2
-        defense_increase = 1
-
-        self.max_health += health_increase
-        self.max_stamina += stamina_increase
-        self.strength += strength_increase
-        self.defense += defense_increase
+        # Increase stats
+        self.max_health += self.level_up_health
+        self.max_stamina += self.level_up_stamina
+        self.strength += self.level_up_strength
+        self.defense += self.level_up_defense
 
         # Heal player fully on level up
         self.health = self.max_health
@@ -84,13 +89,13 @@ class Player(pygame.sprite.Sprite):
             self.xp_to_next_level = 0 # Indicate no more progression
             self.xp = 0 # Optional: Clamp XP to 0 or max for current level
 
-        print(f"LEVEL UP! Player reached Level {self.level}.")
-        print(f"  Max Health: {self.max_health}, Max Stamina: {self.max_stamina}")
-        print(f"  Strength: {self.strength}, Defense: {self.defense}")
+        logger.info("LEVEL UP! Player reached Level %s.", self.level)
+        logger.info("  Max Health: %s, Max Stamina: %s", self.max_health, self.max_stamina)
+        logger.info("  Strength: %s, Defense: %s", self.strength, self.defense)
         if self.xp_to_next_level > 0:
-            print(f"  XP for next level: {self.xp_to_next_level}")
+            logger.info("  XP for next level: %s", self.xp_to_next_level)
         else:
-            print(f"  Max level reached!")
+            logger.info("  Max level reached!")
 
 
     def update(self, dt, stage_width, screen_height): # screen_width changed to stage_width
@@ -190,16 +195,11 @@ class Player(pygame.sprite.Sprite):
 
         self.is_flashing = True
         self.flash_timer = self.flash_duration
-        # Create a temporary white version of the player's image for flashing
-        # This is a simple way for solid color sprites. For complex sprites, tinting or overlay might be better.
-        # As player.image is just a blue surface, we can create a white version easily.
-        flash_image_surf = self.original_image.copy()
-        flash_image_surf.fill(pygame.Color('white'))
-        self.image = flash_image_surf
+        self.image = self.flash_image # Shared white version of the player's image
 
 
         if self.sound_effects.get("take_damage"):
             self.sound_effects["take_damage"].play()
 
         self.invulnerability_timer = 0.5 # Standard invulnerability after taking damage
-        print(f"Player took {actual_damage} damage, health: {self.health}")
+        logger.info("Player took %s damage, health: %s", actual_damage, self.health)
@@ -0,0 +1,204 @@
+import json
+import time
+from array import array
+import pygame
+from src.settings import (PROFILER_EVENT_CAPACITY, PROFILER_FRAME_HISTORY, PROFILER_TRACK_ENTITY_CLASSES,
+                          PROFILER_AVERAGE_WEIGHT, FIXED_DT)
+from src.text_cache import TextCache, GlyphAtlas
+
+EVENT_PHASE = 0
+EVENT_ENTITY = 1  # Aggregated update cost of one entity class during one tick
+EVENT_FRAME = 2
+
+
+class FrameProfiler:
+    # Records how long each phase of a frame took. Call begin_frame() at the top
+    # of the frame, mark(phase) right after each phase finishes (the phase is
+    # timed from the previous mark) and end_frame() at the bottom.
+    #
+    # Events go into fixed-size ring buffers (preallocated arrays plus a write
+    # counter), so recording never allocates and never locks; once full, the
+    # oldest events are overwritten. That keeps it cheap enough to leave on, so
+    # the frames around a hitch are still there when the trace is dumped.
+    def __init__(self, event_capacity=PROFILER_EVENT_CAPACITY, frame_history=PROFILER_FRAME_HISTORY,
+                 enabled=True, track_entity_classes=PROFILER_TRACK_ENTITY_CLASSES):
+        self.enabled = enabled
+        self.track_entity_classes = track_entity_classes
+
+        # Event ring buffer
+        self.event_capacity = event_capacity
+        self.event_names = [None] * event_capacity
+        self.event_kinds = array('b', bytes(event_capacity))
+        self.event_frames = array('q', bytes(8 * event_capacity))
+        self.event_starts = array('d', bytes(8 * event_capacity))
+        self.event_durations = array('d', bytes(8 * event_capacity))
+        self.event_counts = array('q', bytes(8 * event_capacity))
+        self.events_written = 0
+
+        # Frame time ring buffer, for the overlay graph
+        self.frame_history = frame_history
+        self.frame_times = array('d', bytes(8 * frame_history))
+        self.frame_index = 0
+
+        self.origin = time.perf_counter()
+        self.frame_start = self.origin
+        self.last_mark = self.origin
+        self.current_phases = {} # phase -> seconds so far this frame
+        self.phase_averages = {} # phase -> smoothed seconds per frame
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self.frame_start = self.last_mark = time.perf_counter()
+        self.current_phases.clear()
+
+    def mark(self, phase):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.record(phase, self.last_mark, now - self.last_mark)
+        self.last_mark = now
+
+    def record(self, name, start, duration, kind=EVENT_PHASE, count=0):
+        slot = self.events_written % self.event_capacity
+        self.event_names[slot] = name
+        self.event_kinds[slot] = kind
+        self.event_frames[slot] = self.frame_index
+        self.event_starts[slot] = start
+        self.event_durations[slot] = duration
+        self.event_counts[slot] = count
+        self.events_written += 1
+        if kind == EVENT_PHASE:
+            self.current_phases[name] = self.current_phases.get(name, 0.0) + duration
+
+    def record_entity_costs(self, costs, start):
+        # costs: {class name: [seconds, updates]} for one tick, laid out one after another from start
+        for name, (duration, count) in costs.items():
+            self.record(name, start, duration, EVENT_ENTITY, count)
+            start += duration
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        duration = now - self.frame_start
+        self.record("frame", self.frame_start, duration, EVENT_FRAME)
+        self.frame_times[self.frame_index % self.frame_history] = duration
+        self.frame_index += 1
+
+        # Smoothed per-phase cost; phases that didn't run this frame decay towards zero
+        weight = PROFILER_AVERAGE_WEIGHT
+        averages = self.phase_averages
+        for phase in averages:
+            averages[phase] *= 1.0 - weight
+        for phase, seconds in self.current_phases.items():
+            averages[phase] = averages.get(phase, 0.0) + seconds * weight
+
+    def get_frame_times(self):
+        # Recent frame durations in seconds, oldest first
+        count = min(self.frame_index, self.frame_history)
+        first = self.frame_index - count
+        return [self.frame_times[i % self.frame_history] for i in range(first, self.frame_index)]
+
+    def get_phase_breakdown(self):
+        # [(phase, smoothed seconds per frame)], most expensive first
+        return sorted(self.phase_averages.items(), key=lambda item: item[1], reverse=True)
+
+    def iter_events(self):
+        # (name, kind, frame, start, duration, count) for every buffered event, oldest first
+        count = min(self.events_written, self.event_capacity)
+        for i in range(self.events_written - count, self.events_written):
+            slot = i % self.event_capacity
+            yield (self.event_names[slot], self.event_kinds[slot], self.event_frames[slot],
+                   self.event_starts[slot], self.event_durations[slot], self.event_counts[slot])
+
+    def export_chrome_trace(self, path):
+        # Chrome trace_event JSON (chrome://tracing, Perfetto). Frames and phases are
+        # on one track, per-class entity update costs on a second one.
+        trace_events = [
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": 1, "args": {"name": "frame phases"}},
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": 2, "args": {"name": "entity updates by class"}},
+        ]
+        categories = {EVENT_PHASE: "phase", EVENT_ENTITY: "entity", EVENT_FRAME: "frame"}
+        for name, kind, frame, start, duration, count in self.iter_events():
+            args = {"frame": frame}
+            if kind == EVENT_ENTITY:
+                args["updates"] = count
+            trace_events.append({
+                "name": name, "cat": categories[kind], "ph": "X",
+                "ts": (start - self.origin) * 1e6, "dur": duration * 1e6,
+                "pid": 1, "tid": 2 if kind == EVENT_ENTITY else 1, "args": args,
+            })
+        with open(path, "w") as trace_file:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, trace_file)
+        return len(trace_events)
+
+    def get_stats(self):
+        frame_times = self.get_frame_times()
+        return {
+            "frames": self.frame_index,
+            "events_written": self.events_written,
+            "events_buffered": min(self.events_written, self.event_capacity),
+            "last_frame_ms": frame_times[-1] * 1000 if frame_times else 0.0,
+            "max_recent_frame_ms": max(frame_times) * 1000 if frame_times else 0.0,
+        }
+
+
+class ProfilerOverlay:
+    # Frame-time graph plus per-phase breakdown, drawn on top of whatever is on screen
+    def __init__(self, font, text_cache=None, max_phases=14):
+        self.font = font
+        self.text_cache = text_cache if text_cache is not None else TextCache()
+        self.numbers = GlyphAtlas(font, pygame.Color('white'))
+        self.max_phases = max_phases
+        self.visible = False
+        self.graph_size = (PROFILER_FRAME_HISTORY, 60)
+        self.graph_max_ms = 50.0 # Frame time at the top of the graph
+        self.line_height = font.get_linesize()
+        self.panel = None
+
+    def toggle(self):
+        self.visible = not self.visible
+
+    def draw(self, surface, profiler, timestep=None):
+        if not self.visible:
+            return
+        padding = 6
+        graph_width, graph_height = self.graph_size
+        width = max(graph_width, 260) + 2 * padding
+        height = graph_height + (self.max_phases + 2) * self.line_height + 3 * padding
+        if self.panel is None or self.panel.get_size() != (width, height):
+            self.panel = pygame.Surface((width, height))
+            self.panel.set_alpha(200)
+        panel = self.panel
+        panel.fill(pygame.Color('black'))
+
+        # Frame-time graph, one bar per frame, with the 60 FPS budget as a line
+        scale = graph_height / self.graph_max_ms
+        for i, seconds in enumerate(profiler.get_frame_times()):
+            milliseconds = seconds * 1000
+            bar_height = min(graph_height, max(1, round(milliseconds * scale)))
+            color = pygame.Color('green') if milliseconds <= 17 else (pygame.Color('yellow') if milliseconds <= 34 else pygame.Color('red'))
+            pygame.draw.line(panel, color, (padding + i, padding + graph_height), (padding + i, padding + graph_height - bar_height))
+        budget_y = padding + graph_height - round(FIXED_DT * 1000 * scale)
+        pygame.draw.line(panel, pygame.Color('white'), (padding, budget_y), (padding + graph_width, budget_y))
+
+        # Per-phase breakdown (smoothed ms per frame)
+        y = 2 * padding + graph_height
+        frame_times = profiler.get_frame_times()
+        last_ms = frame_times[-1] * 1000 if frame_times else 0.0
+        self._draw_row(panel, "frame", last_ms, padding, y)
+        if timestep is not None: # Total simulation time the catch-up cap has thrown away
+            y += self.line_height
+            self._draw_row(panel, f"dropped ({timestep.dropped_frames} frames)", timestep.dropped_time * 1000, padding, y)
+        for phase, seconds in profiler.get_phase_breakdown()[:self.max_phases]:
+            y += self.line_height
+            self._draw_row(panel, phase, seconds * 1000, padding, y)
+
+        surface.blit(panel, (surface.get_width() - width - padding, padding))
+
+    def _draw_row(self, panel, label, milliseconds, x, y):
+        panel.blit(self.text_cache.render(self.font, label, True, pygame.Color('white')), (x, y))
+        value = f"{milliseconds:.2f}"
+        value_width = self.numbers.size(value)[0]
+        self.numbers.draw(panel, value, (panel.get_width() - x - value_width, y))
@@ -1,17 +1,29 @@
 import pygame
+from src.image_cache import get_sprite_image
 
 class Projectile(pygame.sprite.Sprite):
     def __init__(self, start_x, start_y, velocity_x, color=pygame.Color('magenta'), width=25, height=10): # Slightly larger projectile
         super().__init__()
-        self.image = pygame.Surface([width, height])
-        self.image.fill(color)
+        self.image = get_sprite_image((width, height), color) # Shared by every projectile of this size/color
         self.rect = self.image.get_rect()
+        self.pool = None # Set by ProjectilePool; killed projectiles go back to it
+        self.reset(start_x, start_y, velocity_x)
+
+    def reset(self, start_x, start_y, velocity_x, damage=15):
+        # (Re)initialize in place, used by ProjectilePool to recycle instances
         self.rect.centerx = start_x # Spawn from center
         self.rect.centery = start_y
         self.velocity_x = velocity_x # Pixels per second / dt
-        self.damage = 15 # Viper's projectile damage
+        self.damage = damage # Viper's projectile damage
+        self.prev_rect_topleft = None # Don't interpolate from wherever a recycled projectile was
 
     def update(self, dt, stage_width, screen_height): # screen_height for consistency, stage_width for boundary
         self.rect.x += self.velocity_x * dt
         if self.rect.right < 0 or self.rect.left > stage_width:
             self.kill()
+
+    def kill(self):
+        was_alive = self.alive()
+        super().kill()
+        if was_alive and self.pool is not None:
+            self.pool.release(self)
@@ -0,0 +1,100 @@
+from collections import OrderedDict
+from src.projectile import Projectile
+from src.settings import PROJECTILE_POOL_CAPACITY, PROJECTILE_POOL_OVERFLOW
+
+OVERFLOW_POLICIES = ("recycle_oldest", "drop", "grow")
+
+class ProjectilePool:
+    # Preallocated Projectile instances. acquire() hands out a free one (reset in
+    # place and added to the pool's groups); Projectile.kill() gives it back.
+    # Firing therefore allocates nothing once the pool is warm.
+    def __init__(self, capacity=PROJECTILE_POOL_CAPACITY, overflow_policy=PROJECTILE_POOL_OVERFLOW, groups=()):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown projectile pool overflow policy '{overflow_policy}', expected one of {OVERFLOW_POLICIES}")
+        self.overflow_policy = overflow_policy
+        self.groups = tuple(groups) # e.g. (all_sprites, projectiles)
+        self.capacity = 0
+        self.free = []
+        self.active = OrderedDict() # Projectile -> None, oldest first
+
+        # Stats
+        self.acquired = 0
+        self.recycled = 0         # Projectiles returned to the pool
+        self.overflow_events = 0  # Acquires with no free slot
+        self.dropped = 0          # Shots not fired because of the "drop" policy
+        self.stolen = 0           # Live shots reused by the "recycle_oldest" policy
+        self.grown = 0            # Extra instances allocated by the "grow" policy
+        self.peak_in_use = 0
+
+        self.preallocate(capacity)
+
+    def preallocate(self, capacity):
+        # Grow the pool to at least `capacity` instances (called per stage)
+        while self.capacity < capacity:
+            self.free.append(self._create())
+
+    def _create(self):
+        projectile = Projectile(0, 0, 0)
+        projectile.pool = self
+        self.capacity += 1
+        return projectile
+
+    def acquire(self, start_x, start_y, velocity_x, damage=15):
+        if self.free:
+            projectile = self.free.pop()
+        else:
+            self.overflow_events += 1
+            if self.overflow_policy == "drop":
+                self.dropped += 1
+                return None
+            elif self.overflow_policy == "grow":
+                projectile = self._create()
+                self.grown += 1
+            else: # recycle_oldest
+                projectile = next(iter(self.active))
+                projectile.kill() # Releases it back to self.free
+                self.free.pop()
+                self.stolen += 1
+
+        projectile.reset(start_x, start_y, velocity_x, damage)
+        self.active[projectile] = None
+        for group in self.groups:
+            group.add(projectile)
+        self.acquired += 1
+        self.peak_in_use = max(self.peak_in_use, len(self.active))
+        return projectile
+
+    def release(self, projectile):
+        # Called from Projectile.kill()
+        if projectile in self.active:
+            del self.active[projectile]
+            self.free.append(projectile)
+            self.recycled += 1
+
+    def reclaim(self, projectile):
+        # Make a specific free projectile live again as it is, e.g. when restoring a snapshot
+        if projectile in self.active:
+            return
+        self.free.remove(projectile)
+        self.active[projectile] = None
+        for group in self.groups:
+            group.add(projectile)
+
+    def release_all(self):
+        # Clear every live projectile, e.g. on stage load
+        for projectile in list(self.active):
+            projectile.kill()
+
+    def get_stats(self):
+        return {
+            "capacity": self.capacity,
+            "in_use": len(self.active),
+            "free": len(self.free),
+            "peak_in_use": self.peak_in_use,
+            "acquired": self.acquired,
+            "recycled": self.recycled,
+            "overflow_events": self.overflow_events,
+            "dropped": self.dropped,
+            "stolen": self.stolen,
+            "grown": self.grown,
+        }
@@ -0,0 +1,308 @@
+import pygame
+from src.text_cache import TextCache, GlyphAtlas
+from src import image_cache
+
+# Health Bar settings
+HEALTH_BAR_HEIGHT = 7
+HEALTH_BAR_OFFSET_Y = 10
+HUD_TEXT_COLOR = pygame.Color('white')
+FULL_REDRAW_AREA_RATIO = 0.5 # If more than this fraction of the screen is dirty, just redraw and flip everything
+MAX_DIRTY_RECTS = 32 # Past this many separate regions, merge them into their bounding box
+
+# Helper Function for Health Bar
+def draw_health_bar(surface, current_health, max_health, bar_rect):
+    if current_health < 0: current_health = 0
+    if max_health == 0: fill_ratio = 0
+    else: fill_ratio = current_health / max_health
+    bar_width = bar_rect.width * fill_ratio
+    outline_color = pygame.Color('grey')
+    fill_color = pygame.Color('green')
+    if fill_ratio < 0.6: fill_color = pygame.Color('yellow')
+    if fill_ratio < 0.3: fill_color = pygame.Color('red')
+    pygame.draw.rect(surface, outline_color, bar_rect, 1)
+    if bar_width > 0: pygame.draw.rect(surface, fill_color, (bar_rect.x, bar_rect.y, bar_width, bar_rect.height))
+
+
+def merge_rects(rects):
+    # Collapse overlapping rects so no region is redrawn twice
+    merged = []
+    for rect in rects:
+        rect = rect.copy()
+        i = 0
+        while i < len(merged):
+            if rect.colliderect(merged[i]):
+                rect.union_ip(merged.pop(i))
+                i = 0 # The grown rect may now touch earlier ones
+            else:
+                i += 1
+        merged.append(rect)
+    return merged
+
+
+class WorldRenderer:
+    # Draws the PLAYING/BOSS_DIALOGUE view: background, sprites, enemy health
+    # bars, HUD and dialogue box.
+    #
+    # In dirty-rect mode it remembers what it drew last frame (each sprite's
+    # screen rect, image and health, and a key for each HUD element) and only
+    # repaints and pushes the regions that changed. A camera scroll changes every
+    # pixel, so it falls back to a full redraw and flip. When nothing changed,
+    # draw() pushes nothing at all.
+    def __init__(self, screen_width, screen_height, ui_font, dirty_rects=True, text_cache=None):
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.screen_rect = pygame.Rect(0, 0, screen_width, screen_height)
+        self.ui_font = ui_font
+        self.dirty_rects = dirty_rects
+        # Static labels come from the shared text cache; counters are composed from glyphs
+        self.text_cache = text_cache if text_cache is not None else TextCache()
+        self.counter_atlas = GlyphAtlas(ui_font, HUD_TEXT_COLOR)
+
+        self.sprite_records = {} # sprite -> (footprint rect, image, health) from the last frame
+        self.hud_records = {}    # HUD element name -> (state key, rect) from the last frame
+        self.bullet_bounds = None # Screen rect covering the array bullets drawn last frame
+        self.last_view_key = None # Camera offset and background drawn last frame
+        self.needs_full_redraw = True
+
+        # Stats
+        self.full_frames = 0
+        self.partial_frames = 0
+        self.skipped_frames = 0
+        self.last_dirty_area = 0
+
+    def invalidate(self):
+        # Something else drew over the screen (menus, scenes); repaint everything next time
+        self.needs_full_redraw = True
+
+    def draw(self, screen, world, dialogue_box, alpha=1.0):
+        # Returns None when the whole screen was redrawn (caller should flip),
+        # otherwise the list of rects to pass to pygame.display.update (may be empty).
+        profiler = world.profiler
+        offset = world.camera.get_render_offset(alpha)
+        offset = (round(offset.x), round(offset.y))
+        view_key = (offset, world.stage_manager.background)
+        sprite_entries = self._collect_sprites(world, alpha)
+        bullet_batch, bullet_bounds = self._collect_bullets(world, offset, alpha)
+        hud_entries = self._collect_hud(world, dialogue_box)
+        profiler.mark("render.collect")
+
+        full_redraw = not self.dirty_rects or self.needs_full_redraw or view_key != self.last_view_key
+        dirty = None if full_redraw else self._find_dirty_rects(sprite_entries, bullet_bounds, hud_entries)
+        if dirty is not None:
+            self.last_dirty_area = sum(rect.width * rect.height for rect in dirty)
+            if self.last_dirty_area > FULL_REDRAW_AREA_RATIO * self.screen_width * self.screen_height:
+                dirty = None
+
+        self._remember(view_key, sprite_entries, bullet_bounds, hud_entries)
+        profiler.mark("render.dirty_rects")
+
+        if dirty is None:
+            self._paint(screen, world, dialogue_box, offset, sprite_entries, bullet_batch, hud_entries)
+            self.full_frames += 1
+            self.last_dirty_area = self.screen_width * self.screen_height
+            return None
+
+        if not dirty:
+            self.skipped_frames += 1
+            return dirty
+        for rect in dirty:
+            screen.set_clip(rect)
+            self._paint(screen, world, dialogue_box, offset, sprite_entries, bullet_batch, hud_entries, rect)
+        screen.set_clip(None)
+        self.partial_frames += 1
+        return dirty
+
+    def _collect_sprites(self, world, alpha):
+        # (sprite, screen rect, health bar rect or None, footprint) for every visible sprite
+        boss = world.stage_manager.boss
+        entries = []
+        screen_rect = self.screen_rect
+        for sprite in world.all_sprites:
+            rect = world.get_render_rect(sprite, alpha)
+            bar_rect = None
+            footprint = rect
+            if sprite in world.enemies and sprite is not boss: # Boss health bar is drawn in the HUD
+                bar_rect = pygame.Rect(rect.x, rect.top - HEALTH_BAR_OFFSET_Y - HEALTH_BAR_HEIGHT, rect.width, HEALTH_BAR_HEIGHT)
+                footprint = rect.union(bar_rect)
+            if footprint.colliderect(screen_rect):
+                entries.append((sprite, rect, bar_rect, footprint))
+        return entries
+
+    def _collect_bullets(self, world, offset, alpha):
+        # Array bullets are tracked as one bounding rect rather than per bullet
+        if world.bullets is None:
+            return [], None
+        return world.bullets.get_draw_batch(offset, alpha, self.screen_rect)
+
+    def _collect_hud(self, world, dialogue_box):
+        # (name, state key, screen rect) for each HUD element; the key changes whenever its pixels would
+        player = world.player
+        stage_manager = world.stage_manager
+        entries = [
+            ("health", (player.health, player.max_health), pygame.Rect(10, 10, 150, 20)),
+            ("stamina", (player.stamina, player.max_stamina), pygame.Rect(10, 35, 130, 15)),
+        ]
+        for name, text, y in (("money", self._money_text(player), 60),
+                              ("xp", self._xp_text(player), 85),
+                              ("stage", self._stage_text(stage_manager), 110)):
+            entries.append((name, text, pygame.Rect((10, y), self._counter_text_size(text))))
+
+        boss = stage_manager.boss
+        if boss and boss.alive():
+            entries.append(("boss", (boss.__class__.__name__, boss.health, boss.max_health), self._boss_hud_rect(boss)))
+        if dialogue_box.is_showing:
+            entries.append(("dialogue", dialogue_box.get_render_key(), dialogue_box.box_rect.copy()))
+        return entries
+
+    def _find_dirty_rects(self, sprite_entries, bullet_bounds, hud_entries):
+        dirty = []
+        old_sprites = self.sprite_records
+        seen = set()
+        for sprite, rect, bar_rect, footprint in sprite_entries:
+            seen.add(sprite)
+            old = old_sprites.get(sprite)
+            if old is None:
+                dirty.append(footprint)
+            elif old[0] != footprint or old[1] is not sprite.image or old[2] != getattr(sprite, 'health', None):
+                dirty.append(footprint)
+                dirty.append(old[0])
+        for sprite, old in old_sprites.items():
+            if sprite not in seen: # Killed or scrolled away
+                dirty.append(old[0])
+
+        # Bullets can move, appear or vanish inside an unchanged bounding rect, so always repaint both
+        for rect in (bullet_bounds, self.bullet_bounds):
+            if rect is not None:
+                dirty.append(rect)
+
+        old_hud = self.hud_records
+        for name, key, rect in hud_entries:
+            old = old_hud.get(name)
+            if old is None:
+                dirty.append(rect)
+            elif old[0] != key or old[1] != rect:
+                dirty.append(rect)
+                dirty.append(old[1])
+        current_names = {entry[0] for entry in hud_entries}
+        for name, old in old_hud.items():
+            if name not in current_names: # e.g. boss defeated, dialogue closed
+                dirty.append(old[1])
+
+        dirty = [rect.clip(self.screen_rect) for rect in dirty]
+        dirty = merge_rects([rect for rect in dirty if rect.width and rect.height])
+        if len(dirty) > MAX_DIRTY_RECTS:
+            dirty = [dirty[0].unionall(dirty[1:])]
+        return dirty
+
+    def _remember(self, view_key, sprite_entries, bullet_bounds, hud_entries):
+        self.last_view_key = view_key
+        self.bullet_bounds = bullet_bounds
+        self.needs_full_redraw = False
+        self.sprite_records = {sprite: (footprint, sprite.image, getattr(sprite, 'health', None))
+                               for sprite, rect, bar_rect, footprint in sprite_entries}
+        self.hud_records = {name: (key, rect) for name, key, rect in hud_entries}
+
+    def _paint(self, screen, world, dialogue_box, offset, sprite_entries, bullet_batch, hud_entries, clip=None):
+        # Paints the whole view, skipping anything outside clip (screen clip is set by the caller)
+        profiler = world.profiler
+        background = world.stage_manager.background
+        if background:
+            background.draw(screen, offset[0], offset[1]) # Surface clip limits the blit to the dirty area
+        else:
+            screen.fill(pygame.Color('black'), clip)
+        profiler.mark("render.background")
+
+        # Draw all sprites (player, enemies, projectiles)
+        # The .image attribute of each sprite will be the correct one (normal or flashed)
+        # due to their own update() methods.
+        for sprite, rect, bar_rect, footprint in sprite_entries:
+            if clip is None or rect.colliderect(clip):
+                screen.blit(sprite.image, rect)
+        profiler.mark("render.sprites")
+
+        if bullet_batch:
+            screen.blits(bullet_batch, doreturn=False) # One call for every array bullet
+            profiler.mark("render.bullets")
+
+        # Draw health bars for non-boss enemies
+        for sprite, rect, bar_rect, footprint in sprite_entries:
+            if bar_rect is not None and (clip is None or bar_rect.colliderect(clip)):
+                draw_health_bar(screen, sprite.health, sprite.max_health, bar_rect)
+        profiler.mark("render.health_bars")
+
+        # HUD Drawing (Player stats, Stage info, Boss, Dialogue)
+        for name, key, rect in hud_entries:
+            if clip is None or rect.colliderect(clip):
+                self._draw_hud_element(screen, name, rect, world, dialogue_box)
+        profiler.mark("render.hud")
+
+    def _draw_hud_element(self, screen, name, rect, world, dialogue_box):
+        player = world.player
+        if name == "health":
+            draw_health_bar(screen, player.health, player.max_health, rect)
+        elif name == "stamina":
+            draw_health_bar(screen, player.stamina, player.max_stamina, rect)
+        elif name == "money":
+            self._draw_counter_text(screen, self._money_text(player), rect.topleft)
+        elif name == "xp":
+            self._draw_counter_text(screen, self._xp_text(player), rect.topleft)
+        elif name == "stage":
+            self._draw_counter_text(screen, self._stage_text(world.stage_manager), rect.topleft)
+        elif name == "boss":
+            boss = world.stage_manager.boss
+            boss_name_text = self.text_cache.render(self.ui_font, boss.__class__.__name__, True, HUD_TEXT_COLOR)
+            boss_name_rect = boss_name_text.get_rect(centerx=self.screen_width / 2, y=10)
+            screen.blit(boss_name_text, boss_name_rect)
+            draw_health_bar(screen, boss.health, boss.max_health, self._boss_health_bar_rect(boss_name_rect))
+        elif name == "dialogue":
+            dialogue_box.draw(screen)
+
+    # HUD strings are (static label, changing value) pairs: the label surface is
+    # cached, the value is composed from the glyph atlas
+    def _money_text(self, player):
+        return ("Money: ", f"${player.money}")
+
+    def _xp_text(self, player):
+        return ("XP: ", f"{player.xp} / {player.xp_to_next_level}")
+
+    def _stage_text(self, stage_manager):
+        stage_name_text = stage_manager.current_stage_data['name'] if stage_manager.current_stage_data else "Loading..."
+        return (f"Stage: {stage_manager.current_stage_number} - {stage_name_text}", "") # Only changes on stage load
+
+    def _counter_text_size(self, text):
+        label, value = text
+        label_width, label_height = self.text_cache.render(self.ui_font, label, True, HUD_TEXT_COLOR).get_size()
+        value_width, value_height = self.counter_atlas.size(value)
+        return label_width + value_width, max(label_height, value_height)
+
+    def _draw_counter_text(self, screen, text, pos):
+        label, value = text
+        label_surface = self.text_cache.render(self.ui_font, label, True, HUD_TEXT_COLOR)
+        screen.blit(label_surface, pos)
+        if value:
+            self.counter_atlas.draw(screen, value, (pos[0] + label_surface.get_width(), pos[1]))
+
+    def _boss_health_bar_rect(self, boss_name_rect):
+        boss_health_bar_width = self.screen_width * 0.6
+        boss_health_bar_height = 25
+        boss_health_bar_x = (self.screen_width - boss_health_bar_width) / 2
+        boss_health_bar_y = boss_name_rect.bottom + 5
+        return pygame.Rect(boss_health_bar_x, boss_health_bar_y, boss_health_bar_width, boss_health_bar_height)
+
+    def _boss_hud_rect(self, boss):
+        # Boss name plus its health bar underneath
+        name_width, name_height = self.text_cache.render(self.ui_font, boss.__class__.__name__, True, HUD_TEXT_COLOR).get_size()
+        boss_name_rect = pygame.Rect(0, 10, name_width, name_height)
+        boss_name_rect.centerx = self.screen_width / 2
+        return boss_name_rect.union(self._boss_health_bar_rect(boss_name_rect))
+
+    def get_stats(self):
+        return {
+            "full_frames": self.full_frames,
+            "partial_frames": self.partial_frames,
+            "skipped_frames": self.skipped_frames,
+            "last_dirty_area": self.last_dirty_area,
+            "text_cache": self.text_cache.get_stats(),
+            "counter_atlas": self.counter_atlas.get_stats(),
+            "image_cache": dict(image_cache.cache_stats),
+        }
@@ -0,0 +1,212 @@
+import json
+import os
+import struct
+import time
+from src.settings import FIXED_DT, REPLAY_HASH_INTERVAL
+from src.world import World, PlayerInput
+
+# Replay file layout (little endian):
+#   header:  b"MCMR", version u16, seed u32, stage u16, hash interval u16, flags u8,
+#            start state length u32, start state JSON
+#   records: one byte each, optionally followed by a payload
+#       0x00-0x3f  one logic tick with that PlayerInput bitmask
+#       0x80       RETRY (World.retry_stage)
+#       0x81       HASH u32, World.get_state_hash() after the preceding tick
+#
+# A replay starts from a freshly loaded stage, so everything the stage load
+# doesn't reset (player stats and timers, camera shake) is stored in the
+# start state.
+
+REPLAY_MAGIC = b"MCMR"
+REPLAY_VERSION = 1
+_HEADER = struct.Struct("<4sHIHHBI")
+_HASH = struct.Struct("<I")
+
+RECORD_RETRY = 0x80
+RECORD_HASH = 0x81
+
+FLAG_BULLET_SYSTEM = 1
+FLAG_CROWD = 2
+
+PLAYER_START_FIELDS = ("health", "max_health", "stamina", "max_stamina", "strength", "defense", "speed",
+                       "xp", "level", "xp_to_next_level", "money", "facing_right", "is_punching", "is_kicking",
+                       "attack_timer", "invulnerability_timer", "is_flashing", "flash_timer")
+CAMERA_START_FIELDS = ("shake_intensity", "shake_timer", "shake_duration")
+
+
+class ReplayError(Exception):
+    pass
+
+
+class ReplayDesyncError(ReplayError):
+    def __init__(self, tick, expected_hash, actual_hash):
+        super().__init__(f"Replay desynced at tick {tick}: expected state hash {expected_hash:08x}, got {actual_hash:08x}")
+        self.tick = tick
+        self.expected_hash = expected_hash
+        self.actual_hash = actual_hash
+
+
+class Replay:
+    def __init__(self, seed, stage_number, start_state, flags=0, hash_interval=REPLAY_HASH_INTERVAL, records=b""):
+        self.seed = seed
+        self.stage_number = stage_number
+        self.start_state = start_state # {"player": {...}, "camera": {...}}
+        self.flags = flags
+        self.hash_interval = hash_interval
+        self.records = bytearray(records)
+
+    def to_bytes(self):
+        state = json.dumps(self.start_state, separators=(",", ":")).encode("utf-8")
+        header = _HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, self.seed, self.stage_number,
+                              self.hash_interval, self.flags, len(state))
+        return header + state + bytes(self.records)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if len(data) < _HEADER.size:
+            raise ReplayError("Replay file is truncated")
+        magic, version, seed, stage_number, hash_interval, flags, state_length = _HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC:
+            raise ReplayError("Not a replay file")
+        if version != REPLAY_VERSION:
+            raise ReplayError(f"Unsupported replay version {version}")
+        state_end = _HEADER.size + state_length
+        start_state = json.loads(data[_HEADER.size:state_end].decode("utf-8"))
+        return cls(seed, stage_number, start_state, flags, hash_interval, data[state_end:])
+
+    def save(self, path):
+        with open(path, "wb") as replay_file:
+            replay_file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as replay_file:
+            return cls.from_bytes(replay_file.read())
+
+    def iter_records(self):
+        # Yields ("tick", input mask), ("retry", None) and ("hash", crc)
+        records = self.records
+        i = 0
+        while i < len(records):
+            code = records[i]
+            i += 1
+            if code < RECORD_RETRY:
+                yield "tick", code
+            elif code == RECORD_RETRY:
+                yield "retry", None
+            elif code == RECORD_HASH:
+                yield "hash", _HASH.unpack_from(records, i)[0]
+                i += _HASH.size
+            else:
+                raise ReplayError(f"Unknown replay record 0x{code:02x} at offset {i - 1}")
+
+
+def capture_start_state(world):
+    return {
+        "player": {name: getattr(world.player, name) for name in PLAYER_START_FIELDS},
+        "camera": {name: getattr(world.camera, name) for name in CAMERA_START_FIELDS},
+    }
+
+
+def apply_start_state(world, start_state):
+    for name, value in start_state["player"].items():
+        setattr(world.player, name, value)
+    for name, value in start_state["camera"].items():
+        setattr(world.camera, name, value)
+    player = world.player
+    player.image = player.flash_image if player.is_flashing else player.original_image
+
+
+class ReplayRecorder:
+    # Records a play session tick by tick. Call start() right before the stage
+    # load the recording should begin at, then record_tick() after every
+    # World.step() and record_retry() before every World.retry_stage().
+    # With a path, every start() begins a new game with its own file: the
+    # first game is written to path, later ones to path with -2, -3, ... added
+    # before the extension.
+    def __init__(self, path=None, hash_interval=REPLAY_HASH_INTERVAL):
+        self.path = path
+        self.hash_interval = hash_interval
+        self.replay = None
+        self.ticks = 0
+        self.games = 0
+
+    def get_game_path(self):
+        # File for the game being recorded, or None without a path
+        if not self.path or self.games <= 1:
+            return self.path
+        root, extension = os.path.splitext(self.path)
+        return f"{root}-{self.games}{extension}"
+
+    def start(self, world, stage_number):
+        # Reseeds the world so the recording is reproducible from its header
+        self.games += 1
+        seed = world.reseed()
+        flags = (FLAG_BULLET_SYSTEM if world.bullets is not None else 0) | (FLAG_CROWD if world.crowd is not None else 0)
+        self.replay = Replay(seed, stage_number, capture_start_state(world), flags, self.hash_interval)
+        self.ticks = 0
+        return self.replay
+
+    def record_tick(self, inputs, world):
+        if self.replay is None:
+            return
+        records = self.replay.records
+        records.append(inputs.to_mask())
+        self.ticks += 1
+        if self.hash_interval and self.ticks % self.hash_interval == 0:
+            records.append(RECORD_HASH)
+            records += _HASH.pack(world.get_state_hash())
+
+    def record_retry(self):
+        if self.replay is not None:
+            self.replay.records.append(RECORD_RETRY)
+
+    def stop(self, path=None):
+        replay = self.replay
+        self.replay = None
+        if replay is not None and path:
+            replay.save(path)
+        return replay
+
+
+def create_replay_world(replay, stage_configurations, **world_kwargs):
+    # A World in the state the recording started from, with the stage loaded
+    world = World(stage_configurations, seed=replay.seed,
+                  use_bullet_system=bool(replay.flags & FLAG_BULLET_SYSTEM),
+                  use_crowd=bool(replay.flags & FLAG_CROWD), **world_kwargs)
+    if (replay.flags & FLAG_BULLET_SYSTEM) and world.bullets is None:
+        raise ReplayError("Replay was recorded with the bullet system, which needs NumPy")
+    apply_start_state(world, replay.start_state)
+    if not world.load_stage(replay.stage_number):
+        raise ReplayError(f"Replay stage {replay.stage_number} not found")
+    return world
+
+
+def play_replay(replay, world, verify=True, on_tick=None):
+    # Feeds the recorded input into world as fast as possible. Raises
+    # ReplayDesyncError at the first state hash mismatch when verify is set.
+    # on_tick(world, events) is called after every tick, e.g. to render.
+    ticks = 0
+    hashes_checked = 0
+    start_time = time.perf_counter()
+    for kind, value in replay.iter_records():
+        if kind == "tick":
+            events = world.step(PlayerInput.from_mask(value), FIXED_DT)
+            ticks += 1
+            if on_tick is not None:
+                on_tick(world, events)
+        elif kind == "retry":
+            world.retry_stage()
+        elif kind == "hash" and verify:
+            actual = world.get_state_hash()
+            if actual != value:
+                raise ReplayDesyncError(ticks, value, actual)
+            hashes_checked += 1
+    elapsed = time.perf_counter() - start_time
+    return {
+        "ticks": ticks,
+        "hashes_checked": hashes_checked,
+        "seconds": elapsed,
+        "ticks_per_second": ticks / elapsed if elapsed > 0 else 0.0,
+        "speedup": ticks * FIXED_DT / elapsed if elapsed > 0 else 0.0, # vs. real time
+    }
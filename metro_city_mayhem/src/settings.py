@@ -0,0 +1,113 @@
+# Shared screen/simulation constants. Kept free of pygame display calls so the
+# simulation modules can import them without opening a window.
+
+SCREEN_WIDTH = 800
+SCREEN_HEIGHT = 600
+
+# Fixed-step simulation. Logic always advances in FIXED_DT ticks; rendering
+# interpolates between the last two ticks.
+SIMULATION_HZ = 60
+FIXED_DT = 1.0 / SIMULATION_HZ
+MAX_STEPS_PER_FRAME = 5 # Catch-up cap so a long hitch can't snowball
+
+# Broadphase grid cell size in pixels (a bit larger than the biggest sprite)
+SPATIAL_CELL_SIZE = 128
+
+# Enemy activation: enemies wake when they enter the camera view widened by
+# ACTIVATION_WAKE_MARGIN and go dormant once idle beyond the wake region plus
+# ACTIVATION_SLEEP_HYSTERESIS (so they don't flicker at the edge).
+ACTIVATION_WAKE_MARGIN = 300
+ACTIVATION_SLEEP_HYSTERESIS = 100
+
+# Enemy streaming: placements are spawned when they come within
+# SPAWN_AHEAD_MARGIN of the camera's right edge, and dormant enemies further than
+# RETIRE_BEHIND_MARGIN behind its left edge are removed for good.
+SPAWN_AHEAD_MARGIN = 400
+RETIRE_BEHIND_MARGIN = 600
+
+# Stage backgrounds are split into fixed-width tiles built on demand. With tiles
+# as wide as the screen at most two are visible at once.
+BACKGROUND_TILE_WIDTH = SCREEN_WIDTH
+BACKGROUND_MAX_CACHED_TILES = 4
+
+# Rendered-text cache capacity (surfaces kept for static/slow-changing UI strings)
+TEXT_CACHE_SIZE = 256
+
+# Dialogue: wrapped layouts and composed page surfaces are cached across retries
+DIALOGUE_LAYOUT_CACHE_SIZE = 128
+DIALOGUE_PAGE_CACHE_SIZE = 16
+
+# Projectile pool: preallocated per stage. Overflow policy when every slot is
+# in flight: "recycle_oldest" (reuse the oldest live shot), "drop" (don't fire)
+# or "grow" (allocate past capacity).
+PROJECTILE_POOL_CAPACITY = 32
+PROJECTILE_POOL_OVERFLOW = "recycle_oldest"
+
+# Enemy pool (src/entity_pool.py): killed enemies and bosses are reset and
+# reused instead of constructed again. Each stage load preallocates up to
+# ENTITY_POOL_PREALLOCATE instances per regular enemy class it places.
+ENTITY_POOL_ENABLED = True
+ENTITY_POOL_PREALLOCATE = 8
+
+# Array-backed bullets (src/bullet_system.py). Needs NumPy; without it, or when
+# disabled, Viper fires pooled Projectile sprites instead.
+BULLET_SYSTEM_ENABLED = True
+BULLET_SYSTEM_CAPACITY = 1024 # Initial slots; the arrays double when full
+
+# Crowd simulation (src/crowd.py): regular enemies updated together from NumPy
+# arrays. Sprites are only written back inside the camera view widened by
+# CROWD_SYNC_MARGIN. Falls back to per-enemy updates without NumPy.
+CROWD_SIMULATION_ENABLED = True
+CROWD_INITIAL_CAPACITY = 256
+CROWD_SYNC_MARGIN = 200
+
+# Replays (src/replay.py): the state hash is recorded every N ticks and
+# checked on playback (0 = never)
+REPLAY_HASH_INTERVAL = 1
+
+# Frame profiler (src/profiler.py): F3 toggles the overlay, F4 writes a Chrome trace
+PROFILER_ENABLED = True
+PROFILER_EVENT_CAPACITY = 65536  # Ring buffer size; roughly the last ~30 seconds of phase events
+PROFILER_FRAME_HISTORY = 240     # Frames shown in the overlay graph
+PROFILER_TRACK_ENTITY_CLASSES = True # Time enemy updates per class (a clock read per awake enemy)
+PROFILER_AVERAGE_WEIGHT = 0.05   # Smoothing of the overlay's per-phase numbers
+PROFILER_TRACE_PATH = "profile_trace.json"
+
+# Stage prefetching (src/asset_loader.py): while a stage is played, the next
+# one's music file, spawn queue and first background tiles are prepared on a
+# worker thread
+STAGE_MUSIC_PATH = "assets/audio/stage{}_music.ogg"
+STAGE_PREFETCH_TILES = 2 # Background tiles built ahead (the screen spans at most two)
+
+# Mixer (src/sound_manager.py). The buffer is in samples: 256 at 44.1 kHz is
+# ~6 ms of latency. Raise it if the audio crackles.
+MIXER_FREQUENCY = 44100
+MIXER_SAMPLE_SIZE = -16
+MIXER_OUTPUT_CHANNELS = 2 # Stereo
+MIXER_BUFFER_SIZE = 256
+# Channels reserved for each sound category; a category never plays on another's channels
+SOUND_CHANNEL_POOLS = {"player": 4, "combat": 4, "ui": 2}
+
+# Autoplay (src/bot.py, `python main.py --autoplay`): scripted players and
+# the soak sampler that watches long unattended runs for leaks and slowdowns
+BOT_SIGHT = 500               # How far a policy looks for a target (px)
+BOT_ALIGN_TOLERANCE = 6       # Vertical distance a policy accepts before lining up (px)
+BOT_SHOT_CLEARANCE = 7        # How far above a shooter's center line a policy stands (px)
+BOT_CAUTIOUS_HEALTH_FRACTION = 0.4
+BOT_MENU_PRESS_INTERVAL = 30  # Frames each menu, scene and dialogue page stays up before Enter
+BOT_STALL_FRAMES = 600        # Frames with no enemies left and no progress right before a run counts as stalled
+SOAK_SAMPLE_INTERVAL = 10.0   # Seconds of wall time between samples
+SOAK_MEMORY_GROWTH_WARNING_KB = 32768 # Resident memory growth over a run reported as a possible leak
+SOAK_FRAME_TIME_GROWTH_WARNING = 0.5  # Mean frame time growth (fraction) reported as a slowdown
+
+# Training environments (src/vec_env.py)
+VEC_ENV_MAX_STEPS = 60 * 120      # Steps before an episode is cut off (2 minutes of game time at one tick per step)
+VEC_ENV_NEAREST_ENEMIES = 4       # Regular enemies in each observation
+VEC_ENV_NEAREST_PROJECTILES = 8   # Projectiles and bullets in each observation
+VEC_ENV_ARENA_BOSS_DISTANCE = 120 # Boss arenas: px between the player's start and the boss
+VEC_ENV_WIN_REWARD = 1.0
+VEC_ENV_LOSS_PENALTY = 1.0
+
+# Startup (main.py): time from the start of main.py's imports to the first menu
+# frame on screen. `python main.py --measure-startup` exits 1 when over budget.
+STARTUP_FIRST_FRAME_BUDGET_MS = 500
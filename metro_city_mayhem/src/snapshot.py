@@ -0,0 +1,179 @@
+import operator
+import time
+import pygame
+
+# In-memory snapshots of a World, used for Retry (stage start and checkpoints)
+# and quicksave/quickload.
+#
+# A snapshot keeps references to the entity objects that were alive and, for
+# each one, the values of its plain attributes (numbers, flags, state names)
+# as one tuple plus copies of its Vector2s and Rects. Restoring writes those
+# values back into the same objects and puts them back in the sprite groups,
+# so nothing is rebuilt: enemies that died since are revived, enemies spawned
+# since are removed, and the background is only replaced when the snapshot
+# belongs to another stage.
+#
+# Attributes holding other objects (images, player_ref, groups, pools) are
+# not part of the state; images are picked again from is_flashing.
+
+_PLAIN_TYPES = (int, float, bool, str, tuple, type(None))
+_COPIED_TYPES = (pygame.math.Vector2, pygame.Rect)
+_SKIPPED_FIELDS = ("crowd", "crowd_slot") # Membership is rebuilt by CrowdSystem.add_many()
+
+STAGE_FIELDS = ("current_stage_number", "current_stage_data", "boss", "is_boss_defeated", "dialogue_to_trigger",
+                "spawn_queue", "next_spawn_index", "spawned_count", "retired_count", "next_checkpoint_index")
+CAMERA_FIELDS = ("shake_intensity", "shake_timer", "shake_duration")
+BULLET_FIELDS = ("x", "y", "prev_x", "prev_y", "vx", "vy", "width", "height", "damage", "style")
+
+_schemas = {} # (class, attribute names) -> _Schema, shared by every snapshot
+
+
+class _Schema:
+    # Which attributes of one class (with one set of attribute names) are state,
+    # and how to copy them. Built from the first entity seen with that layout.
+    def __init__(self, entity):
+        self.values = [] # Plain values, stored as they are
+        self.copies = [] # Vector2/Rect, stored as copies and written back in place
+        for name, value in vars(entity).items():
+            if name in _SKIPPED_FIELDS or name.startswith("_"):
+                continue
+            if type(value) in _PLAIN_TYPES:
+                self.values.append(name)
+            elif type(value) in _COPIED_TYPES:
+                self.copies.append(name)
+        # Reads every plain value from the instance dict in one call
+        self.get_values = operator.itemgetter(*self.values) if len(self.values) > 1 else self._get_value
+        self.has_images = hasattr(entity, "flash_image")
+
+    def _get_value(self, fields):
+        return tuple(fields[name] for name in self.values)
+
+
+class WorldSnapshot:
+    def __init__(self, level_number, frame_count, player, camera, stage, enemies, awake, projectiles, bullets):
+        self.level_number = level_number
+        self.frame_count = frame_count
+        self.player = player # Entity state, see capture_entity()
+        self.camera = camera # (offset, previous offset, shake fields, rng state)
+        self.stage = stage # StageManager values, in STAGE_FIELDS order
+        self.enemies = enemies # Entity states, in StageManager.active_enemies order
+        self.awake = awake # Enemies the ActivationManager was updating
+        self.projectiles = projectiles # Entity states of live Projectile sprites
+        self.bullets = bullets # (slots, arrays in BULLET_FIELDS order) or None
+        self.capture_seconds = 0.0
+
+    @property
+    def player_position(self):
+        entity, schema, values, copies = self.player
+        return tuple(copies[schema.copies.index("pos")])
+
+    def get_entity_count(self):
+        return len(self.enemies) + len(self.projectiles)
+
+
+def capture_entity(entity):
+    # (entity, schema, values, copies): the entity's state, see the module comment
+    fields = vars(entity)
+    key = (type(entity), tuple(fields))
+    schema = _schemas.get(key)
+    if schema is None:
+        schema = _schemas[key] = _Schema(entity)
+    return entity, schema, schema.get_values(fields), tuple(fields[name].copy() for name in schema.copies)
+
+
+def restore_entity(state):
+    entity, schema, values, copies = state
+    fields = vars(entity)
+    fields.update(zip(schema.values, values))
+    for name, value in zip(schema.copies, copies):
+        fields[name].update(value) # In place, since others may hold the same Vector2/Rect
+    if schema.has_images:
+        entity.image = entity.flash_image if entity.is_flashing else entity.original_image
+    return entity
+
+
+def capture_snapshot(world):
+    start = time.perf_counter()
+    if world.crowd is not None:
+        world.crowd.sync_all(world.enemies) # The crowd's arrays are ahead of the sprites
+    stage_manager = world.stage_manager
+    camera = world.camera
+    awake = world.activation.awake
+    enemies = tuple(capture_entity(enemy) for enemy in stage_manager.active_enemies)
+    bullets = None
+    if world.bullets is not None:
+        slots = world.bullets.alive.nonzero()[0]
+        bullets = (slots, tuple(getattr(world.bullets, name)[slots] for name in BULLET_FIELDS))
+    snapshot = WorldSnapshot(
+        stage_manager.current_stage_number, world.frame_count, capture_entity(world.player),
+        ((camera.offset.x, camera.offset.y), (camera.previous_offset.x, camera.previous_offset.y),
+         tuple(getattr(camera, name) for name in CAMERA_FIELDS), camera.rng.getstate()),
+        tuple(getattr(stage_manager, name) for name in STAGE_FIELDS),
+        enemies, frozenset(state[0] for state in enemies if state[0] in awake),
+        tuple(capture_entity(projectile) for projectile in world.projectiles), bullets)
+    snapshot.capture_seconds = time.perf_counter() - start
+    return snapshot
+
+
+def restore_snapshot(world, snapshot, include_player=True):
+    # Puts the world back in the captured state. With include_player=False the
+    # player and camera are left alone and the ActivationManager is not
+    # touched (Retry positions the player itself).
+    stage_manager = world.stage_manager
+    crowd = world.crowd
+
+    # Remove what is alive now. The crowd is emptied first so killing its
+    # members doesn't sync state that is about to be overwritten.
+    if crowd is not None:
+        crowd.clear()
+    for enemy in stage_manager.active_enemies.sprites():
+        enemy.kill()
+    if stage_manager.boss is not None:
+        stage_manager.boss.kill()
+    for projectile in world.projectiles.sprites():
+        projectile.kill() # Pooled ones go back to their pool
+    if world.bullets is not None:
+        world.bullets.clear()
+
+    for name, value in zip(STAGE_FIELDS, snapshot.stage):
+        setattr(stage_manager, name, value)
+    stage_manager.set_background(snapshot.level_number)
+
+    # Revive the captured entities; state first so the spatial index sees their positions
+    enemies = [restore_entity(state) for state in snapshot.enemies]
+    for enemy in enemies:
+        if enemy.pool is not None:
+            enemy.pool.reclaim(enemy) # Killed since the capture and waiting to be reused
+    stage_manager.active_enemies.add(enemies)
+    world.all_sprites.add(enemies)
+    world.enemies.add(enemies)
+    if crowd is not None:
+        crowd.add_many(enemies)
+    for state in snapshot.projectiles:
+        projectile = restore_entity(state)
+        pool = getattr(projectile, "pool", None)
+        if pool is not None:
+            pool.reclaim(projectile)
+        else:
+            world.all_sprites.add(projectile)
+            world.projectiles.add(projectile)
+    if snapshot.bullets is not None and world.bullets is not None:
+        slots, arrays = snapshot.bullets
+        for name, values in zip(BULLET_FIELDS, arrays):
+            getattr(world.bullets, name)[slots] = values
+        world.bullets.alive[slots] = True
+
+    if include_player:
+        restore_entity(snapshot.player)
+        camera = world.camera
+        offset, previous_offset, shake, rng_state = snapshot.camera
+        camera.offset.update(offset)
+        camera.previous_offset.update(previous_offset)
+        for name, value in zip(CAMERA_FIELDS, shake):
+            setattr(camera, name, value)
+        camera.rng.setstate(rng_state)
+        world.activation.reset()
+        for state in snapshot.enemies:
+            if state[0] in snapshot.awake:
+                world.activation.awake.add(state[0])
+        world.frame_count = snapshot.frame_count
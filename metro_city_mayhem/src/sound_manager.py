@@ -0,0 +1,131 @@
+import pygame
+from src.settings import (MIXER_FREQUENCY, MIXER_SAMPLE_SIZE, MIXER_OUTPUT_CHANNELS, MIXER_BUFFER_SIZE,
+                          SOUND_CHANNEL_POOLS)
+
+
+def configure_mixer(frequency=MIXER_FREQUENCY, size=MIXER_SAMPLE_SIZE, channels=MIXER_OUTPUT_CHANNELS, buffer=MIXER_BUFFER_SIZE):
+    # Must run before pygame.init()/pygame.mixer.init() to take effect. A smaller
+    # buffer means less delay between a punch and its sound, at the risk of
+    # crackling on slow machines.
+    pygame.mixer.pre_init(frequency, size, channels, buffer)
+
+
+class SoundHandle:
+    # Stands in for a pygame.mixer.Sound in the sound_effects dict. play() only
+    # queues a request; SoundManager.flush() decides what is actually heard.
+    def __init__(self, manager, name):
+        self.manager = manager
+        self.name = name
+
+    def play(self):
+        self.manager.request(self.name)
+
+
+class SoundManager:
+    # Plays sound effects on channels reserved per category (SOUND_CHANNEL_POOLS),
+    # so a burst of combat sounds can't take the channels player sounds need.
+    #
+    # Requests made during a frame are collected and played by flush() once per
+    # frame: the same sound requested several times in one frame is played
+    # once (coalesced). A sound already playing on max_voices channels is
+    # dropped. When a category's channels are all busy, the lowest-priority,
+    # oldest voice is cut off for a sound of equal or higher priority;
+    # otherwise the new sound is dropped.
+    def __init__(self, channel_pools=SOUND_CHANNEL_POOLS):
+        self.enabled = pygame.mixer.get_init() is not None
+        self.sounds = {} # name -> (Sound, category, priority, max_voices)
+        self.pools = {} # category -> list of channel indices
+        self.voices = {} # channel index -> (name, priority, frame started)
+        self.pending = {} # name -> times requested this frame, in request order
+        self.frame = 0
+
+        # Counters
+        self.requested = 0
+        self.played = 0
+        self.coalesced = 0
+        self.dropped_voice_limit = 0
+        self.dropped_no_channel = 0
+        self.stolen = 0
+
+        if self.enabled:
+            channel_count = sum(channel_pools.values())
+            if pygame.mixer.get_num_channels() < channel_count:
+                pygame.mixer.set_num_channels(channel_count)
+            pygame.mixer.set_reserved(channel_count) # Keep Sound.play()'s automatic channel picking off them
+            first = 0
+            for category, count in channel_pools.items():
+                self.pools[category] = list(range(first, first + count))
+                first += count
+
+    def load(self, name, path, category, priority=1, max_voices=1):
+        # Returns a SoundHandle, or None if the file couldn't be loaded (same as a missing sound_effects entry)
+        if not self.enabled:
+            return None
+        if category not in self.pools:
+            raise ValueError(f"Unknown sound category '{category}'")
+        try:
+            sound = pygame.mixer.Sound(path)
+        except pygame.error as e:
+            print(f"Warning: Could not load sound '{name}' from {path}. Error: {e}")
+            return None
+        self.sounds[name] = (sound, category, priority, max_voices)
+        return SoundHandle(self, name)
+
+    def request(self, name):
+        self.requested += 1
+        self.pending[name] = self.pending.get(name, 0) + 1
+
+    def flush(self):
+        # Call once per frame, after the simulation
+        self.frame += 1
+        if not self.pending:
+            return
+        # Highest priority first, so low-priority sounds can't take the last free channel
+        requests = sorted(self.pending.items(), key=lambda item: self.sounds[item[0]][2], reverse=True)
+        self.pending = {}
+        for name, count in requests:
+            self.coalesced += count - 1
+            self._play(name)
+
+    def _play(self, name):
+        sound, category, priority, max_voices = self.sounds[name]
+        pool = self.pools[category]
+        busy = [index for index in pool if pygame.mixer.Channel(index).get_busy()]
+        for index in list(self.voices):
+            if index in pool and index not in busy:
+                del self.voices[index] # Finished since the last check
+
+        if sum(1 for index in busy if self.voices.get(index, (None,))[0] == name) >= max_voices:
+            self.dropped_voice_limit += 1
+            return
+        free = [index for index in pool if index not in busy]
+        if free:
+            index = free[0]
+        else:
+            # Steal the least important, oldest voice
+            index = min(busy, key=lambda i: self.voices.get(i, (None, 0, 0))[1:])
+            if self.voices.get(index, (None, 0, 0))[1] > priority:
+                self.dropped_no_channel += 1
+                return
+            self.stolen += 1
+        pygame.mixer.Channel(index).play(sound)
+        self.voices[index] = (name, priority, self.frame)
+        self.played += 1
+
+    def stop_all(self):
+        for pool in self.pools.values():
+            for index in pool:
+                pygame.mixer.Channel(index).stop()
+        self.voices.clear()
+        self.pending = {}
+
+    def get_stats(self):
+        return {
+            "requested": self.requested,
+            "played": self.played,
+            "coalesced": self.coalesced,
+            "dropped_voice_limit": self.dropped_voice_limit,
+            "dropped_no_channel": self.dropped_no_channel,
+            "stolen": self.stolen,
+            "voices": len(self.voices),
+        }
@@ -0,0 +1,112 @@
+import pygame
+from src.settings import SPATIAL_CELL_SIZE
+
+class SpatialHash:
+    # Uniform grid broadphase. Each sprite is bucketed into every cell its rect
+    # overlaps, so a query only looks at sprites in the cells the query rect touches.
+    # Cells are dicts (insertion ordered) rather than sets so query results come
+    # back in the same order on every run, which keeps combat deterministic.
+    def __init__(self, cell_size=SPATIAL_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}         # (cell_x, cell_y) -> {sprite: None}
+        self.sprite_ranges = {} # sprite -> (x0, y0, x1, y1) cell range it is bucketed in
+
+    def _cell_range(self, rect):
+        size = self.cell_size
+        return (rect.left // size, rect.top // size, (rect.right - 1) // size, (rect.bottom - 1) // size)
+
+    def insert(self, sprite):
+        cell_range = self._cell_range(sprite.rect)
+        self.sprite_ranges[sprite] = cell_range
+        x0, y0, x1, y1 = cell_range
+        cells = self.cells
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket is None:
+                    bucket = cells[(cx, cy)] = {}
+                bucket[sprite] = None
+
+    def remove(self, sprite):
+        cell_range = self.sprite_ranges.pop(sprite, None)
+        if cell_range is None:
+            return
+        x0, y0, x1, y1 = cell_range
+        cells = self.cells
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket is not None:
+                    bucket.pop(sprite, None)
+                    if not bucket:
+                        del cells[(cx, cy)]
+
+    def update(self, sprite):
+        # Cheap when the sprite stayed inside the same cells, which is the common case
+        if self.sprite_ranges.get(sprite) == self._cell_range(sprite.rect):
+            return
+        self.remove(sprite)
+        self.insert(sprite)
+
+    def query(self, rect):
+        # Sprites whose rect collides with the given rect
+        found = {}
+        x0, y0, x1, y1 = self._cell_range(rect)
+        cells = self.cells
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket:
+                    for sprite in bucket:
+                        if sprite not in found and sprite.rect.colliderect(rect):
+                            found[sprite] = None
+        return list(found)
+
+    def clear(self):
+        self.cells.clear()
+        self.sprite_ranges.clear()
+
+
+class SpatialGroup(pygame.sprite.Group):
+    # A sprite Group that keeps a SpatialHash in sync with its membership.
+    # Adding/killing sprites updates the index; update() re-buckets each sprite
+    # right after it moves.
+    def __init__(self, *sprites, cell_size=SPATIAL_CELL_SIZE):
+        self.index = SpatialHash(cell_size)
+        super().__init__(*sprites)
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        self.index.insert(sprite)
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.index.remove(sprite)
+
+    def update(self, *args, **kwargs):
+        self.update_sprites(self.sprites(), *args, **kwargs)
+
+    def update_sprites(self, sprites, *args, **kwargs):
+        # Update a subset of the group (e.g. only awake enemies) and re-bucket each one
+        index = self.index
+        ranges = index.sprite_ranges
+        size = index.cell_size
+        for sprite in sprites:
+            sprite.update(*args, **kwargs)
+            # Inlined fast path of SpatialHash.update: most sprites stay in their cells
+            cell_range = ranges.get(sprite)
+            if cell_range is None: # Killed itself during update, or not in this group
+                continue
+            rect = sprite.rect
+            if (cell_range[0] != rect.left // size or cell_range[2] != (rect.right - 1) // size
+                    or cell_range[1] != rect.top // size or cell_range[3] != (rect.bottom - 1) // size):
+                index.remove(sprite)
+                index.insert(sprite)
+
+    def refresh(self, sprite):
+        # Re-bucket a sprite that was moved outside of update()
+        if sprite in self.spritedict:
+            self.index.update(sprite)
+
+    def query(self, rect):
+        return self.index.query(rect)
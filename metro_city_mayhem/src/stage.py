@@ -1,15 +1,32 @@
+import logging
 import pygame
+from src.settings import SPAWN_AHEAD_MARGIN, RETIRE_BEHIND_MARGIN
+from src.background import ChunkedBackground
+from src.stage_data import get_stage_table
+
+logger = logging.getLogger(__name__)
 # Enemy classes are not directly imported. StageManager receives class references
-# through the stage_configurations data.
+# through the compiled stage table (src/stage_data.py).
+
+def apply_stat_overrides(entity, overrides):
+    # Replace attributes the entity already has, e.g. {"health": 180, "punch_cooldown_max": 0.6}
+    for name, value in overrides.items():
+        if not hasattr(entity, name):
+            raise ValueError(f"{entity.__class__.__name__} has no attribute {name!r}")
+        setattr(entity, name, value)
+    if "health" in overrides and "max_health" not in overrides and hasattr(entity, "max_health"):
+        entity.max_health = entity.health
+
 
 class StageManager:
     def __init__(self, stage_configurations, screen_height):
-        self.stage_configurations = stage_configurations
+        self.stage_table = get_stage_table(stage_configurations, screen_height) # Compiles plain config lists
         self.screen_height = screen_height
 
         self.current_stage_number = 0
         self.current_stage_data = None
-        self.background_surface = None
+        self.background = None # ChunkedBackground for the current stage
+        self.background_level_number = None
 
         self.active_enemies = pygame.sprite.Group() # Enemies managed by StageManager for current stage
         # self.all_stage_sprites = pygame.sprite.Group() # For other potential stage elements
@@ -17,19 +34,35 @@ class StageManager:
         self.is_boss_defeated = False
         self.player_ref = None # To pass to enemies
         self.projectiles_group_ref = None # For Viper
+        self.projectile_pool = None
+        self.bullet_system = None
+        self.crowd = None # Optional CrowdSystem for regular enemies
+        self.entity_pool = None # Optional EntityPool; enemies are recycled instead of constructed
+        self.dialogue_to_trigger = None # Boss dialogue for main.py/World to pick up
+        self.stat_overrides = {} # Class name -> {attribute: value} applied to every spawn (balance sweeps)
+
+        # Enemy streaming: the stage table's placements are already sorted by x
+        # and are only materialized as the camera approaches them
+        self.spawn_queue = ()
+        self.next_spawn_index = 0
+        self.all_sprites_main_group = None
+        self.enemies_main_group = None
+        self.spawned_count = 0
+        self.retired_count = 0
+        self.next_checkpoint_index = 0 # Into current_stage_data["checkpoints"]
 
     def load_stage(self, level_number, player, all_sprites_main_group, enemies_main_group, **kwargs): # Added kwargs
         self.player_ref = player
         self.projectiles_group_ref = kwargs.get('projectiles_group_ref') # Get from kwargs
+        self.projectile_pool = kwargs.get('projectile_pool') # Optional ProjectilePool, preallocated per stage
+        self.bullet_system = kwargs.get('bullet_system') # Optional BulletSystem, used instead of the pool
+        self.crowd = kwargs.get('crowd') # Optional CrowdSystem; streamed regular enemies join it
+        self.entity_pool = kwargs.get('entity_pool') # Optional EntityPool, sized from the stage's placements
+        stage_assets = kwargs.get('stage_assets') # Optional StageAssets prepared by a StageAssetLoader
 
-        stage_data_found = None
-        for config in self.stage_configurations:
-            if config["level_number"] == level_number:
-                stage_data_found = config
-                break
-
+        stage_data_found = self.stage_table.get(level_number)
         if not stage_data_found:
-            print(f"Error: Stage with level number {level_number} not found.")
+            logger.error("Stage with level number %s not found.", level_number)
             # Potentially raise an error or handle gracefully
             return False
 
@@ -45,38 +78,47 @@ class StageManager:
                 self.boss.kill()
 
         self.active_enemies.empty()
+        if self.projectile_pool is not None:
+            self.projectile_pool.release_all() # Shots from the previous attempt/stage
+            self.projectile_pool.preallocate(self.current_stage_data.get("projectile_pool_capacity", 0))
+        if self.bullet_system is not None:
+            self.bullet_system.clear()
+        if self.entity_pool is not None:
+            counts = self.current_stage_data["enemy_placements"].get_class_counts()
+            if self.current_stage_data.get("boss_data"):
+                BossClass = self.current_stage_data["boss_data"][0]
+                counts[BossClass] = counts.get(BossClass, 0) + 1
+            self.entity_pool.reserve(counts, player)
         # self.all_stage_sprites.empty()
         self.boss = None
 
-        # Create background surface
-        stage_length = self.current_stage_data["length"]
-        # Using fallback color, actual image loading would be here
-        bg_color = self.current_stage_data.get("background_color", pygame.Color("darkgrey"))
-        self.background_surface = pygame.Surface((stage_length, self.screen_height))
-        self.background_surface.fill(bg_color)
+        self.set_background(level_number, stage_assets)
 
-        # Spawn enemies for the new stage
-        for EnemyClass, x_pos, y_pos_config in self.current_stage_data["enemy_placements"]:
-            # Assuming y_pos_config is the desired midbottom y, same as player and initial enemies
-            enemy = EnemyClass(start_pos_x=x_pos, start_pos_y=y_pos_config, player_ref=player)
-            self.active_enemies.add(enemy)
-            all_sprites_main_group.add(enemy)
-            enemies_main_group.add(enemy)
+        # Regular enemies are streamed in by stream_enemies() as the camera advances
+        self.all_sprites_main_group = all_sprites_main_group
+        self.enemies_main_group = enemies_main_group
+        self.spawn_queue = self.current_stage_data["enemy_placements"] # PlacementTable, sorted by x
+        self.next_spawn_index = 0
+        self.spawned_count = 0
+        self.retired_count = 0
+        self.next_checkpoint_index = 0
 
         # Spawn boss for the new stage
         boss_config = self.current_stage_data.get("boss_data")
         if boss_config:
             BossClass, x_pos, y_pos_config = boss_config
             if BossClass.__name__ == "Viper":
-                if not self.projectiles_group_ref:
+                if self.projectiles_group_ref is None: # An empty group is falsy, but fine
                     # This is an issue, Viper needs this group.
                     # For now, we'll let it be None, but ideally, this should be guaranteed or handled.
-                    print("Warning: Projectiles group not provided to StageManager for Viper boss.")
-                self.boss = BossClass(start_pos_x=x_pos, start_pos_y=y_pos_config, player_ref=player,
-                                      all_sprites_group=all_sprites_main_group,
-                                      projectiles_group=self.projectiles_group_ref)
+                    logger.warning("Projectiles group not provided to StageManager for Viper boss.")
+                self.boss = self.create_enemy(BossClass, x_pos, y_pos_config,
+                                              all_sprites_group=all_sprites_main_group,
+                                              projectiles_group=self.projectiles_group_ref,
+                                              projectile_pool=self.projectile_pool,
+                                              bullet_system=self.bullet_system)
             else:
-                self.boss = BossClass(start_pos_x=x_pos, start_pos_y=y_pos_config, player_ref=player)
+                self.boss = self.create_enemy(BossClass, x_pos, y_pos_config)
 
             if self.boss: # Add to groups if boss was successfully created
                 # self.active_enemies.add(self.boss) # No, active_enemies is for non-bosses for now. Boss is self.boss
@@ -85,8 +127,9 @@ class StageManager:
                 all_sprites_main_group.add(self.boss)
                 enemies_main_group.add(self.boss) # Bosses are also in the 'enemies' group for player attacks
 
-        print(f"Stage {self.current_stage_number}: '{self.current_stage_data['name']}' loaded.")
-        print(f" - Length: {self.current_stage_data['length']}px, Enemies: {len(self.current_stage_data['enemy_placements'])}, Boss: {self.boss.__class__.__name__ if self.boss else 'None'}")
+        logger.info("Stage %s: '%s' loaded.", self.current_stage_number, self.current_stage_data['name'])
+        logger.info(" - Length: %spx, Enemies: %s, Boss: %s", self.current_stage_data['length'], len(self.current_stage_data['enemy_placements']),
+                    self.boss.__class__.__name__ if self.boss else 'None')
 
         self.dialogue_to_trigger = None # New attribute for StageManager
         if self.boss and self.current_stage_data.get("boss_dialogue"):
@@ -95,6 +138,65 @@ class StageManager:
 
         return True
 
+    def create_enemy(self, EnemyClass, x_pos, y_pos, **kwargs):
+        # A recycled instance when there is an EntityPool, otherwise a new one
+        if self.entity_pool is not None:
+            enemy = self.entity_pool.acquire(EnemyClass, x_pos, y_pos, self.player_ref, **kwargs)
+        else:
+            enemy = EnemyClass(start_pos_x=x_pos, start_pos_y=y_pos, player_ref=self.player_ref, **kwargs)
+        overrides = self.stat_overrides.get(EnemyClass.__name__)
+        if overrides:
+            apply_stat_overrides(enemy, overrides) # After reset(), which a recycled instance goes through again
+        return enemy
+
+    def set_background(self, level_number, stage_assets=None):
+        # Create the tiled background (tiles are built lazily as they scroll into view).
+        # A retry of the same stage keeps the existing one and its cached tiles.
+        if stage_assets is not None and stage_assets.level_number == level_number:
+            self.background = stage_assets.background # Prefetched, first tiles already built
+            self.background_level_number = level_number
+        elif self.background is None or self.background_level_number != level_number:
+            stage_data = self.stage_table.get(level_number)
+            # Using fallback color, actual image loading would be here
+            bg_color = stage_data.get("background_color", pygame.Color("darkgrey"))
+            self.background = ChunkedBackground(stage_data["length"], self.screen_height, bg_color,
+                                                image_path=stage_data.get("background_image_path"))
+            self.background_level_number = level_number
+
+    def stream_enemies(self, camera, awake_enemies=None):
+        # Spawn placements the camera's leading edge is approaching
+        spawn_edge = camera.offset.x + camera.screen_width + SPAWN_AHEAD_MARGIN
+        queue = self.spawn_queue
+        queue_x = queue.x
+        while self.next_spawn_index < len(queue_x) and queue_x[self.next_spawn_index] <= spawn_edge:
+            EnemyClass, x_pos, y_pos_config = queue[self.next_spawn_index]
+            self.next_spawn_index += 1
+            # Assuming y_pos_config is the desired midbottom y, same as player and initial enemies
+            enemy = self.create_enemy(EnemyClass, x_pos, y_pos_config)
+            if self.crowd is not None:
+                self.crowd.add(enemy) # No-op for enemies with their own update()
+            self.active_enemies.add(enemy)
+            self.all_sprites_main_group.add(enemy)
+            self.enemies_main_group.add(enemy)
+            self.spawned_count += 1
+
+        # Retire dormant enemies the player has left far behind (never the boss)
+        if awake_enemies is not None:
+            retire_edge = camera.offset.x - RETIRE_BEHIND_MARGIN
+            for enemy in self.active_enemies.sprites():
+                if enemy.rect.right < retire_edge and enemy is not self.boss and enemy not in awake_enemies:
+                    enemy.kill()
+                    self.retired_count += 1
+
+    def get_streaming_stats(self):
+        return {
+            "placements": len(self.spawn_queue),
+            "pending": len(self.spawn_queue) - self.next_spawn_index,
+            "spawned": self.spawned_count,
+            "retired": self.retired_count,
+            "live": len(self.active_enemies),
+        }
+
     def update(self): # player parameter removed, uses self.player_ref established in load_stage
         if not self.current_stage_data:
             return
@@ -102,16 +204,25 @@ class StageManager:
         if self.boss and not self.is_boss_defeated:
             if self.boss.health <= 0: # Check if boss health has dropped to zero
                 self.is_boss_defeated = True
-                print(f"Boss {self.boss.__class__.__name__} defeated in Stage {self.current_stage_number}!")
+                logger.info("Boss %s defeated in Stage %s!", self.boss.__class__.__name__, self.current_stage_number)
                 # The boss sprite is killed by the main combat loop in main.py when health <= 0.
                 # StageManager just updates its flag based on boss's health.
 
-    def check_stage_clear_condition(self, player_current_pos_x):
+    def check_checkpoint(self, player_current_pos_x):
+        # True once for each checkpoint the player walks past
+        checkpoints = self.current_stage_data["checkpoints"] if self.current_stage_data else ()
+        if self.next_checkpoint_index < len(checkpoints) and player_current_pos_x >= checkpoints[self.next_checkpoint_index]:
+            self.next_checkpoint_index += 1
+            return True
+        return False
+
+    def check_stage_clear_condition(self, player_current_pos_x, player_half_width=0):
         if not self.current_stage_data:
             return False
 
-        # Player must reach the end of the stage
-        reached_end = player_current_pos_x >= self.current_stage_data["length"]
+        # Player must reach the end of the stage. Player.update clamps the center
+        # half a width short of the stage length, so that is where the end is.
+        reached_end = player_current_pos_x >= self.current_stage_data["length"] - player_half_width
 
         # If there's a boss, it must be defeated
         boss_condition_met = True
@@ -119,6 +230,6 @@ class StageManager:
             boss_condition_met = self.is_boss_defeated
 
         if reached_end and boss_condition_met:
-            print(f"Stage {self.current_stage_number} clear conditions met!")
+            logger.info("Stage %s clear conditions met!", self.current_stage_number)
             return True
         return False
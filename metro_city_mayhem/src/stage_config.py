@@ -0,0 +1,12 @@
+import os
+from src.stage_data import load_stage_file
+
+# Stage definitions live in data/stages.json (see src/stage_data.py for the
+# format). They're compiled into a StageTable once; later runs load the
+# compiled table from the cache file as long as the JSON is unchanged.
+# Paths are relative to the package, so this works from any directory.
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+STAGE_DATA_PATH = os.path.join(DATA_DIRECTORY, "stages.json")
+STAGE_CACHE_PATH = os.path.join(DATA_DIRECTORY, "stages.cache")
+
+STAGE_CONFIGURATIONS = load_stage_file(STAGE_DATA_PATH, STAGE_CACHE_PATH)
@@ -0,0 +1,328 @@
+import hashlib
+import json
+import os
+import struct
+import sys
+import time
+from array import array
+from types import MappingProxyType
+import pygame
+from src.settings import SCREEN_HEIGHT
+from src.enemy import Enemy, Thug, Bruiser
+from src.boss import Spike, Crusher, Viper
+
+# Stage definitions are data (data/stages.json). Enemy and boss classes are
+# referred to by name through ENTITY_CLASSES. A stage file is validated and
+# compiled once into a StageTable: an immutable, level-number-indexed table
+# whose placements are sorted by x and stored as parallel arrays. The compiled
+# form is cached next to the source in a binary file keyed by a hash of the
+# source, so later runs skip parsing and validation entirely.
+#
+# Stage file layout:
+#   {"stages": [{"level_number": 1, "name": "...", "length": 3000,
+#                "background_color": "dimgray", "background_image_path": "...",
+#                "enemy_placements": [["Thug", 800], ["Bruiser", 900, 580], ...],
+#                "boss": ["Spike", 2900],
+#                "boss_dialogue": {"name": "Spike", "lines": ["...", "..."]},
+#                "checkpoints": [1400, 2500]}, ...]}
+# A placement's y is the midbottom y and defaults to the floor ("floor" or
+# omitted = the screen height). "boss", "boss_dialogue" and "checkpoints" are
+# optional. A checkpoint is an x position; crossing it saves a snapshot that
+# Retry restarts from (see src/snapshot.py).
+
+ENTITY_CLASSES = {} # name -> Enemy subclass usable in stage files
+
+
+def register_entity_class(entity_class, name=None):
+    ENTITY_CLASSES[name or entity_class.__name__] = entity_class
+    return entity_class
+
+
+for _entity_class in (Thug, Bruiser, Spike, Crusher, Viper):
+    register_entity_class(_entity_class)
+
+
+class StageDataError(ValueError):
+    pass
+
+
+class PlacementTable:
+    # Enemy placements of one stage sorted by x, as parallel arrays. Indexing
+    # and iteration give (EnemyClass, x, y) tuples like the old placement lists.
+    def __init__(self, classes, class_ids, xs, ys):
+        self.classes = tuple(classes) # class_ids index into this
+        self.class_ids = class_ids # array('H')
+        self.x = xs # array('i'), ascending
+        self.y = ys # array('i')
+
+    @classmethod
+    def from_placements(cls, placements):
+        # placements: (EnemyClass, x, y) tuples in any order; ties keep their order
+        ordered = sorted(placements, key=lambda placement: placement[1])
+        classes = []
+        class_ids = array('H')
+        for EnemyClass, x_pos, y_pos in ordered:
+            if EnemyClass not in classes:
+                classes.append(EnemyClass)
+            class_ids.append(classes.index(EnemyClass))
+        return cls(classes, class_ids, array('i', [placement[1] for placement in ordered]),
+                   array('i', [placement[2] for placement in ordered]))
+
+    def __len__(self):
+        return len(self.x)
+
+    def get_class_counts(self):
+        # {EnemyClass: placements of that class}
+        counts = [0] * len(self.classes)
+        for class_id in self.class_ids:
+            counts[class_id] += 1
+        return dict(zip(self.classes, counts))
+
+    def __getitem__(self, index):
+        return self.classes[self.class_ids[index]], self.x[index], self.y[index]
+
+    def __iter__(self):
+        classes = self.classes
+        for class_id, x_pos, y_pos in zip(self.class_ids, self.x, self.y):
+            yield classes[class_id], x_pos, y_pos
+
+
+class StageTable:
+    # Compiled stages indexed by level number. Iterating yields the stages in
+    # file order; each stage is a read-only mapping with the same keys as the
+    # old stage configuration dicts.
+    def __init__(self, stages, source="compiled", load_seconds=0.0):
+        self.stages = tuple(stages)
+        self.by_level = MappingProxyType({stage["level_number"]: stage for stage in self.stages})
+        self.level_numbers = tuple(stage["level_number"] for stage in self.stages)
+        self.source = source # "compiled" or "cache"
+        self.load_seconds = load_seconds
+
+    def get(self, level_number, default=None):
+        return self.by_level.get(level_number, default)
+
+    def __contains__(self, level_number):
+        return level_number in self.by_level
+
+    def __iter__(self):
+        return iter(self.stages)
+
+    def __len__(self):
+        return len(self.stages)
+
+
+def get_stage_table(stage_configurations, screen_height=SCREEN_HEIGHT):
+    # Accepts a StageTable or a list of stage dicts (class references or registered names)
+    if isinstance(stage_configurations, StageTable):
+        return stage_configurations
+    return compile_stages(stage_configurations, screen_height)
+
+
+def _resolve_class(reference, where):
+    entity_class = ENTITY_CLASSES.get(reference) if isinstance(reference, str) else reference
+    if not isinstance(entity_class, type) or not issubclass(entity_class, Enemy):
+        raise StageDataError(f"{where}: unknown enemy class {reference!r}")
+    return entity_class
+
+
+def _resolve_position(entry, length, screen_height, where):
+    if not isinstance(entry, (list, tuple)) or len(entry) not in (2, 3):
+        raise StageDataError(f"{where}: expected [class, x] or [class, x, y], got {entry!r}")
+    x_pos = entry[1]
+    y_pos = entry[2] if len(entry) == 3 else "floor"
+    if y_pos == "floor" or y_pos is None:
+        y_pos = screen_height
+    for value in (x_pos, y_pos):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise StageDataError(f"{where}: position must be numbers, got {entry!r}")
+    if not 0 <= x_pos <= length:
+        raise StageDataError(f"{where}: x {x_pos} is outside the stage (0-{length})")
+    return int(round(x_pos)), int(round(y_pos))
+
+
+def _compile_stage(config, screen_height, where):
+    if not isinstance(config, dict):
+        raise StageDataError(f"{where}: expected an object, got {config!r}")
+    for key in ("level_number", "name", "length"):
+        if key not in config:
+            raise StageDataError(f"{where}: missing '{key}'")
+    level_number = config["level_number"]
+    length = config["length"]
+    where = f"{where} (level {level_number})"
+    if isinstance(level_number, bool) or not isinstance(level_number, int) or level_number < 1:
+        raise StageDataError(f"{where}: level_number must be a positive integer")
+    if isinstance(length, bool) or not isinstance(length, int) or length <= 0:
+        raise StageDataError(f"{where}: length must be a positive integer")
+    try:
+        color = config.get("background_color", "darkgrey")
+        background_color = pygame.Color(*color) if isinstance(color, list) else pygame.Color(color)
+    except (ValueError, TypeError):
+        raise StageDataError(f"{where}: invalid background_color {config.get('background_color')!r}")
+
+    placements = []
+    for index, entry in enumerate(config.get("enemy_placements", ())):
+        placement_where = f"{where}, placement {index}"
+        EnemyClass = _resolve_class(entry[0] if isinstance(entry, (list, tuple)) and entry else None, placement_where)
+        if EnemyClass.is_boss:
+            raise StageDataError(f"{placement_where}: {EnemyClass.__name__} is a boss; use 'boss'")
+        placements.append((EnemyClass,) + _resolve_position(entry, length, screen_height, placement_where))
+
+    boss_data = None
+    boss_entry = config.get("boss", config.get("boss_data"))
+    if boss_entry is not None:
+        BossClass = _resolve_class(boss_entry[0] if isinstance(boss_entry, (list, tuple)) and boss_entry else None, f"{where}, boss")
+        if not BossClass.is_boss:
+            raise StageDataError(f"{where}, boss: {BossClass.__name__} is not a boss")
+        boss_data = (BossClass,) + _resolve_position(boss_entry, length, screen_height, f"{where}, boss")
+
+    boss_dialogue = config.get("boss_dialogue")
+    if boss_dialogue is not None:
+        lines = boss_dialogue.get("lines") if isinstance(boss_dialogue, dict) else None
+        if not isinstance(lines, (list, tuple)) or not all(isinstance(line, str) for line in lines):
+            raise StageDataError(f"{where}: boss_dialogue needs a list of strings under \"lines\" (\"name\" is optional)")
+        boss_dialogue = MappingProxyType({"name": str(boss_dialogue.get("name", "")), "lines": tuple(lines)})
+
+    checkpoints = config.get("checkpoints", ())
+    if not isinstance(checkpoints, (list, tuple)):
+        raise StageDataError(f"{where}: checkpoints must be a list of x positions")
+    for x_pos in checkpoints:
+        if isinstance(x_pos, bool) or not isinstance(x_pos, (int, float)) or not 0 < x_pos < length:
+            raise StageDataError(f"{where}: checkpoint {x_pos!r} is not an x position inside the stage (0-{length})")
+    checkpoints = tuple(sorted(int(round(x_pos)) for x_pos in checkpoints))
+
+    return _make_stage(level_number, str(config["name"]), length, config.get("background_image_path"),
+                       background_color, PlacementTable.from_placements(placements), boss_data, boss_dialogue, checkpoints)
+
+
+def _make_stage(level_number, name, length, background_image_path, background_color, placements, boss_data, boss_dialogue, checkpoints=()):
+    return MappingProxyType({
+        "level_number": level_number,
+        "name": name,
+        "length": length,
+        "background_image_path": background_image_path,
+        "background_color": background_color,
+        "enemy_placements": placements,
+        "boss_data": boss_data,
+        "boss_dialogue": boss_dialogue,
+        "checkpoints": checkpoints, # Ascending x positions
+    })
+
+
+def compile_stages(stage_configurations, screen_height=SCREEN_HEIGHT, where="stages"):
+    stages = []
+    seen = set()
+    for index, config in enumerate(stage_configurations):
+        stage = _compile_stage(config, screen_height, f"{where}: stage {index}")
+        if stage["level_number"] in seen:
+            raise StageDataError(f"{where}: level_number {stage['level_number']} is defined twice")
+        seen.add(stage["level_number"])
+        stages.append(stage)
+    return StageTable(stages)
+
+
+# Binary cache: header, JSON with everything but the placements, then each
+# stage's placement arrays (class ids, x, y) as raw machine-order bytes.
+_CACHE_MAGIC = b"MCMS"
+_CACHE_VERSION = 2
+_CACHE_HEADER = struct.Struct("<4sH32sI")
+
+
+def _cache_key(source, screen_height):
+    # Anything that changes the compiled result or its byte layout invalidates the cache
+    digest = hashlib.sha256(source)
+    digest.update(f"|{_CACHE_VERSION}|{screen_height}|{sys.byteorder}|{array('i').itemsize}|".encode())
+    digest.update(",".join(sorted(ENTITY_CLASSES)).encode())
+    return digest.digest()
+
+
+def _write_cache(path, key, table):
+    stages = []
+    for stage in table:
+        placements = stage["enemy_placements"]
+        boss_data = stage["boss_data"]
+        dialogue = stage["boss_dialogue"]
+        stages.append({
+            "level_number": stage["level_number"], "name": stage["name"], "length": stage["length"],
+            "background_image_path": stage["background_image_path"],
+            "background_color": list(stage["background_color"]),
+            "classes": [EnemyClass.__name__ for EnemyClass in placements.classes], "count": len(placements),
+            "boss": [boss_data[0].__name__, boss_data[1], boss_data[2]] if boss_data else None,
+            "boss_dialogue": {"name": dialogue["name"], "lines": list(dialogue["lines"])} if dialogue else None,
+            "checkpoints": list(stage["checkpoints"]),
+        })
+    meta = json.dumps(stages, separators=(",", ":")).encode("utf-8")
+    chunks = [_CACHE_HEADER.pack(_CACHE_MAGIC, _CACHE_VERSION, key, len(meta)), meta]
+    for stage in table:
+        placements = stage["enemy_placements"]
+        chunks += (placements.class_ids.tobytes(), placements.x.tobytes(), placements.y.tobytes())
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as cache_file:
+        cache_file.write(b"".join(chunks))
+    os.replace(temporary_path, path) # Never leave a half-written cache behind
+
+
+def _read_cache(path, key):
+    # The cached StageTable, or None if the cache is missing, stale or unreadable
+    try:
+        with open(path, "rb") as cache_file:
+            data = cache_file.read()
+    except OSError:
+        return None
+    if len(data) < _CACHE_HEADER.size:
+        return None
+    magic, version, cached_key, meta_length = _CACHE_HEADER.unpack_from(data)
+    if magic != _CACHE_MAGIC or version != _CACHE_VERSION or cached_key != key:
+        return None
+    offset = _CACHE_HEADER.size
+    try:
+        stages_meta = json.loads(data[offset:offset + meta_length].decode("utf-8"))
+        offset += meta_length
+        stages = []
+        for meta in stages_meta:
+            count = meta["count"]
+            arrays = []
+            for typecode in ("H", "i", "i"):
+                values = array(typecode)
+                size = count * values.itemsize
+                values.frombytes(data[offset:offset + size])
+                offset += size
+                arrays.append(values)
+            classes = [ENTITY_CLASSES[name] for name in meta["classes"]]
+            boss = meta["boss"]
+            dialogue = meta["boss_dialogue"]
+            stages.append(_make_stage(
+                meta["level_number"], meta["name"], meta["length"], meta["background_image_path"],
+                pygame.Color(*meta["background_color"]), PlacementTable(classes, *arrays),
+                (ENTITY_CLASSES[boss[0]], boss[1], boss[2]) if boss else None,
+                MappingProxyType({"name": dialogue["name"], "lines": tuple(dialogue["lines"])}) if dialogue else None,
+                tuple(meta["checkpoints"])))
+    except (ValueError, KeyError, TypeError):
+        return None
+    if offset != len(data):
+        return None
+    return StageTable(stages, source="cache")
+
+
+def load_stage_file(path, cache_path=None, screen_height=SCREEN_HEIGHT):
+    # Loads a stage file into a StageTable, from cache_path when it matches the
+    # file's content. Raises StageDataError for invalid stage data.
+    start = time.perf_counter()
+    with open(path, "rb") as stage_file:
+        source = stage_file.read()
+    key = _cache_key(source, screen_height)
+    table = _read_cache(cache_path, key) if cache_path else None
+    if table is None:
+        try:
+            data = json.loads(source.decode("utf-8"))
+        except ValueError as e:
+            raise StageDataError(f"{path}: not valid JSON ({e})")
+        if not isinstance(data, dict) or not isinstance(data.get("stages"), list):
+            raise StageDataError(f"{path}: expected an object with a 'stages' list")
+        table = compile_stages(data["stages"], screen_height, where=os.path.basename(path))
+        if cache_path:
+            try:
+                _write_cache(cache_path, key, table)
+            except OSError as e:
+                print(f"Warning: Could not write stage cache {cache_path}. Error: {e}")
+    table.load_seconds = time.perf_counter() - start
+    return table
@@ -0,0 +1,92 @@
+import pygame
+from collections import OrderedDict
+from src.settings import TEXT_CACHE_SIZE
+
+class TextCache:
+    # LRU cache of rendered text surfaces keyed by (font, text, color, antialias).
+    # Font.render is one of the most expensive calls per frame, and nearly all UI
+    # strings are static or change only on kills/stage loads.
+    def __init__(self, max_entries=TEXT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def render(self, font, text, antialias, color):
+        # Same argument order as Font.render; the returned surface is shared, don't draw on it
+        key = (font, text, tuple(pygame.Color(color)), antialias)
+        surface = self.entries.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self.entries[key] = surface
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return surface
+
+    def clear(self):
+        self.entries.clear()
+
+    def get_stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class GlyphAtlas:
+    # Pre-rendered glyphs for counters like "$123" or "40 / 100". Changing values
+    # are composed by blitting one glyph per character instead of rendering a new
+    # surface every time the number changes.
+    DEFAULT_CHARACTERS = "0123456789$/-+:.,% "
+
+    def __init__(self, font, color, antialias=True, characters=DEFAULT_CHARACTERS):
+        self.font = font
+        self.color = pygame.Color(color)
+        self.antialias = antialias
+        self.glyphs = {}
+        for character in characters:
+            self.glyphs[character] = font.render(character, antialias, self.color)
+        self.height = max(glyph.get_height() for glyph in self.glyphs.values()) if self.glyphs else font.get_height()
+
+        # Stats
+        self.glyph_blits = 0
+        self.fallback_renders = 0 # Characters not in the atlas, rendered on the fly
+
+    def _get_glyph(self, character):
+        glyph = self.glyphs.get(character)
+        if glyph is None:
+            self.fallback_renders += 1
+            glyph = self.glyphs[character] = self.font.render(character, self.antialias, self.color)
+        return glyph
+
+    def size(self, text):
+        return sum(self._get_glyph(character).get_width() for character in text), self.height
+
+    def draw(self, surface, text, pos):
+        # Returns the rect that was drawn
+        x, y = pos
+        for character in text:
+            glyph = self._get_glyph(character)
+            surface.blit(glyph, (x, y))
+            x += glyph.get_width()
+        self.glyph_blits += len(text)
+        return pygame.Rect(pos[0], y, x - pos[0], self.height)
+
+    def get_stats(self):
+        return {
+            "glyphs": len(self.glyphs),
+            "glyph_blits": self.glyph_blits,
+            "fallback_renders": self.fallback_renders,
+        }
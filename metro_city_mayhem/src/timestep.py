@@ -0,0 +1,53 @@
+from src.settings import FIXED_DT, MAX_STEPS_PER_FRAME
+
+class FixedTimestep:
+    # Accumulates real frame time and hands out whole FIXED_DT logic ticks.
+    # The simulation only ever sees step_dt, so its results depend on the number
+    # of ticks and the inputs, never on the display frame rate.
+    def __init__(self, step_dt=FIXED_DT, max_steps_per_frame=MAX_STEPS_PER_FRAME):
+        self.step_dt = step_dt
+        self.max_steps_per_frame = max_steps_per_frame
+        self.accumulator = 0.0
+
+        # Stats
+        self.total_steps = 0
+        self.dropped_time = 0.0   # Seconds of real time discarded by the catch-up cap
+        self.dropped_frames = 0   # Frames that hit the cap
+        self.last_frame_steps = 0
+        self.last_dropped_time = 0.0 # Seconds dropped by the last advance()
+
+    def reset(self):
+        # Call when the simulation resumes after a pause (menus, dialogue, loads)
+        self.accumulator = 0.0
+
+    def advance(self, frame_dt):
+        # Returns how many logic ticks to run for this rendered frame
+        self.accumulator += frame_dt
+        steps = int(self.accumulator / self.step_dt)
+        self.last_dropped_time = 0.0
+        if steps > self.max_steps_per_frame:
+            dropped = (steps - self.max_steps_per_frame) * self.step_dt
+            self.dropped_time += dropped
+            self.dropped_frames += 1
+            self.last_dropped_time = dropped
+            self.accumulator -= dropped
+            steps = self.max_steps_per_frame
+        self.accumulator -= steps * self.step_dt
+        if self.accumulator < 0: # Float round-off
+            self.accumulator = 0.0
+        self.total_steps += steps
+        self.last_frame_steps = steps
+        return steps
+
+    @property
+    def alpha(self):
+        # Fraction of a tick left over, used to interpolate between the previous and current tick
+        return min(1.0, self.accumulator / self.step_dt)
+
+    def get_stats(self):
+        return {
+            "total_steps": self.total_steps,
+            "last_frame_steps": self.last_frame_steps,
+            "dropped_time": self.dropped_time,
+            "dropped_frames": self.dropped_frames,
+        }
@@ -0,0 +1,239 @@
+import pygame
+from src.settings import (SCREEN_WIDTH, SCREEN_HEIGHT, FIXED_DT, VEC_ENV_MAX_STEPS, VEC_ENV_NEAREST_ENEMIES,
+                          VEC_ENV_NEAREST_PROJECTILES, VEC_ENV_ARENA_BOSS_DISTANCE, VEC_ENV_WIN_REWARD, VEC_ENV_LOSS_PENALTY)
+from src.world import World, PlayerInput, PLAYER_START_X
+from src.boss import Spike, Crusher, Viper
+from src.stage_data import get_stage_table
+from src.snapshot import capture_snapshot, restore_snapshot
+from src.renderer import WorldRenderer
+from src.dialogue import DialogueBox
+
+try:
+    import numpy as np
+except ImportError: # Optional: only needed for VecEnv
+    np = None
+
+NUMPY_AVAILABLE = np is not None
+
+# Gym-style environments for training agents, e.g. against the bosses:
+#
+#   env = VecEnv(num_envs=16)                        # Spike, Crusher and Viper arenas
+#   observations = env.reset(seed=0)                 # (num_envs, OBSERVATION_SIZE) float32
+#   observations, rewards, dones, infos = env.step(actions) # actions: ints into ACTIONS
+#
+# Each environment is its own World, stepped headless in lockstep in this
+# process. Finished environments reset themselves inside step() (the
+# returned observation is already the next episode's first); their info
+# dict holds the last observation, the outcome and the episode's return and
+# length. Resets restore a snapshot of the freshly loaded stage instead of
+# loading it again.
+#
+# Observation layout (positions relative to the player, in screen widths/heights):
+#   player:      x along the stage, y, health, facing right, attacking, invulnerable
+#   boss:        present, dx, dy, health, current_state one-hot (BOSS_STATES)
+#   enemies:     VEC_ENV_NEAREST_ENEMIES x (present, dx, dy, attacking), nearest first
+#   projectiles: VEC_ENV_NEAREST_PROJECTILES x (present, dx, dy, vx, vy), nearest first
+#
+# Reward per step: boss health taken (as a fraction of its max health) minus
+# player health lost (fraction of max health); VEC_ENV_WIN_REWARD for
+# defeating the boss, -VEC_ENV_LOSS_PENALTY for a game over.
+
+BOSS_STATES = ("idle", "chasing", "attacking", "special_attack_charging", "special_attack_active")
+PLAYER_FEATURES = 6
+BOSS_FEATURES = 4 + len(BOSS_STATES)
+ENEMY_FEATURES = 4
+PROJECTILE_FEATURES = 5
+OBSERVATION_SIZE = (PLAYER_FEATURES + BOSS_FEATURES + VEC_ENV_NEAREST_ENEMIES * ENEMY_FEATURES +
+                    VEC_ENV_NEAREST_PROJECTILES * PROJECTILE_FEATURES)
+
+# Discrete actions: each of the 9 movement directions (including standing
+# still) without an attack, with a punch and with a kick
+ACTIONS = tuple(PlayerInput(move_x, move_y, punch=attack == "punch", kick=attack == "kick")
+                for attack in (None, "punch", "kick") for move_y in (0, -1, 1) for move_x in (0, -1, 1))
+
+_BOSS_STATE_INDEX = {state: i for i, state in enumerate(BOSS_STATES)}
+_NO_ENEMY = [0.0] * ENEMY_FEATURES
+_NO_PROJECTILE = [0.0] * PROJECTILE_FEATURES
+
+
+def make_boss_arenas(distance=VEC_ENV_ARENA_BOSS_DISTANCE):
+    # One short stage per boss (levels 1-3: Spike, Crusher, Viper) without
+    # regular enemies, the boss `distance` px from the player's start
+    return [{"level_number": level_number, "name": f"{BossClass.__name__} arena", "length": SCREEN_WIDTH,
+             "background_color": pygame.Color('dimgray'), "enemy_placements": [],
+             "boss_data": (BossClass, PLAYER_START_X + distance, SCREEN_HEIGHT), "boss_dialogue": None}
+            for level_number, BossClass in enumerate((Spike, Crusher, Viper), 1)]
+
+
+class VecEnv:
+    def __init__(self, num_envs=8, stage_configurations=None, level_number=1, max_steps=VEC_ENV_MAX_STEPS,
+                 action_repeat=1, render_mode=None, **world_kwargs):
+        # level_number may also be a list with one level per environment.
+        # render_mode: None, or "rgb_array" for render(); world_kwargs go to every World.
+        if np is None:
+            raise RuntimeError("VecEnv requires NumPy")
+        if render_mode not in (None, "rgb_array"):
+            raise ValueError(f"Unsupported render mode {render_mode!r}")
+        self.num_envs = num_envs
+        self.max_steps = max_steps
+        self.action_repeat = action_repeat # Ticks each action is held for
+        self.render_mode = render_mode
+        self.action_count = len(ACTIONS)
+        self.observation_size = OBSERVATION_SIZE
+
+        stage_table = get_stage_table(stage_configurations if stage_configurations is not None else make_boss_arenas())
+        level_numbers = level_number if isinstance(level_number, (list, tuple)) else [level_number] * num_envs
+        self.worlds = []
+        self.start_snapshots = [] # Restored by reset
+        for i in range(num_envs):
+            world = World(stage_table, seed=i, **world_kwargs)
+            if not world.load_stage(level_numbers[i]):
+                raise ValueError(f"Stage {level_numbers[i]} not found")
+            self.worlds.append(world)
+            self.start_snapshots.append(capture_snapshot(world))
+
+        self.observations = np.zeros((num_envs, OBSERVATION_SIZE), dtype=np.float32)
+        self.boss_health = [0] * num_envs   # Last seen, for the reward
+        self.player_health = [0] * num_envs
+        self.episode_returns = [0.0] * num_envs
+        self.episode_lengths = [0] * num_envs
+
+        # Created by the first render()
+        self.render_surface = None
+        self.renderer = None
+        self.dialogue_box = None
+
+    def reset(self, seed=None):
+        # Every environment back to the start of its stage; returns the observations
+        for i in range(self.num_envs):
+            self._reset_env(i, None if seed is None else seed + i)
+        return self.observations.copy()
+
+    def _reset_env(self, i, seed=None):
+        world = self.worlds[i]
+        restore_snapshot(world, self.start_snapshots[i])
+        if seed is not None:
+            world.reseed(seed)
+        boss = world.stage_manager.boss
+        self.boss_health[i] = boss.health if boss is not None else 0
+        self.player_health[i] = world.player.health
+        self.episode_returns[i] = 0.0
+        self.episode_lengths[i] = 0
+        self.observations[i] = self.observe(world)
+
+    def step(self, actions):
+        # actions: one index into ACTIONS per environment.
+        # Returns (observations, rewards, dones, infos).
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        dones = np.zeros(self.num_envs, dtype=bool)
+        infos = [{} for _ in range(self.num_envs)]
+        for i, world in enumerate(self.worlds):
+            inputs = ACTIONS[actions[i]]
+            outcome = None
+            for _ in range(self.action_repeat):
+                kinds = [event[0] for event in world.step(inputs, FIXED_DT)]
+                boss = world.stage_manager.boss
+                if "game_over" in kinds:
+                    outcome = "loss"
+                elif (boss is not None and boss.health <= 0) or "stage_loaded" in kinds or "game_complete" in kinds:
+                    outcome = "win" # The boss is down, or the stage was cleared
+                if outcome is not None:
+                    break
+            reward = self._take_reward(i, world)
+            if outcome == "win":
+                reward += VEC_ENV_WIN_REWARD
+            elif outcome == "loss":
+                reward -= VEC_ENV_LOSS_PENALTY
+            self.episode_returns[i] += reward
+            self.episode_lengths[i] += 1
+            rewards[i] = reward
+            self.observations[i] = self.observe(world)
+            if outcome is None and self.episode_lengths[i] >= self.max_steps:
+                outcome = "truncated"
+            if outcome is not None:
+                dones[i] = True
+                infos[i] = {"outcome": outcome, "terminal_observation": self.observations[i].copy(),
+                            "episode": {"r": self.episode_returns[i], "l": self.episode_lengths[i]}}
+                self._reset_env(i)
+        return self.observations.copy(), rewards, dones, infos
+
+    def _take_reward(self, i, world):
+        boss = world.stage_manager.boss
+        boss_health = boss.health if boss is not None else 0
+        player_health = world.player.health
+        reward = 0.0
+        if boss is not None and boss_health < self.boss_health[i]:
+            reward += (self.boss_health[i] - boss_health) / boss.max_health
+        if player_health < self.player_health[i]: # Level-up heals don't count
+            reward -= (self.player_health[i] - player_health) / world.player.max_health
+        self.boss_health[i] = boss_health
+        self.player_health[i] = player_health
+        return reward
+
+    def observe(self, world):
+        # One observation row as a list, see the layout at the top
+        player = world.player
+        px, py = player.pos.x, player.pos.y
+        features = [px / world.get_stage_length(), py / SCREEN_HEIGHT, player.health / player.max_health,
+                    1.0 if player.facing_right else 0.0, 1.0 if player.attack_timer > 0 else 0.0,
+                    1.0 if player.invulnerability_timer > 0 else 0.0]
+
+        boss = world.stage_manager.boss
+        if boss is not None and boss.alive():
+            states = [0.0] * len(BOSS_STATES)
+            state_index = _BOSS_STATE_INDEX.get(boss.current_state)
+            if state_index is not None:
+                states[state_index] = 1.0
+            features += [1.0, (boss.pos.x - px) / SCREEN_WIDTH, (boss.pos.y - py) / SCREEN_HEIGHT,
+                         boss.health / boss.max_health]
+            features += states
+        else:
+            features += [0.0] * BOSS_FEATURES
+
+        # Streaming keeps the live enemies few; a spatial query would cost more than the scan
+        enemies = [(abs(enemy.pos.x - px) + abs(enemy.pos.y - py), enemy)
+                   for enemy in world.stage_manager.active_enemies if not enemy.is_boss]
+        enemies.sort(key=lambda entry: entry[0])
+        for distance, enemy in enemies[:VEC_ENV_NEAREST_ENEMIES]:
+            features += [1.0, (enemy.pos.x - px) / SCREEN_WIDTH, (enemy.pos.y - py) / SCREEN_HEIGHT,
+                         1.0 if enemy.is_attacking else 0.0]
+        for _ in range(VEC_ENV_NEAREST_ENEMIES - min(len(enemies), VEC_ENV_NEAREST_ENEMIES)):
+            features += _NO_ENEMY
+
+        # Projectile sprites and array bullets: (dx, dy, vx, vy) in pixels
+        center_y = player.rect.centery
+        shots = [(projectile.rect.centerx - px, projectile.rect.centery - center_y, projectile.velocity_x, 0.0)
+                 for projectile in world.projectiles]
+        bullets = world.bullets
+        if bullets is not None:
+            slots = bullets.alive.nonzero()[0]
+            if len(slots):
+                shots += zip((bullets.x[slots] + bullets.width[slots] / 2 - px).tolist(),
+                             (bullets.y[slots] + bullets.height[slots] / 2 - center_y).tolist(),
+                             bullets.vx[slots].tolist(), bullets.vy[slots].tolist())
+        shots.sort(key=lambda shot: abs(shot[0]) + abs(shot[1]))
+        for dx, dy, vx, vy in shots[:VEC_ENV_NEAREST_PROJECTILES]:
+            features += [1.0, dx / SCREEN_WIDTH, dy / SCREEN_HEIGHT, vx / SCREEN_WIDTH, vy / SCREEN_HEIGHT]
+        for _ in range(VEC_ENV_NEAREST_PROJECTILES - min(len(shots), VEC_ENV_NEAREST_PROJECTILES)):
+            features += _NO_PROJECTILE
+        return features
+
+    def render(self, index=0):
+        # The game view of one environment as an (height, width, 3) uint8 array;
+        # None unless created with render_mode="rgb_array"
+        if self.render_mode != "rgb_array":
+            return None
+        if self.renderer is None:
+            pygame.font.init()
+            font = pygame.font.Font(None, 28)
+            self.render_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+            self.renderer = WorldRenderer(SCREEN_WIDTH, SCREEN_HEIGHT, font, dirty_rects=False)
+            self.dialogue_box = DialogueBox(SCREEN_WIDTH, SCREEN_HEIGHT, font=font)
+        self.renderer.draw(self.render_surface, self.worlds[index], self.dialogue_box, 1.0)
+        return pygame.surfarray.array3d(self.render_surface).swapaxes(0, 1)
+
+    def close(self):
+        # Drops the offscreen renderer; the worlds hold nothing external
+        self.render_surface = None
+        self.renderer = None
+        self.dialogue_box = None
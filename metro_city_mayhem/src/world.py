@@ -0,0 +1,397 @@
+import logging
+import random
+import struct
+import time
+import zlib
+import pygame
+from src.settings import SCREEN_WIDTH, SCREEN_HEIGHT, BULLET_SYSTEM_ENABLED, CROWD_SIMULATION_ENABLED, ENTITY_POOL_ENABLED
+from src.player import Player
+from src.boss import Crusher
+from src.stage import StageManager, apply_stat_overrides
+from src.camera import Camera
+from src.spatial import SpatialGroup
+from src.activation import ActivationManager
+from src.projectile_pool import ProjectilePool
+from src.entity_pool import EntityPool
+from src.bullet_system import BulletSystem, NUMPY_AVAILABLE
+from src.crowd import CrowdSystem
+from src.profiler import FrameProfiler
+from src.snapshot import capture_snapshot, restore_snapshot
+
+logger = logging.getLogger(__name__)
+
+# The World owns everything the PLAYING state simulates: the player, the sprite
+# groups, the StageManager, the camera and the combat/defeat rules. It never
+# touches the display, fonts or the mixer, so it can be stepped headless
+# (SDL_VIDEODRIVER=dummy) as fast as the CPU allows.
+
+PLAYER_START_X = 100
+
+
+# PlayerInput bitmask layout, used by replays
+INPUT_LEFT = 1
+INPUT_RIGHT = 2
+INPUT_UP = 4
+INPUT_DOWN = 8
+INPUT_PUNCH = 16
+INPUT_KICK = 32
+
+
+class PlayerInput:
+    # One frame worth of player intent. move_x/move_y are -1, 0 or 1.
+    def __init__(self, move_x=0, move_y=0, punch=False, kick=False):
+        self.move_x = move_x
+        self.move_y = move_y
+        self.punch = punch
+        self.kick = kick
+
+    @classmethod
+    def from_keys(cls, keys, pressed_keys=()):
+        # keys: result of pygame.key.get_pressed()
+        # pressed_keys: KEYDOWN key codes seen this frame (for punch/kick)
+        move_x = 0
+        move_y = 0
+        # Same precedence as the original polling code: right/down win over left/up
+        if keys[pygame.K_LEFT] or keys[pygame.K_a]: move_x = -1
+        if keys[pygame.K_RIGHT] or keys[pygame.K_d]: move_x = 1
+        if keys[pygame.K_UP] or keys[pygame.K_w]: move_y = -1
+        if keys[pygame.K_DOWN] or keys[pygame.K_s]: move_y = 1
+        return cls(move_x, move_y, pygame.K_j in pressed_keys, pygame.K_k in pressed_keys)
+
+    def to_mask(self):
+        mask = 0
+        if self.move_x < 0: mask |= INPUT_LEFT
+        if self.move_x > 0: mask |= INPUT_RIGHT
+        if self.move_y < 0: mask |= INPUT_UP
+        if self.move_y > 0: mask |= INPUT_DOWN
+        if self.punch: mask |= INPUT_PUNCH
+        if self.kick: mask |= INPUT_KICK
+        return mask
+
+    @classmethod
+    def from_mask(cls, mask):
+        move_x = -1 if mask & INPUT_LEFT else (1 if mask & INPUT_RIGHT else 0)
+        move_y = -1 if mask & INPUT_UP else (1 if mask & INPUT_DOWN else 0)
+        return cls(move_x, move_y, bool(mask & INPUT_PUNCH), bool(mask & INPUT_KICK))
+
+
+class World:
+    def __init__(self, stage_configurations, screen_width=SCREEN_WIDTH, screen_height=SCREEN_HEIGHT, sound_effects=None, use_bullet_system=BULLET_SYSTEM_ENABLED,
+                 use_crowd=CROWD_SIMULATION_ENABLED, seed=None, profiler=None, asset_loader=None, use_entity_pool=ENTITY_POOL_ENABLED,
+                 stat_overrides=None):
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.sound_effects = sound_effects if sound_effects is not None else {}
+
+        self.player = Player(screen_width, screen_height)
+        self.player.sound_effects = self.sound_effects
+
+        # Sprite Groups
+        self.all_sprites = pygame.sprite.Group()
+        # enemies/projectiles carry a spatial hash so combat queries only touch nearby cells
+        self.enemies = SpatialGroup() # For all enemy types, including bosses
+        self.projectiles = SpatialGroup() # For Viper's projectiles
+        self.all_sprites.add(self.player)
+        self.projectile_pool = ProjectilePool(groups=(self.all_sprites, self.projectiles)) # Viper's shots are recycled
+        # Array-backed bullets for dense patterns; None means Viper uses the pool above
+        self.bullets = BulletSystem() if use_bullet_system and NUMPY_AVAILABLE else None
+        # Killed enemies are reset and reused by later spawns, loads and retries; None constructs new ones
+        self.entity_pool = EntityPool() if use_entity_pool else None
+
+        self.stage_manager = StageManager(stage_configurations=stage_configurations, screen_height=screen_height)
+        self.stage_table = self.stage_manager.stage_table # Compiled, indexed by level number
+        # Balance overrides, {class name: {attribute: value}}; "Player" applies to the player
+        # now, every other class to each enemy or boss as it spawns
+        stat_overrides = dict(stat_overrides or {})
+        apply_stat_overrides(self.player, stat_overrides.pop("Player", {}))
+        self.stage_manager.stat_overrides = stat_overrides
+        self.camera = Camera(screen_width=screen_width, screen_height=screen_height)
+        self.activation = ActivationManager() # Only enemies near the camera are updated
+        # Regular enemies are updated in bulk from arrays; None means each runs its own update()
+        self.crowd = CrowdSystem() if use_crowd and NUMPY_AVAILABLE else None
+
+        self.reseed(seed)
+        # Phase timings; a disabled profiler makes every mark() a no-op
+        self.profiler = profiler if profiler is not None else FrameProfiler(event_capacity=1, frame_history=1, enabled=False)
+
+        # Optional StageAssetLoader: stages are prepared on a worker thread ahead of time
+        self.asset_loader = asset_loader
+
+        # WorldSnapshots (src/snapshot.py): Retry restores the latest checkpoint, or the stage start
+        self.stage_start_snapshot = None
+        self.checkpoint_snapshot = None
+        self.quicksave_snapshot = None
+
+        self.frame_count = 0
+        self._damaged_enemies = [] # Enemies hit during the current tick
+        self.events = [] # Events raised during the last step, e.g. ("game_over",)
+
+    def reseed(self, seed=None):
+        # Seed every random source the simulation uses (currently the camera shake).
+        # Returns the seed so it can be recorded.
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.seed = seed
+        self.camera.rng.seed(seed)
+        return seed
+
+    def get_state_hash(self):
+        # CRC32 of the simulation state, compared tick by tick when verifying replays.
+        # Floats are hashed bit-exactly.
+        if self.crowd is not None:
+            self.crowd.sync_all(self.enemies)
+        player = self.player
+        values = [player.pos.x, player.pos.y, player.vel.x, player.vel.y, player.health, player.stamina,
+                  player.xp, player.money, player.attack_timer, player.invulnerability_timer,
+                  self.camera.offset.x, self.camera.shake_timer, self.stage_manager.current_stage_number or 0]
+        for enemy in self.enemies:
+            values += (enemy.pos.x, enemy.pos.y, enemy.vel.x, enemy.health, enemy.hit_cooldown_timer)
+        for projectile in self.projectiles:
+            values += projectile.rect.topleft
+        crc = zlib.crc32(struct.pack(f"<{len(values)}d", *values))
+        if self.bullets is not None:
+            alive = self.bullets.alive
+            crc = zlib.crc32(self.bullets.x[alive].tobytes(), crc)
+            crc = zlib.crc32(self.bullets.y[alive].tobytes(), crc)
+        return crc
+
+    def get_stage_length(self):
+        if self.stage_manager.current_stage_data:
+            return self.stage_manager.current_stage_data["length"]
+        return self.screen_width # Fallback if no stage is loaded
+
+    def reset_player_position(self, x=PLAYER_START_X, y=None):
+        player = self.player
+        player.pos.x = x
+        player.pos.y = y if y is not None else self.screen_height
+        player.rect.midbottom = (round(player.pos.x), round(player.pos.y))
+        player.vel.x = player.vel.y = 0
+
+    def load_stage(self, level_number, dt=0.0):
+        start = time.perf_counter()
+        loader = self.asset_loader
+        stage_assets = loader.take(level_number) if loader is not None else None
+        if not self.stage_manager.load_stage(level_number, self.player, self.all_sprites, self.enemies,
+                                             projectiles_group_ref=self.projectiles, projectile_pool=self.projectile_pool,
+                                             bullet_system=self.bullets, crowd=self.crowd, stage_assets=stage_assets,
+                                             entity_pool=self.entity_pool):
+            return False
+        self._enter_stage(dt=dt)
+        self.stage_start_snapshot = capture_snapshot(self)
+        self.checkpoint_snapshot = None
+        if loader is not None:
+            loader.record(level_number, "install", time.perf_counter() - start)
+            loader.retain((level_number, level_number + 1))
+            loader.prefetch(level_number + 1) # Prepared while this stage is played
+        return True
+
+    def _enter_stage(self, x=PLAYER_START_X, y=None, dt=0.0):
+        # Place the player and settle the camera and enemies around it
+        self.reset_player_position(x, y)
+        self.activation.reset()
+        self.camera.update(self.player.rect, self.get_stage_length(), dt)
+        self.stage_manager.stream_enemies(self.camera) # Spawn whatever is already in range
+        self.capture_previous_positions()
+        self.camera.snap()
+
+    def retry_stage(self):
+        # Restore health/stamina and restart the current stage from the last
+        # checkpoint, or from the beginning. The stage is restored from a
+        # snapshot instead of being loaded again; XP, money and levels are kept.
+        self.player.health = self.player.max_health
+        self.player.stamina = self.player.max_stamina
+        level_number = self.stage_manager.current_stage_number if self.stage_manager.current_stage_number else 1
+        snapshot = self.checkpoint_snapshot or self.stage_start_snapshot
+        if snapshot is None or snapshot.level_number != level_number:
+            return self.load_stage(level_number)
+        restore_snapshot(self, snapshot, include_player=False)
+        x, y = snapshot.player_position
+        self._enter_stage(x, y)
+        return True
+
+    def quicksave(self):
+        self.quicksave_snapshot = capture_snapshot(self)
+        return self.quicksave_snapshot
+
+    def quickload(self):
+        # Back to the quicksave, player and camera included. False if there is none.
+        if self.quicksave_snapshot is None:
+            return False
+        restore_snapshot(self, self.quicksave_snapshot)
+        return True
+
+    def capture_previous_positions(self):
+        # Remember where every sprite was at the end of the last tick for render interpolation
+        for sprite in self.all_sprites:
+            sprite.prev_rect_topleft = sprite.rect.topleft
+        if self.bullets is not None:
+            self.bullets.capture_previous_positions()
+
+    def get_render_rect(self, sprite, alpha=1.0):
+        # Screen-space rect of a sprite blended between the previous and current tick
+        rect = sprite.rect
+        offset = self.camera.get_render_offset(alpha)
+        prev = getattr(sprite, 'prev_rect_topleft', None)
+        if prev is None or alpha >= 1.0:
+            x, y = rect.x, rect.y
+        else:
+            x = prev[0] + (rect.x - prev[0]) * alpha
+            y = prev[1] + (rect.y - prev[1]) * alpha
+        return pygame.Rect(round(x - offset.x), round(y - offset.y), rect.width, rect.height)
+
+    def step(self, inputs, dt):
+        # dt should be the fixed tick length (settings.FIXED_DT) for reproducible results
+        profiler = self.profiler
+        self.events = []
+        self.frame_count += 1
+        self.capture_previous_positions()
+        player = self.player
+        stage_length = self.get_stage_length()
+
+        # Player intent
+        player.vel.x = inputs.move_x * player.speed
+        player.vel.y = inputs.move_y * player.speed
+        if inputs.punch: player.punch()
+        if inputs.kick: player.kick()
+        profiler.mark("world.input")
+
+        # all_sprites is only used for drawing; each group is updated exactly once so the
+        # broadphase index is refreshed as entities move (projectiles used to be updated
+        # twice per frame, through all_sprites and projectiles)
+        player.update(dt, stage_length, self.screen_height)
+        profiler.mark("player.update")
+        crowd_count = len(self.crowd.members) if self.crowd is not None else 0
+        self.activation.refresh(self.enemies, self.camera, player, self.screen_height, crowd_count)
+        profiler.mark("activation")
+        if profiler.enabled and profiler.track_entity_classes:
+            self._update_enemies_by_class(dt, stage_length)
+        else:
+            self.enemies.update_sprites(self.activation.awake.sprites(), dt, stage_length, self.screen_height)
+        profiler.mark("enemies.update")
+        if self.crowd is not None:
+            self.crowd.update(dt, stage_length, self.screen_height, player, self.camera, self.enemies)
+            profiler.mark("crowd.update")
+        self.projectiles.update(dt, stage_length, self.screen_height)
+        if self.bullets is not None:
+            self.bullets.update(dt, stage_length, self.screen_height)
+        profiler.mark("projectiles.update")
+
+        self.stage_manager.update()
+        self.stage_manager.stream_enemies(self.camera, self.activation.awake)
+        profiler.mark("stage_manager.update")
+        self.camera.update(target_sprite_rect=player.rect, stage_length=stage_length, dt=dt)
+        profiler.mark("camera.update")
+
+        self._resolve_combat()
+        profiler.mark("combat")
+        self._process_defeats()
+        profiler.mark("defeats")
+
+        if self.stage_manager.check_checkpoint(player.pos.x):
+            self.checkpoint_snapshot = capture_snapshot(self)
+            self.events.append(("checkpoint", self.stage_manager.next_checkpoint_index))
+
+        if player.health <= 0:
+            logger.info("GAME OVER")
+            self.events.append(("game_over",))
+            return self.events
+
+        if self.stage_manager.dialogue_to_trigger:
+            self.events.append(("boss_dialogue", self.stage_manager.dialogue_to_trigger))
+            self.stage_manager.dialogue_to_trigger = None
+            return self.events
+
+        if self.stage_manager.check_stage_clear_condition(player.pos.x, player.rect.width / 2):
+            self._advance_stage(dt)
+        return self.events
+
+    def _update_enemies_by_class(self, dt, stage_length):
+        # Same as enemies.update_sprites, but timing each update and summing per class for the profiler
+        enemies = self.enemies
+        update_sprites = enemies.update_sprites
+        clock = time.perf_counter
+        costs = {}
+        start = clock()
+        for enemy in self.activation.awake.sprites():
+            before = clock()
+            update_sprites((enemy,), dt, stage_length, self.screen_height)
+            cost = costs.get(type(enemy).__name__)
+            if cost is None:
+                cost = costs[type(enemy).__name__] = [0.0, 0]
+            cost[0] += clock() - before
+            cost[1] += 1
+        self.profiler.record_entity_costs(costs, start)
+
+    def _resolve_combat(self):
+        player = self.player
+        camera = self.camera
+        damaged = self._damaged_enemies = []
+
+        player_hitbox = player.get_hitbox()
+        if player_hitbox:
+            for enemy_hit in self.enemies.query(player_hitbox): # This includes regular enemies and bosses
+                if enemy_hit.hit_cooldown_timer <= 0: # Check if enemy can be hit again
+                    enemy_hit.take_damage(player.strength)
+                    damaged.append(enemy_hit)
+                    if enemy_hit.is_boss:
+                        camera.start_shake(intensity=8, duration=0.3) # Stronger shake for boss hits
+                    else: # Regular enemy hit
+                        camera.start_shake(intensity=3, duration=0.1) # Minor shake for regular enemy
+
+        # Player taking damage from normal enemies
+        for enemy_sprite in self.enemies.query(player.rect):
+            if not enemy_sprite.is_boss and enemy_sprite.is_attacking:
+                if player.invulnerability_timer <= 0:
+                    player.take_damage(enemy_sprite.strength)
+                    camera.start_shake(intensity=5, duration=0.2) # Shake when player takes damage
+
+        # Player taking damage from Boss
+        boss_instance = self.stage_manager.boss
+        if boss_instance and boss_instance.alive():
+            boss_hitbox = boss_instance.get_hitbox()
+            if boss_hitbox and player.rect.colliderect(boss_hitbox):
+                if player.invulnerability_timer <= 0:
+                    boss_attack_damage = boss_instance.strength
+                    if isinstance(boss_instance, Crusher) and boss_instance.current_state == "special_attack_active":
+                        boss_attack_damage = boss_instance.stomp_damage
+                    player.take_damage(boss_attack_damage)
+                    camera.start_shake(intensity=7, duration=0.25) # Stronger shake for boss attacks on player
+
+        # Player taking damage from projectiles
+        for proj in self.projectiles.query(player.rect):
+            if player.invulnerability_timer <= 0:
+                player.take_damage(proj.damage)
+                camera.start_shake(intensity=4, duration=0.15) # Shake for projectile hits
+                proj.kill()
+
+        # Same rule for array bullets: only the first one to connect does damage and is removed
+        bullets = self.bullets
+        if bullets is not None and player.invulnerability_timer <= 0:
+            hit = bullets.find_first_hit(player.rect)
+            if hit is not None:
+                player.take_damage(int(bullets.damage[hit]))
+                camera.start_shake(intensity=4, duration=0.15)
+                bullets.kill(hit)
+
+    def _process_defeats(self):
+        # Health only drops through player hits, so only this tick's damaged enemies can be defeated
+        player = self.player
+        for enemy_defeated_sprite in self._damaged_enemies:
+            if enemy_defeated_sprite.health <= 0 and enemy_defeated_sprite.alive():
+                player.add_xp(enemy_defeated_sprite.xp_reward)
+                player.money += getattr(enemy_defeated_sprite, 'money_drop', 5)
+                logger.info("%s defeated! Player Money: $%s", enemy_defeated_sprite.__class__.__name__, player.money)
+                if self.sound_effects.get("enemy_defeated"): self.sound_effects["enemy_defeated"].play()
+                enemy_defeated_sprite.kill()
+                self.events.append(("enemy_defeated", enemy_defeated_sprite))
+
+    def _advance_stage(self, dt):
+        next_level_num = self.stage_manager.current_stage_number + 1
+        if next_level_num not in self.stage_table:
+            logger.info("Congratulations! Final boss defeated, triggering ENDING.")
+            self.events.append(("game_complete",))
+        elif self.load_stage(next_level_num, dt):
+            self.events.append(("stage_loaded", next_level_num))
+        else:
+            logger.error("Failed to load Stage %s. Ending game.", next_level_num)
+            self.events.append(("stage_load_failed", next_level_num))